@@ -0,0 +1,980 @@
+# benchmarks for the interpreter
+# run all of them with `python benchmarks.py`, or pick some by name:
+#   python benchmarks.py fcall_dispatch
+import copy
+import json
+import mmap
+import operator
+import os
+import pickle
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import brewc
+import brewflat
+import brewoutput
+import brewops
+import brewparse
+import brewpratt
+import brewtokenize
+from brewparse import parse_program
+from brewvalues import Obj
+from element import Element
+from interpreterv4 import Interpreter
+
+
+def time_run(program, **kwargs):
+    # run a program with console output off and return (seconds, interpreter)
+    interpreter = Interpreter(console_output=False, **kwargs)
+    start = time.perf_counter()
+    interpreter.run(program)
+    return time.perf_counter() - start, interpreter
+
+
+def timed(run):
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+def best_of(repeats, program, **kwargs):
+    # smallest wall time over a few runs, to keep parse-time noise down
+    return min(time_run(program, **kwargs)[0] for _ in range(repeats))
+
+
+def report(label, seconds, per=None, unit="op"):
+    line = f"  {label:<40} {seconds * 1000:10.2f} ms"
+    if per:
+        line += f"   {seconds / per * 1e6:8.3f} us/{unit}"
+    print(line)
+
+
+# call cost should stay flat no matter how many functions the program defines
+def bench_fcall_dispatch():
+    calls = 20000
+    for num_funcs in (10, 100, 1000, 10000):
+        # helpers must not return a value: a call statement that yields one
+        # is treated as a return from the caller
+        helpers = "".join(f"func h{k}() {{ x = {k}; }}\n" for k in range(num_funcs))
+        # call the last helper, which used to be the worst case for the linear scan
+        target = f"h{num_funcs - 1}"
+        loop = f"func main() {{ i = 0; while (i < {calls}) {{ {target}(); i = i + 1; }} }}\n"
+        empty = f"func main() {{ i = 0; while (i < {calls}) {{ i = i + 1; }} }}\n"
+        with_calls = best_of(3, helpers + loop)
+        without_calls = best_of(3, helpers + empty)
+        report(f"{num_funcs} funcs, {calls} calls", with_calls - without_calls, calls, "call")
+
+
+# reading function-level vars from inside nested blocks: the dynamic walk
+# grows with nesting, lexical slots don't
+def bench_var_access():
+    iterations = 20000
+    for nesting in (0, 4, 16):
+        opens = "if (true) { " * nesting
+        closes = "} " * nesting
+        program = f"""func main() {{
+            a = 1; b = 2; s = 0; i = 0;
+            {opens} while (i < {iterations}) {{ s = s + a + b; i = i + 1; }} {closes}
+            print(s);
+        }}"""
+        for scoping in ("dynamic", "lexical"):
+            seconds = best_of(3, program, scoping=scoping)
+            report(f"nesting {nesting}, {scoping}", seconds, iterations, "iter")
+
+
+LOOP_PROGRAM = """
+func main() {
+  i = 0;
+  total = 0;
+  while (i < 30000) {
+    if (i / 3 * 3 == i) { total = total + i * 2; } else { total = total - 1; }
+    i = i + 1;
+  }
+  print(total);
+}
+"""
+
+
+# tree walker vs the closure compiling engine on a loop-heavy program
+def bench_engines():
+    for scoping in ("dynamic", "lexical"):
+        for engine in ("tree", "closure"):
+            seconds = best_of(3, LOOP_PROGRAM, scoping=scoping, engine=engine)
+            report(f"{engine}, {scoping}", seconds, 30000, "iter")
+
+
+RECURSION_PROGRAM = """
+func fib(n) { if (n < 2) { return n; } return fib(n - 1) + fib(n - 2); }
+func main() { print(fib(18)); }
+"""
+
+OBJECT_PROGRAM = """
+func main() {
+  base = @;
+  base.total = 0;
+  base.add = lambda(k) { this.total = this.total + k; };
+  obj = @;
+  obj.proto = base;
+  obj.total = 0;
+  i = 0;
+  while (i < 10000) { obj.add(2); i = i + 1; }
+  print(obj.total);
+}
+"""
+
+
+# bytecode VM against the other engines; the VM needs lexical scoping and
+# the recursion program passes expressions as args, which only lexical
+# scoping evaluates
+def bench_vm():
+    workloads = [("recursion", RECURSION_PROGRAM), ("loop", LOOP_PROGRAM), ("object", OBJECT_PROGRAM)]
+    for label, program in workloads:
+        configs = [("tree", "lexical"), ("closure", "lexical"), ("vm", "lexical")]
+        if label != "recursion":
+            configs.insert(0, ("tree", "dynamic"))
+        for engine, scoping in configs:
+            seconds = best_of(3, program, scoping=scoping, engine=engine)
+            report(f"{label}: {engine}, {scoping}", seconds)
+
+
+# objects passed by value down a recursion and returned back up
+def object_passing_program(num_fields, depth):
+    fields = "".join(f"o.f{k} = {k};" for k in range(num_fields))
+    return f"""
+func down(o, n) {{
+  if (n == 0) {{ return o.f0; }}
+  return down(o, n - 1);
+}}
+func up(o, n) {{
+  if (n == 0) {{ return o; }}
+  return up(o, n - 1);
+}}
+func main() {{
+  o = @;
+  {fields}
+  nested = @;
+  nested.x = 1;
+  o.inner = nested;
+  print(down(o, {depth}));
+  r = up(o, {depth});
+  r.f0 = 99;
+  print(o.f0, " ", r.f0);
+}}
+"""
+
+
+# memory for by-value object args and returns, measured with tracemalloc
+def bench_value_copies():
+    for num_fields in (10, 100, 1000):
+        program = object_passing_program(num_fields, 100)
+        tracemalloc.start()
+        seconds, _ = time_run(program, scoping="lexical")
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report(f"{num_fields} fields, depth 100, peak {peak // 1024} KiB", seconds)
+
+
+# lambdas made at the bottom of a deep call stack, with every frame holding
+# a few vars the lambda never uses. each level is its own func with its own
+# var names, since with dynamic scoping an assignment to a name that an
+# outer frame has writes to that frame's var
+def lambda_capture_program(depth, num_vars, lambdas):
+    funcs = ""
+    for d in range(depth):
+        local_vars = "".join(f"v{d}_{k} = {k};" for k in range(num_vars))
+        funcs += f"func nest{d}() {{ {local_vars} nest{d + 1}(); }}\n"
+    return funcs + f"""
+func nest{depth}() {{
+  i = 0;
+  while (i < {lambdas}) {{ f = lambda(k) {{ return k + 1; }}; i = i + 1; }}
+}}
+func main() {{ nest0(); }}
+"""
+
+
+def bench_lambda_capture():
+    lambdas = 2000
+    for depth in (1, 10, 100):
+        program = lambda_capture_program(depth, 10, lambdas)
+        for scoping in ("dynamic", "lexical"):
+            seconds = best_of(3, program, scoping=scoping)
+            report(f"depth {depth}, {scoping}", seconds, lambdas, "lambda")
+
+
+# field reads and writes on a wide object
+def wide_object_program(num_fields, iterations):
+    fields = "".join(f"o.f{k} = {k};" for k in range(num_fields))
+    return f"""
+func main() {{
+  o = @;
+  {fields}
+  i = 0;
+  s = 0;
+  while (i < {iterations}) {{
+    s = s + o.f0 + o.f{num_fields - 1};
+    o.f{num_fields // 2} = i;
+    i = i + 1;
+  }}
+  print(s);
+}}
+"""
+
+
+# a field read through a chain of protos
+def proto_chain_program(depth, iterations):
+    chain = "".join(f"p{k} = @; p{k}.proto = p{k - 1};" for k in range(1, depth + 1))
+    return f"""
+func main() {{
+  p0 = @;
+  p0.x = 1;
+  {chain}
+  i = 0;
+  s = 0;
+  while (i < {iterations}) {{ s = s + p{depth}.x; i = i + 1; }}
+  print(s);
+}}
+"""
+
+
+def bench_objects():
+    # time for the loop alone: a run with no iterations takes out parsing
+    # and building the objects
+    iterations = 20000
+    configs = [("tree", "dynamic"), ("tree", "lexical"), ("vm", "lexical")]
+    workloads = [(f"{n} fields", wide_object_program, n) for n in (10, 100, 1000)]
+    workloads += [(f"proto depth {d}", proto_chain_program, d) for d in (1, 10, 50)]
+    for label, make_program, size in workloads:
+        for engine, scoping in configs:
+            loop = best_of(3, make_program(size, iterations), scoping=scoping, engine=engine)
+            setup = best_of(3, make_program(size, 0), scoping=scoping, engine=engine)
+            report(f"{label}: {engine}, {scoping}", loop - setup, iterations, "iter")
+
+
+# a method call through a chain of protos, with the cache counters
+def method_chain_program(depth, iterations):
+    chain = "".join(f"p{k} = @; p{k}.proto = p{k - 1};" for k in range(1, depth + 1))
+    return f"""
+func main() {{
+  p0 = @;
+  p0.n = 0;
+  p0.inc = lambda() {{ this.n = this.n + 1; }};
+  {chain}
+  i = 0;
+  while (i < {iterations}) {{ p{depth}.inc(); i = i + 1; }}
+  print(p{depth}.n);
+}}
+"""
+
+
+def bench_methods():
+    iterations = 5000
+    configs = [("tree", "dynamic"), ("tree", "lexical"), ("vm", "lexical")]
+    for depth in (1, 10, 50):
+        for engine, scoping in configs:
+            loop = best_of(3, method_chain_program(depth, iterations), scoping=scoping, engine=engine)
+            setup = best_of(3, method_chain_program(depth, 0), scoping=scoping, engine=engine)
+            report(f"proto depth {depth}: {engine}, {scoping}", loop - setup, iterations, "call")
+            _, interpreter = time_run(method_chain_program(depth, iterations), scoping=scoping, engine=engine)
+            stats = interpreter.method_cache_stats()
+            print("    " + ", ".join(f"{key} {count}" for key, count in stats.items()))
+
+
+# run() on a program that is mostly source to parse, with no AST cache, with
+# an empty cache dir (cold: parse and write the entry) and with the entry
+# already there (warm: just load it)
+def bench_ast_cache():
+    for num_funcs in (10, 100, 1000):
+        helpers = "".join(f"func h{k}(a, b) {{ if (a > b) {{ return a - b * {k}; }} return b; }}\n" for k in range(num_funcs))
+        program = helpers + "func main() { print(h0(2, 1)); }\n"
+        report(f"{num_funcs} funcs, no cache", best_of(5, program))
+        cold = []
+        for _ in range(5):
+            with tempfile.TemporaryDirectory() as cache_dir:
+                cold.append(time_run(program, cache_dir=cache_dir)[0])
+        report(f"{num_funcs} funcs, cold", min(cold))
+        with tempfile.TemporaryDirectory() as cache_dir:
+            time_run(program, cache_dir=cache_dir)
+            report(f"{num_funcs} funcs, warm", best_of(5, program, cache_dir=cache_dir))
+
+
+# parsing on many threads at once. test_brewparse checks that the trees
+# match the ones parsed on their own
+def bench_parse_threads():
+    corpus = [LOOP_PROGRAM, RECURSION_PROGRAM, OBJECT_PROGRAM, "func main() { x = ; }"]
+    for size in range(1, 40):
+        corpus.append(wide_object_program(size, size))
+        corpus.append(proto_chain_program(size, size))
+        corpus.append(method_chain_program(size, size))
+        corpus.append(lambda_capture_program(size % 5 + 1, size, size))
+
+    def parse(program):
+        try:
+            return parse_program(program)
+        except SyntaxError:
+            return None
+
+    programs = corpus * 20
+    for threads in (1, 4, 16):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(parse, programs))
+        seconds = time.perf_counter() - start
+        report(f"{len(programs)} programs, {threads} threads", seconds, len(programs), "program")
+
+
+# cold start: a fresh python importing the interpreter, with the generated
+# lexer and parser tables and with them hidden, so they are built instead
+def bench_startup():
+    here = os.path.dirname(os.path.abspath(__file__))
+    hide_tables = "import sys; sys.modules['brewlextab'] = sys.modules['brewparsetab'] = None; "
+    for label, code in (("tables", ""), ("no tables", hide_tables)):
+        times = []
+        for _ in range(10):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code + "import interpreterv4"], cwd=here, check=True)
+            times.append(time.perf_counter() - start)
+        report(f"import interpreterv4, {label}", min(times))
+    times = []
+    for _ in range(10):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        times.append(time.perf_counter() - start)
+    report("bare python", min(times))
+
+
+# a program of about size bytes using every kind of statement and expression
+def big_program(size):
+    funcs = []
+    length = 0
+    k = 0
+    while length < size:
+        func = f"""func f{k}(a, ref b) {{
+  o = @; o.x = a * {k} + (b - 1) / 2; o.m = lambda(y) {{ return y + this.x; }};
+  if (a >= {k} && !(b == nil) || -a < 0) {{ print("f{k}", o.m(a), o.x); }} else {{ b = a; }}
+  /* keep going */
+  while (a > 0) {{ a = a - 1; b = f{k}(a, b); }}
+  return o.x != {k};
+}}
+"""
+        funcs.append(func)
+        length += len(func)
+        k += 1
+    return "".join(funcs) + "func main() { print(f0(1, 2)); }\n"
+
+
+# the hand-written parser against PLY: every tree must be the same, then
+# tokens per second on programs of 1 MB and more
+def bench_pratt():
+    corpus = [LOOP_PROGRAM, RECURSION_PROGRAM, OBJECT_PROGRAM, big_program(20000)]
+    for size in range(1, 20):
+        corpus.append(wide_object_program(size, size))
+        corpus.append(method_chain_program(size, size))
+        corpus.append(lambda_capture_program(size % 5 + 1, size, size))
+    for program in corpus:
+        if str(parse_program(program, "pratt")) != str(parse_program(program)):
+            raise AssertionError("the pratt parser built a different tree")
+    print(f"  {len(corpus)} programs parse the same")
+    for size in (1 << 20, 4 << 20):
+        program = big_program(size)
+        tokens = len(brewpratt.tokenize(program)[0]) - 1
+        for parser in ("ply", "pratt"):
+            seconds = min(timed(lambda: parse_program(program, parser)) for _ in range(3))
+            print(f"  {len(program) >> 10} KiB, {parser:<5} {seconds * 1000:10.2f} ms   {tokens / seconds / 1e6:6.2f} M tokens/s")
+
+
+# brewtokenize against the ply.lex loop, on its own and under the PLY parser
+def bench_tokenize():
+    program = big_program(1 << 20)
+    tokens = len(brewpratt.tokenize(program)[0]) - 1
+
+    def ply_lex():
+        lexer = brewparse.lexer.clone()
+        lexer.input(program)
+        while lexer.token() is not None:
+            pass
+
+    def ply_lex_parse():
+        copy.copy(brewparse.lr_parser).parse(program, lexer=brewparse.lexer.clone())
+
+    with tempfile.TemporaryFile() as f:
+        f.write(program.encode())
+        f.flush()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+            runs = [
+                ("ply.lex", ply_lex),
+                ("tokenize, str", lambda: sum(1 for _ in brewtokenize.tokenize(program))),
+                ("tokenize, mmap", lambda: sum(1 for _ in brewtokenize.tokenize(source))),
+                ("parse with ply.lex", ply_lex_parse),
+                ("parse with tokenfunc", lambda: parse_program(program)),
+            ]
+            for label, run in runs:
+                seconds = min(timed(run) for _ in range(3))
+                print(f"  {label:<24} {seconds * 1000:10.2f} ms   {tokens / seconds / 1e6:6.2f} M tokens/s")
+
+
+# .brewc against parsing the source and against a pickle of the tree: size
+# and time to get the tree back, then a fresh python running the program
+# from source and from .brewc
+def bench_brewc():
+    for size in (1 << 16, 1 << 20):
+        program = big_program(size)
+        ast = parse_program(program)
+        compiled = brewc.dump(ast)
+        pickled = pickle.dumps(ast, pickle.HIGHEST_PROTOCOL)
+        print(f"  source {len(program) >> 10} KiB, .brewc {len(compiled) >> 10} KiB, pickle {len(pickled) >> 10} KiB")
+        runs = [
+            ("parse, ply", lambda: parse_program(program)),
+            ("parse, pratt", lambda: parse_program(program, "pratt")),
+            ("pickle.loads", lambda: pickle.loads(pickled)),
+            ("brewc.load", lambda: brewc.load(compiled)),
+        ]
+        for label, run in runs:
+            report(f"{len(program) >> 10} KiB, {label}", min(timed(run) for _ in range(3)))
+    here = os.path.dirname(os.path.abspath(__file__))
+    program = big_program(1 << 16)
+    with tempfile.TemporaryDirectory() as tmp:
+        source_file = os.path.join(tmp, "prog.brewin")
+        with open(source_file, "w") as f:
+            f.write(program)
+        compiled_file = os.path.join(tmp, "prog.brewc")
+        subprocess.run([sys.executable, "brewin.py", "compile", source_file, "-o", compiled_file], cwd=here, check=True)
+        for label, path in (("source", source_file), (".brewc", compiled_file)):
+            command = [sys.executable, "brewin.py", "run", "--scoping", "lexical", path]
+            seconds = min(timed(lambda: subprocess.run(command, cwd=here, check=True, stdout=subprocess.DEVNULL)) for _ in range(5))
+            report(f"brewin run, {len(program) >> 10} KiB {label}", seconds)
+
+
+class DictNode:
+    # a node as Element was before the typed classes: its fields in a dict
+    def __init__(self, elem_type, **kwargs):
+        self.elem_type = elem_type
+        self.dict = kwargs
+
+    def get(self, key):
+        if key not in self.dict:
+            return None
+        return self.dict[key]
+
+
+def as_dict_nodes(value):
+    if isinstance(value, list):
+        return [as_dict_nodes(item) for item in value]
+    if isinstance(value, Element):
+        return DictNode(value.elem_type, **{key: as_dict_nodes(getattr(value, key)) for key in value.fields})
+    return value
+
+
+def all_nodes(value, out):
+    # every node in a tree of Elements or DictNodes, in order
+    if isinstance(value, list):
+        for item in value:
+            all_nodes(item, out)
+    elif isinstance(value, (Element, DictNode)):
+        out.append(value)
+        for child in value.dict.values():
+            all_nodes(child, out)
+    return out
+
+
+# typed __slots__ nodes against the dict-backed ones on a tree of 100k+
+# nodes: memory the tree holds, reading the operands of every binary
+# operator (get() on both, attributes on the typed nodes), then a program run
+# on each engine
+def bench_nodes():
+    program = big_program(1 << 16)
+    while len(all_nodes(parse_program(program, "pratt"), [])) < 100000:
+        program += program
+    compiled = brewc.dump(parse_program(program, "pratt"))
+    trees = {}
+    for label, build in (("dict nodes", lambda: as_dict_nodes(brewc.load(compiled))), ("typed nodes", lambda: brewc.load(compiled))):
+        tree = build()  # so the strings in the table are already allocated
+        tracemalloc.start()
+        trees[label] = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        nodes = len(all_nodes(tree, []))
+        print(f"  {nodes} {label:<12} {size / 1e6:8.2f} MB   {size / nodes:6.1f} bytes/node")
+    dict_ops = [n for n in all_nodes(trees["dict nodes"], []) if n.elem_type in brewc.BINARY_OPS]
+    typed_ops = [n for n in all_nodes(trees["typed nodes"], []) if n.elem_type in brewc.BINARY_OPS]
+
+    def read_dict_nodes():
+        for n in dict_ops:
+            n.get("op1")
+            n.get("op2")
+
+    def read_typed_get():
+        for n in typed_ops:
+            n.get("op1")
+            n.get("op2")
+
+    def read_typed_attributes():
+        for n in typed_ops:
+            n.op1
+            n.op2
+
+    for label, run in (("operands, dict nodes, get()", read_dict_nodes), ("operands, typed nodes, get()", read_typed_get), ("operands, typed nodes, attributes", read_typed_attributes)):
+        report(label, min(timed(run) for _ in range(5)), len(typed_ops), "node")
+    for scoping, engine in (("dynamic", "tree"), ("lexical", "tree"), ("lexical", "closure"), ("lexical", "vm")):
+        report(f"run, {scoping}, {engine}", best_of(3, LOOP_PROGRAM, scoping=scoping, engine=engine))
+
+
+def count_tree(ast):
+    # nodes in an Element tree, walked without recursion
+    nodes = 0
+    stack = [ast]
+    while stack:
+        value = stack.pop()
+        if type(value) is list:
+            stack.extend(value)
+        elif value is not None:
+            nodes += 1
+            for key in value.fields:
+                child = getattr(value, key)
+                if type(child) is list or isinstance(child, Element):
+                    stack.append(child)
+    return nodes
+
+
+def count_flat(tree):
+    # the same count over a FlatTree's child links (lists and Nones are
+    # nodes there, so they're left out)
+    first_child = tree.first_child
+    next_sibling = tree.next_sibling
+    kind = tree.kind
+    nodes = 0
+    stack = [0]
+    while stack:
+        i = stack.pop()
+        if kind[i] < brewflat.LIST:
+            nodes += 1
+        child = first_child[i]
+        while child >= 0:
+            stack.append(child)
+            child = next_sibling[child]
+    return nodes
+
+
+def load_and_walk(path, form):
+    # run in a fresh python by bench_flat: peak RSS before and after loading
+    # a .brewc file as an Element tree or a FlatTree, then the time to walk it
+    with open(path, "rb") as f:
+        data = f.read()
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    program = brewc.load(data) if form == "tree" else brewflat.load(data)
+    load_seconds = time.perf_counter() - start
+    del data
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    count = count_tree if form == "tree" else count_flat
+    walk_seconds = min(timed(lambda: count(program)) for _ in range(3))
+    scan_seconds = None
+    if form == "flat":
+        # the nodes are stored in preorder, so a pass over all of them in
+        # that order is a scan down the kind column
+        list_kind = brewflat.LIST
+        scan_seconds = min(timed(lambda: sum(1 for kind in program.kind if kind < list_kind)) for _ in range(3))
+    return {"nodes": count(program), "before": before, "after": after, "load": load_seconds, "walk": walk_seconds, "scan": scan_seconds}
+
+
+# the struct-of-arrays lowering (brewflat) against the Element tree: peak
+# RSS of a fresh python loading the same .brewc both ways, and how fast a
+# walk over every node goes, from 10^5 to 10^7 nodes. then the flat
+# evaluator against the other lexical engines
+def bench_flat():
+    here = os.path.dirname(os.path.abspath(__file__))
+    functions = parse_program(big_program(1 << 16), "pratt").functions
+    per_copy = count_tree(functions)
+    for target in (10 ** 5, 10 ** 6, 10 ** 7):
+        # the same functions over and over, so the tree never has to be
+        # built at full size here
+        copies = -(-target // per_copy)
+        compiled = brewc.dump(Element("program", functions=functions * copies))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "prog.brewc")
+            with open(path, "wb") as f:
+                f.write(compiled)
+            for form in ("tree", "flat"):
+                code = f"import json, benchmarks; print(json.dumps(benchmarks.load_and_walk({path!r}, {form!r})))"
+                out = subprocess.run([sys.executable, "-c", code], cwd=here, check=True, capture_output=True, text=True).stdout
+                r = json.loads(out)
+                held = (r["after"] - r["before"]) * 1024
+                line = (f"  {r['nodes']:>9} nodes, {form:<4}  peak RSS {r['after'] / 1024:8.1f} MB (+{held / 1e6:7.1f} MB, {held / r['nodes']:5.1f} bytes/node)"
+                        f"   load {r['load']:6.2f} s   walk {r['nodes'] / r['walk'] / 1e6:5.2f} M nodes/s")
+                if r["scan"] is not None:
+                    line += f"   scan {r['nodes'] / r['scan'] / 1e6:5.2f} M nodes/s"
+                print(line)
+    for label, program in (("loop", LOOP_PROGRAM), ("recursion", RECURSION_PROGRAM)):
+        for engine in ("tree", "closure", "vm", "flat"):
+            report(f"{label}, lexical, {engine}", best_of(3, program, scoping="lexical", engine=engine))
+
+
+ARITHMETIC_PROGRAM = """
+func main() {
+  i = 0;
+  total = 0;
+  flag = true;
+  while (i < 20000) {
+    total = total + i * 3 - i / 7;
+    if (total > 1000000 || i == 17) { total = total - 1000000; }
+    flag = !flag && (i != 3);
+    total = total + flag;
+    i = i + 1;
+  }
+  print(total, flag);
+}
+"""
+
+
+# binary_operator on every operator and pair of operand types (int, bool,
+# str, nil, object): the int pair, the fastest and slowest other pair, and
+# the pairs that are a type error. then loops that are mostly arithmetic
+def bench_binary_ops():
+    interp = Interpreter(console_output=False)
+    binary_operator = interp.binary_operator
+    samples = [("int", 7), ("bool", True), ("str", "s"), ("nil", None), ("obj", Obj())]
+    calls = 20000
+    for op in brewops.BINARY_OPS:
+        times = {}
+        errors = []
+        for (name1, a), (name2, b) in [(x, y) for x in samples for y in samples]:
+            try:
+                binary_operator(op, a, b)
+            except Exception:
+                def run():
+                    for _ in range(calls):
+                        try:
+                            binary_operator(op, a, b)
+                        except Exception:
+                            pass
+                errors.append(timed(run) / calls)
+                continue
+
+            def run():
+                for _ in range(calls):
+                    binary_operator(op, a, b)
+            times[f"{name1},{name2}"] = min(timed(run) for _ in range(3)) / calls
+        int_pair = times.pop("int,int")
+        line = f"  {op:<3} int,int {int_pair * 1e9:6.0f} ns   {len(times):2} other pairs {min(times.values()) * 1e9:5.0f}-{max(times.values()) * 1e9:5.0f} ns"
+        if errors:
+            line += f"   {len(errors):2} type errors {sum(errors) / len(errors) * 1e9:6.0f} ns"
+        print(line)
+    for scoping, engine in (("dynamic", "tree"), ("lexical", "tree"), ("dynamic", "closure"), ("lexical", "closure")):
+        report(f"arithmetic loop, {scoping}, {engine}", best_of(3, ARITHMETIC_PROGRAM, scoping=scoping, engine=engine), 20000, "iter")
+
+
+# one + that sees ints and strs by turns, so it keeps being specialized
+# and deopted
+POLYMORPHIC_PROGRAM = """
+func add(a, b) { return a + b; }
+func main() {
+  i = 0;
+  s = "";
+  while (i < 5000) {
+    if (i / 100 * 100 == i) { s = add("x", "y"); }
+    j = i;
+    n = add(j, 1);
+    i = n;
+  }
+  print(i, s);
+}
+"""
+
+
+# the tree engine with and without quicken, and how many nodes it
+# specialized and deopted
+def bench_quicken():
+    workloads = [("loop", LOOP_PROGRAM, 30000), ("arithmetic", ARITHMETIC_PROGRAM, 20000), ("polymorphic", POLYMORPHIC_PROGRAM, 5000)]
+    for label, program, iterations in workloads:
+        for scoping in ("dynamic", "lexical"):
+            for quicken in (False, True):
+                seconds = best_of(3, program, scoping=scoping, quicken=quicken)
+                report(f"{label}, {scoping}, {'quicken' if quicken else 'generic'}", seconds, iterations, "iter")
+            _, interpreter = time_run(program, scoping=scoping, quicken=True)
+            stats = interpreter.quicken_stats()
+            forms = {}
+            for node in stats:
+                forms[type(node).__name__] = forms.get(type(node).__name__, 0) + 1
+            print(f"    {len(stats)} nodes specialized ({', '.join(f'{n} {name}' for name, n in sorted(forms.items()))}),"
+                  f" {sum(s for s, _ in stats.values())} specializations, {sum(d for _, d in stats.values())} deopts")
+
+
+def deep_recursion_program(kind, depth):
+    if kind == "tail":
+        return ("func count(n, acc) { if (n == 0) { return acc; } return count(n - 1, acc + 1); }\n"
+                f"func main() {{ print(count({depth}, 0)); }}")
+    return ("func down(n) { if (n == 0) { return 0; } return 1 + down(n - 1); }\n"
+            f"func main() {{ print(down({depth})); }}")
+
+
+def run_deep(kind, depth, engine):
+    # run in a fresh python by bench_deep_recursion, for its peak RSS
+    interpreter = Interpreter(console_output=False, scoping="lexical", engine=engine)
+    start = time.perf_counter()
+    try:
+        interpreter.run(deep_recursion_program(kind, depth))
+        error = None
+    except RecursionError:
+        error = "RecursionError"
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "error": error, "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+# recursion 10^3 to 10^6 calls deep, as a tail call (return count(...)) and
+# not (return 1 + down(...)), in a fresh python each: the tree walker nests
+# python calls for brewin calls, the vm keeps its frames in a list and
+# reuses the frame for a tail call
+def bench_deep_recursion():
+    here = os.path.dirname(os.path.abspath(__file__))
+    for kind in ("tail", "non-tail"):
+        for depth in (10 ** 3, 10 ** 5, 10 ** 6):
+            for engine in ("tree", "vm"):
+                code = f"import json, benchmarks; print(json.dumps(benchmarks.run_deep({kind!r}, {depth}, {engine!r})))"
+                out = subprocess.run([sys.executable, "-c", code], cwd=here, check=True, capture_output=True, text=True).stdout
+                r = json.loads(out)
+                label = f"{kind}, depth {depth}, {engine}"
+                if r["error"] is not None:
+                    print(f"  {label:<40} {r['error']}")
+                    continue
+                report(label, r["seconds"], depth, "call")
+                print(f"    peak RSS {r['rss'] / 1024:.1f} MB")
+
+
+# a loop whose body has an if that binds nothing and an if that binds a
+# block-local, so one block can skip its scope and the other takes one
+def block_scopes_program(iterations):
+    return f"""
+func main() {{
+  i = 0;
+  total = 0;
+  while (i < {iterations}) {{
+    if (i / 2 * 2 == i) {{ total = total + i; }}
+    if (i / 3 * 3 == i) {{ t = i; total = total - t; }}
+    i = i + 1;
+  }}
+  print(total);
+}}
+"""
+
+
+# per-iteration block scopes: how many blocks ran without one, took a
+# pooled one, or allocated one. every block allocated its scope before, so
+# "before" is all three added up, which grows linearly with the loop; it is
+# measured on 100000 iterations and scaled to 10M. what's allocated now
+# doesn't grow with the loop at all
+def bench_block_scopes():
+    iterations = 10 ** 5
+    program = block_scopes_program(iterations)
+    for scoping in ("dynamic", "lexical"):
+        for engine in ("tree", "closure"):
+            report(f"{scoping}, {engine}", best_of(3, program, scoping=scoping, engine=engine), iterations, "iter")
+            _, interpreter = time_run(program, scoping=scoping, engine=engine)
+            stats = interpreter.block_scope_stats()
+            before = sum(stats.values()) * (10 ** 7 // iterations)
+            print(f"    {stats['skipped']} blocks without a scope, {stats['reused']} reused, {stats['allocated']} allocated;"
+                  f" a 10M iteration loop allocated {before} before")
+
+
+# guards whose right operand is a recursive call that only matters once
+# every 100 iterations. lexical scoping: dynamically scoped calls can't
+# take an expression like n - 1 as an arg
+GUARD_PROGRAM = """
+func fib(n) { if (n < 2) { return n; } return fib(n - 1) + fib(n - 2); }
+func main() {
+  i = 0;
+  hits = 0;
+  while (i < 1000) {
+    if (i / 100 * 100 == i && fib(10) == 55) { hits = hits + 1; }
+    if (i / 100 * 100 != i || fib(10) == 55) { hits = hits + 1; }
+    i = i + 1;
+  }
+  print(hits);
+}
+"""
+
+
+# the guard loop in every engine, evaluating both operands of && and ||
+# and then short-circuiting
+def bench_short_circuit():
+    for engine, quicken in (("tree", False), ("tree", True), ("closure", False), ("vm", False), ("flat", False)):
+        label = engine + (" quicken" if quicken else "")
+        for short_circuit in (False, True):
+            seconds = best_of(3, GUARD_PROGRAM, scoping="lexical", engine=engine, quicken=quicken, short_circuit=short_circuit)
+            report(f"{label}, {'short-circuit' if short_circuit else 'both operands'}", seconds, 1000, "iter")
+
+
+# a loop full of literal-only expressions and branches that can't run
+CONSTANT_PROGRAM = """
+func main() {
+  i = 0;
+  seconds = 0;
+  label = "";
+  while (i < 5000) {
+    seconds = seconds + 60 * 60 * 24;
+    if (1 > 2 || false) { print("never"); }
+    if (10 / 5 == 2) { label = "day" + "s"; } else { label = "never"; }
+    while (0) { print("never"); }
+    i = i + 1;
+  }
+  print(seconds, label);
+}
+"""
+
+
+# CONSTANT_PROGRAM with and without the optimizer pass, what it changed,
+# and whether the output came out the same
+def bench_optimize():
+    for scoping, engine in (("dynamic", "tree"), ("lexical", "tree"), ("dynamic", "closure"), ("lexical", "vm")):
+        for optimize in (False, True):
+            seconds = best_of(3, CONSTANT_PROGRAM, scoping=scoping, engine=engine, optimize=optimize)
+            report(f"{scoping}, {engine}, {'optimized' if optimize else 'as parsed'}", seconds, 5000, "iter")
+        _, plain = time_run(CONSTANT_PROGRAM, scoping=scoping, engine=engine, optimize=False)
+        _, optimized = time_run(CONSTANT_PROGRAM, scoping=scoping, engine=engine)
+        changes = ", ".join(f"{n} {name.replace('_', ' ')}" for name, n in optimized.optimize_stats().items())
+        same = "same" if plain.get_output() == optimized.get_output() else "DIFFERENT"
+        print(f"    {changes}; {same} output")
+
+
+FIB_PROGRAM = """
+func fib(n) { if (n < 2) { return n; } return fib(n - 1) + fib(n - 2); }
+func main() { print(fib(30)); }
+"""
+
+
+# fib(30) without memoizing (1.6M calls, so one run each) and with it, and
+# the memo table's hit rate. lexical scoping: dynamically scoped calls can't
+# take an expression like n - 1 as an arg
+def bench_memoize():
+    for engine in ("tree", "closure", "vm", "flat"):
+        seconds, _ = time_run(FIB_PROGRAM, scoping="lexical", engine=engine, memoize=False)
+        report(f"fib(30), {engine}, not memoized", seconds)
+        report(f"fib(30), {engine}, memoized", best_of(3, FIB_PROGRAM, scoping="lexical", engine=engine))
+    _, interpreter = time_run(FIB_PROGRAM, scoping="lexical")
+    for name, stats in interpreter.memo_stats().items():
+        print(f"    {name}: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%}), {stats['entries']} entries")
+
+
+def string_building_program(size):
+    return f"""
+func main() {{
+  s = "";
+  i = 0;
+  while (i < {size}) {{
+    s = s + "x";
+    i = i + 1;
+  }}
+  print(s == "");
+}}
+"""
+
+
+# building a string one character at a time, with + making Ropes and, up
+# to 256 KB, with + on plain strs the way it was before, which copies the
+# whole string every time
+def bench_ropes():
+    concat = brewops.TABLE["+"][str][str]
+    for engine in ("tree", "vm"):
+        for size in (2 ** 16, 2 ** 18, 2 ** 20):
+            program = string_building_program(size)
+            report(f"{size // 1024} KB, {engine}, ropes", time_run(program, scoping="lexical", engine=engine)[0], size, "char")
+            if size > 2 ** 18:
+                continue
+            brewops.TABLE["+"][str][str] = operator.add
+            try:
+                report(f"{size // 1024} KB, {engine}, plain strs", time_run(program, scoping="lexical", engine=engine)[0], size, "char")
+            finally:
+                brewops.TABLE["+"][str][str] = concat
+
+
+# bench_sinks' sinks by name, each made from the path of a file it may write
+SINKS = {
+    "print per line": lambda path: None,
+    "log": lambda path: brewoutput.LogSink(),
+    "stdout": lambda path: brewoutput.StdoutSink(),
+    "file": brewoutput.FileSink,
+    "ring of 1000": lambda path: brewoutput.RingSink(1000),
+    "hash": lambda path: brewoutput.HashSink(),
+}
+
+
+def run_sink(kind, count):
+    # run in a fresh python by bench_sinks, for its peak RSS. stdout is
+    # /dev/null, line buffered like a terminal
+    sys.stdout = open(os.devnull, "w", buffering=1)
+    with tempfile.TemporaryDirectory() as directory:
+        sink = SINKS[kind](os.path.join(directory, "out.txt"))
+        try:
+            interpreter = Interpreter(console_output=False, sink=sink)
+            if sink is None:
+                # what output did before sinks
+                def output(v, log=[]):
+                    print(v)
+                    log.append(v)
+            else:
+                output = interpreter.output
+            lines = [f"line {k}" for k in range(1000)]
+            start = time.perf_counter()
+            for k in range(count // 1000):
+                for line in lines:
+                    output(line)
+            interpreter.flush()
+            seconds = time.perf_counter() - start
+        finally:
+            if sink is not None:
+                sink.close()
+    return {"seconds": seconds, "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+# 10M lines through each kind of output sink, in a fresh python each
+def bench_sinks():
+    count = 10 ** 7
+    here = os.path.dirname(os.path.abspath(__file__))
+    for kind in SINKS:
+        code = f"import json, sys, benchmarks; sys.__stdout__.write(json.dumps(benchmarks.run_sink({kind!r}, {count})))"
+        out = subprocess.run([sys.executable, "-c", code], cwd=here, check=True, capture_output=True, text=True).stdout
+        r = json.loads(out)
+        report(f"{kind}, {count} lines", r["seconds"], count, "line")
+        print(f"    peak RSS {r['rss'] / 1024:.1f} MB")
+
+
+BENCHMARKS = {
+    "fcall_dispatch": bench_fcall_dispatch,
+    "var_access": bench_var_access,
+    "engines": bench_engines,
+    "vm": bench_vm,
+    "value_copies": bench_value_copies,
+    "lambda_capture": bench_lambda_capture,
+    "objects": bench_objects,
+    "methods": bench_methods,
+    "ast_cache": bench_ast_cache,
+    "parse_threads": bench_parse_threads,
+    "startup": bench_startup,
+    "pratt": bench_pratt,
+    "tokenize": bench_tokenize,
+    "brewc": bench_brewc,
+    "nodes": bench_nodes,
+    "flat": bench_flat,
+    "binary_ops": bench_binary_ops,
+    "quicken": bench_quicken,
+    "deep_recursion": bench_deep_recursion,
+    "block_scopes": bench_block_scopes,
+    "short_circuit": bench_short_circuit,
+    "optimize": bench_optimize,
+    "memoize": bench_memoize,
+    "ropes": bench_ropes,
+    "sinks": bench_sinks,
+}
+
+
+def main(names):
+    for name in names or BENCHMARKS:
+        print(name)
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
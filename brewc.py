@@ -0,0 +1,210 @@
+# .brewc: a compact binary form of a parsed program, so a host can run a
+# program without importing the parser (or PLY). load() gives back the same
+# Element tree parse_program built
+#
+# layout: MAGIC, a version byte, the string table, then the program node.
+# the table is a varint count and each string as a varint byte length and
+# its UTF-8; every str in the tree (names, string values, elem_types of
+# unknown nodes) is written once there and referred to by index
+#
+# a value is a varint code followed by what the code needs:
+#   NONE, FALSE, TRUE   nothing
+#   INT                 the int, zigzag varint
+#   STR                 its string table index
+#   LIST                the item count, then the items
+#   GENERIC             a node of some other shape: its elem_type's string
+#                       index, its field count and each field's name index
+#                       and value
+#   NODE + k            a node laid out as LAYOUTS[k]: its field values in
+#                       order, without names
+
+from brewgc import gc_paused
+from element import Element, GenericElement, NODE_CLASSES
+from intbase import InterpreterBase
+
+MAGIC = b"BREWC"
+VERSION = 1
+
+NONE, FALSE, TRUE, INT, STR, LIST, GENERIC, NODE = range(8)
+
+BINARY_OPS = ("+", "-", "*", "/", "==", "!=", "<", "<=", ">", ">=", "&&", "||")
+
+# (elem_type, field names) of every node the grammar builds, fields in the
+# order brewparse passes them
+LAYOUTS = [
+    (InterpreterBase.PROGRAM_DEF, ("functions",)),
+    (InterpreterBase.FUNC_DEF, ("name", "args", "statements")),
+    (InterpreterBase.LAMBDA_DEF, ("args", "statements")),
+    (InterpreterBase.ARG_DEF, ("name",)),
+    (InterpreterBase.REFARG_DEF, ("name",)),
+    ("=", ("name", "expression")),
+    (InterpreterBase.IF_DEF, ("condition", "statements", "else_statements")),
+    (InterpreterBase.WHILE_DEF, ("condition", "statements")),
+    (InterpreterBase.RETURN_DEF, ("expression",)),
+    (InterpreterBase.NOT_DEF, ("op1",)),
+    (InterpreterBase.NEG_DEF, ("op1",)),
+    (InterpreterBase.INT_DEF, ("val",)),
+    (InterpreterBase.BOOL_DEF, ("val",)),
+    (InterpreterBase.STRING_DEF, ("val",)),
+    (InterpreterBase.NIL_DEF, ()),
+    (InterpreterBase.OBJ_DEF, ()),
+    (InterpreterBase.VAR_DEF, ("name",)),
+    (InterpreterBase.FCALL_DEF, ("name", "args")),
+    (InterpreterBase.MCALL_DEF, ("objref", "name", "args")),
+] + [(op, ("op1", "op2")) for op in BINARY_OPS]
+OPCODES = {elem_type: k for k, (elem_type, _) in enumerate(LAYOUTS)}
+# (elem_type, node class, field count) for each opcode
+NODE_BUILDERS = [(elem_type, NODE_CLASSES[elem_type], len(fields)) for elem_type, fields in LAYOUTS]
+
+
+def is_compiled(data):
+    # data is bytes, an mmap or the like holding a .brewc file
+    return not isinstance(data, (str, list)) and data[:len(MAGIC)] == MAGIC
+
+
+def write_varint(out, n):
+    while n > 0x7F:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+class Writer:
+    def __init__(self):
+        self.out = bytearray()
+        self.strings = {}  # str -> index in the table
+
+    def string(self, s):
+        index = self.strings.get(s)
+        if index is None:
+            index = len(self.strings)
+            self.strings[s] = index
+        write_varint(self.out, index)
+
+    def value(self, v):
+        out = self.out
+        if v is None:
+            out.append(NONE)
+        elif v is True:
+            out.append(TRUE)
+        elif v is False:
+            out.append(FALSE)
+        elif type(v) is int:
+            out.append(INT)
+            write_varint(out, v * 2 if v >= 0 else -v * 2 - 1)
+        elif type(v) is str:
+            out.append(STR)
+            self.string(v)
+        elif type(v) is list:
+            out.append(LIST)
+            write_varint(out, len(v))
+            for item in v:
+                self.value(item)
+        elif isinstance(v, Element):
+            self.node(v)
+        else:
+            raise TypeError(f"can't write a {type(v).__name__} to .brewc")
+
+    def node(self, node):
+        opcode = OPCODES.get(node.elem_type)
+        if opcode is not None and node.fields == LAYOUTS[opcode][1]:
+            write_varint(self.out, NODE + opcode)
+            for key in node.fields:
+                self.value(getattr(node, key))
+            return
+        write_varint(self.out, GENERIC)
+        self.string(node.elem_type)
+        write_varint(self.out, len(node.dict))
+        for key, v in node.dict.items():
+            self.string(key)
+            self.value(v)
+
+
+def dump(ast):
+    # the .brewc bytes for a tree from parse_program
+    writer = Writer()
+    writer.value(ast)
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+    write_varint(out, len(writer.strings))
+    for s in writer.strings:
+        encoded = s.encode()
+        write_varint(out, len(encoded))
+        out += encoded
+    out += writer.out
+    return bytes(out)
+
+
+class Reader:
+    def __init__(self, data, pos):
+        self.data = data
+        self.pos = pos
+        self.strings = []
+
+    def varint(self):
+        data = self.data
+        pos = self.pos
+        b = data[pos]
+        pos += 1
+        n = b & 0x7F
+        shift = 7
+        while b & 0x80:
+            b = data[pos]
+            pos += 1
+            n |= (b & 0x7F) << shift
+            shift += 7
+        self.pos = pos
+        return n
+
+    def value(self):
+        code = self.varint()
+        if code >= NODE:
+            elem_type, cls, count = NODE_BUILDERS[code - NODE]
+            # the fields, in the order the class's __init__ takes them
+            return cls(elem_type, *[self.value() for _ in range(count)])
+        if code == STR:
+            return self.strings[self.varint()]
+        if code == LIST:
+            return [self.value() for _ in range(self.varint())]
+        if code == NONE:
+            return None
+        if code == INT:
+            n = self.varint()
+            return n >> 1 if not n & 1 else -(n >> 1) - 1
+        if code == TRUE:
+            return True
+        if code == FALSE:
+            return False
+        if code == GENERIC:
+            elem_type = self.strings[self.varint()]
+            fields = {}
+            for _ in range(self.varint()):
+                key = self.strings[self.varint()]
+                fields[key] = self.value()
+            return GenericElement(elem_type, **fields)
+        raise ValueError(f"bad .brewc value code {code}")
+
+
+def load(data):
+    # the tree dump() was given
+    return read(data, Reader)
+
+
+def read(data, reader_class):
+    # checks the header, reads the string table into a reader_class(data,
+    # pos) and returns what its value() makes of the program node
+    if not is_compiled(data):
+        raise ValueError("not a .brewc file")
+    if data[len(MAGIC)] != VERSION:
+        raise ValueError(f".brewc version {data[len(MAGIC)]}, expected {VERSION}")
+    reader = reader_class(data, len(MAGIC) + 1)
+    # no cyclic GC while the tree is built (see brewgc)
+    with gc_paused():
+        try:
+            for _ in range(reader.varint()):
+                size = reader.varint()
+                reader.strings.append(bytes(data[reader.pos:reader.pos + size]).decode())
+                reader.pos += size
+            return reader.value()
+        except IndexError:
+            raise ValueError("truncated .brewc file") from None
@@ -0,0 +1,122 @@
+# on-disk cache of parsed programs, so a program that is run again skips
+# the PLY parse. each entry is one pickled Element tree in a file named by
+# the SHA-256 of the grammar version and the program text
+#
+# several interpreters may share a directory: entries are written to a temp
+# file and renamed into place, so a reader sees a whole entry or none, and
+# an entry that can't be read is treated as missing. once the directory is
+# over max_bytes the least recently used entries (oldest mtime; a hit
+# touches its file) are deleted
+import hashlib
+import os
+import pickle
+import tempfile
+
+import brewlex
+import brewparse
+import brewpratt
+import brewtokenize
+import element
+from brewparse import parse_program
+
+SUFFIX = '.ast'
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def source_hash(modules):
+    h = hashlib.sha256()
+    for module in modules:
+        with open(module.__file__, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+# changes whenever the lexer, either tokenizer, the grammar, the pratt parser
+# or the node classes do, so trees cached by an older parser are never loaded
+GRAMMAR_VERSION = source_hash([brewlex, brewtokenize, brewparse, brewpratt, element])
+
+
+class ASTCache:
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, program):
+        # program is a str, or bytes or an mmap of UTF-8 source, which are
+        # hashed as they are
+        h = hashlib.sha256(GRAMMAR_VERSION.encode())
+        h.update(program.encode() if isinstance(program, str) else program)
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def parse(self, program, parser="ply"):
+        # parse_program(program, parser), from the cache when it has the
+        # program. both parsers build the same tree, so they share entries
+        key = self.key(program)
+        ast = self.load(key)
+        if ast is not None:
+            self.hits += 1
+            return ast
+        self.misses += 1
+        ast = parse_program(program, parser)
+        self.store(key, ast)
+        return ast
+
+    def load(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                ast = pickle.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # cut short or written by something else: parse again, and the
+            # store after that replaces it
+            return None
+        return ast if isinstance(ast, element.Element) else None
+
+    def store(self, key, ast):
+        try:
+            data = pickle.dumps(ast, pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            return  # too deeply nested to pickle; just don't cache it
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self.path(key))
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(SUFFIX):
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue  # another interpreter evicted it
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
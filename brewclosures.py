@@ -0,0 +1,292 @@
+# closure compiling engine, used by Interpreter(engine='closure')
+# each function body is compiled once into a tree of python closures, one per
+# AST node, with the operator and the compiled children already bound in.
+# running a function then just calls closures instead of re-dispatching on
+# elem_type strings at every node.
+#
+# anything with heavy semantics (calls, methods, lambdas, object fields) goes
+# back through the Interpreter methods so the results match the tree walker
+import weakref
+
+from intbase import InterpreterBase, ErrorType
+from brewvalues import Closure, cow_copy
+from brewops import TABLE
+
+
+class ClosureCompiler:
+    def __init__(self, interp):
+        self.interp = interp
+        # keyed by func or lambda node, every Closure made from a lambda
+        # shares its compiled body
+        self.codes = weakref.WeakKeyDictionary()
+
+    # returns a no-arg callable that runs the body like Interpreter.run_func
+    def compile_func(self, func_node):
+        if type(func_node) is Closure:
+            func_node = func_node.node
+        code = self.codes.get(func_node)
+        if code is None:
+            code = self.compile_body(func_node.statements, True)
+            self.codes[func_node] = code
+        return code
+
+    def compile_body(self, statements, is_func):
+        codes = []
+        for statement in statements:
+            code = self.compile_statement(statement)
+            if code is not None:
+                codes.append(code)
+            if is_func and statement.elem_type == InterpreterBase.RETURN_DEF:
+                break  # run_func stops at a top-level return
+        codes = tuple(codes)
+
+        def run_body():
+            for code in codes:
+                ret = code()
+                if ret is not None:
+                    return ret
+            return None
+        return run_body
+
+    # statements
+
+    def compile_statement(self, node):
+        kind = node.elem_type
+        interp = self.interp
+        if kind == '=':
+            return self.compile_assignment(node)
+        elif kind == InterpreterBase.FCALL_DEF:
+            if node.name == 'print':
+                return self.compile_print(node)
+            return lambda: interp.fcall(node)
+        elif kind == InterpreterBase.IF_DEF:
+            return self.compile_if(node)
+        elif kind == InterpreterBase.WHILE_DEF:
+            return self.compile_while(node)
+        elif kind == InterpreterBase.RETURN_DEF:
+            return self.compile_return(node)
+        elif kind == InterpreterBase.MCALL_DEF:
+            return lambda: interp.mcall(node)
+        return None  # other expression statements are never evaluated
+
+    def compile_assignment(self, node):
+        interp = self.interp
+        source = node.expression
+        if source.elem_type == InterpreterBase.OBJ_DEF:
+            return lambda: interp.do_assignment(node)
+        value = self.compile_expression(source)
+        name = node.name
+        if '.' in name:
+            def run_field_assignment():
+                return interp.assign(node, value())
+            return run_field_assignment
+
+        if interp.lexical:
+            depth, slot = node.addr
+
+            def run_lexical_assignment():
+                v = value()
+                frame = interp.frame
+                for _ in range(depth):
+                    frame = frame.parent
+                target = frame.slots[slot]
+                if target is None:
+                    return interp.assign(node, v)
+                target.setVal(v)
+            return run_lexical_assignment
+
+        def run_assignment():
+            v = value()
+            scopes = interp.scopes
+            i = len(scopes) - 1
+            while i >= 0:
+                vars_to_val = scopes[i]['vars_to_val']
+                if name in vars_to_val:
+                    vars_to_val[name].setVal(v)
+                    return None
+                i -= 1
+            return interp.assign(node, v)
+        return run_assignment
+
+    def compile_print(self, node):
+        interp = self.interp
+        args = tuple(self.compile_expression(arg) for arg in node.args)
+        print_str = interp.print_str
+
+        def run_print():
+            outstr = ""
+            for arg in args:
+                outstr += print_str(arg())
+            interp.output(outstr)
+        return run_print
+
+    def compile_condition(self, node, what):
+        interp = self.interp
+        cond = self.compile_expression(node.condition)
+        message = f"condition of {what} must be type bool or int"
+
+        def run_condition():
+            c = cond()
+            if type(c) is bool:
+                return c
+            if type(c) is int:
+                return c != 0
+            interp.error(ErrorType.TYPE_ERROR, message,)
+        return run_condition
+
+    def compile_if(self, node):
+        interp = self.interp
+        cond = self.compile_condition(node, "if statement")
+        then_body = self.compile_body(node.statements, False)
+        if node.else_statements is not None:
+            else_body = self.compile_body(node.else_statements, False)
+        else:
+            else_body = None
+
+        def run_if():
+            interp.push_block('if', node)
+            if cond():
+                ret = then_body()
+            elif else_body is not None:
+                ret = else_body()
+            else:
+                ret = None
+            interp.pop_block(node)
+            return ret
+        return run_if
+
+    def compile_while(self, node):
+        interp = self.interp
+        cond = self.compile_condition(node, "while loop")
+        body = self.compile_body(node.statements, False)
+
+        def run_while():
+            while cond():
+                interp.push_block('while', node)
+                ret = body()
+                interp.pop_block(node)
+                if ret is not None:
+                    return ret
+            return None
+        return run_while
+
+    def compile_return(self, node):
+        if node.expression is None:
+            return lambda: None
+        value = self.compile_expression(node.expression)
+
+        def run_return():
+            r = value()
+            if r == InterpreterBase.NIL_DEF:
+                return None
+            return cow_copy(r)
+        return run_return
+
+    # expressions
+
+    def compile_expression(self, node):
+        kind = node.elem_type
+        interp = self.interp
+        if kind in (InterpreterBase.STRING_DEF, InterpreterBase.INT_DEF, InterpreterBase.BOOL_DEF):
+            val = node.val
+            return lambda: val
+        elif kind == InterpreterBase.NIL_DEF:
+            return lambda: None
+        elif kind == InterpreterBase.VAR_DEF:
+            return self.compile_variable(node)
+        elif kind in ('||', '&&') and interp.short_circuit:
+            return self.compile_logical_operator(node)
+        elif kind in ('+', '-', '*', '/', '<', '>', '<=', '>=', '!=', '==', '||', '&&'):
+            return self.compile_binary_operator(node)
+        elif kind == InterpreterBase.FCALL_DEF:
+            name = node.name
+            if name == 'inputi':
+                return lambda: interp.do_inputi_fcall(node)
+            elif name == 'inputs':
+                return lambda: interp.do_inputs_fcall(node)
+            elif name == 'print':
+                return self.compile_print(node)
+            return lambda: interp.fcall(node)
+        elif kind == InterpreterBase.LAMBDA_DEF:
+            return lambda: interp.create_lambda(node)
+        elif kind == InterpreterBase.NEG_DEF or kind == InterpreterBase.NOT_DEF:
+            op1 = self.compile_expression(node.op1)
+            unary_operator = interp.unary_operator
+            return lambda: unary_operator(kind, op1())
+        elif kind == InterpreterBase.MCALL_DEF:
+            return lambda: interp.mcall(node)
+        return lambda: None
+
+    def compile_variable(self, node):
+        interp = self.interp
+        name = node.name
+        if '.' in name:
+            return lambda: interp.get_value_of_variable(node)
+
+        if interp.lexical:
+            if node.addr is None:
+                return lambda: interp.get_value_of_variable(node)
+            depth, slot = node.addr
+
+            def run_lexical_variable():
+                frame = interp.frame
+                for _ in range(depth):
+                    frame = frame.parent
+                val = frame.slots[slot]
+                if val is None:
+                    return interp.get_value_of_variable(node)
+                return val.getVal()
+            return run_lexical_variable
+
+        def run_variable():
+            scopes = interp.scopes
+            i = len(scopes) - 1
+            while i >= 0:
+                vars_to_val = scopes[i]['vars_to_val']
+                if name in vars_to_val:
+                    return vars_to_val[name].getVal()
+                i -= 1
+            return interp.get_value_of_variable(node)
+        return run_variable
+
+    def compile_binary_operator(self, node):
+        op = node.elem_type
+        op1 = self.compile_expression(node.op1)
+        op2 = self.compile_expression(node.op2)
+        binary_operator = self.interp.binary_operator
+        # this operator's row of the brewops table, without the type errors:
+        # those and objects go through the interpreter
+        handlers = {t1: {t2: handler for t2, handler in row.items() if type(handler) is not str}
+                    for t1, row in TABLE[op].items()}
+
+        def run_binary_operator():
+            a = op1()
+            b = op2()
+            try:
+                handler = handlers[type(a)][type(b)]
+            except KeyError:
+                return binary_operator(op, a, b)
+            return handler(a, b)
+        return run_binary_operator
+
+    def compile_logical_operator(self, node):
+        # short_circuit mode, see brewops.short_circuit
+        op = node.elem_type
+        op1 = self.compile_expression(node.op1)
+        op2 = self.compile_expression(node.op2)
+        binary_operator = self.interp.binary_operator
+
+        if op == '&&':
+            def run_and():
+                a = op1()
+                if not a and (type(a) is bool or type(a) is int):
+                    return False
+                return binary_operator('&&', a, op2())
+            return run_and
+
+        def run_or():
+            a = op1()
+            if a and (type(a) is bool or type(a) is int):
+                return True
+            return binary_operator('||', a, op2())
+        return run_or
@@ -0,0 +1,551 @@
+# struct-of-arrays form of a parsed program, for machine-generated programs
+# with millions of nodes, where the Element objects are most of the memory
+# and walking them jumps all over the heap. a node is an index into parallel
+# array('i') columns:
+#   kind          brewc's opcode for the node's elem_type (LAYOUTS order),
+#                 or LIST / NONE for a list field and a None field
+#   first_child   the node's first child, -1 if it has none
+#   next_sibling  the next child of the same parent, -1 if it's the last
+#   literal       index into literals of the node's scalar fields (a name or
+#                 value; (objref, name) for an mcall), -1 if it has none
+#   line          source line; -1, the parsers don't record lines yet
+# the children are the node's list, node and None fields in field order, so
+# an if is condition, statements, else_statements (a NONE if there's no
+# else) and a list's children are its items. node 0 is the program
+#
+# lower() makes one from an Element tree, load() from .brewc bytes without
+# building the tree at all, and to_element() turns it back into the tree
+#
+# FlatEvaluator runs one by index with the semantics of
+# Interpreter(scoping='lexical'). it only does ints, bools, strings and
+# functions called by name; Interpreter(engine='flat') gives programs with
+# objects, lambdas or function values to the tree engine instead
+import copy
+from array import array
+
+import brewc
+from brewc import LAYOUTS, NODE, OPCODES
+from brewops import short_circuit
+from brewresolve import Frame, FuncContext
+from brewvalues import Val
+from element import NODE_CLASSES
+from intbase import InterpreterBase, ErrorType
+
+LIST = len(LAYOUTS)
+NONE = LIST + 1
+KIND_NAMES = [elem_type for elem_type, _ in LAYOUTS] + ['list', 'none']
+
+# fields kept in the literal column instead of as children
+SCALAR_FIELDS = ('name', 'objref', 'val')
+
+LAMBDA = OPCODES[InterpreterBase.LAMBDA_DEF]
+REFARG = OPCODES[InterpreterBase.REFARG_DEF]
+ASSIGN = OPCODES['=']
+IF = OPCODES[InterpreterBase.IF_DEF]
+WHILE = OPCODES[InterpreterBase.WHILE_DEF]
+RETURN = OPCODES[InterpreterBase.RETURN_DEF]
+NOT = OPCODES[InterpreterBase.NOT_DEF]
+NEG = OPCODES[InterpreterBase.NEG_DEF]
+INT = OPCODES[InterpreterBase.INT_DEF]
+BOOL = OPCODES[InterpreterBase.BOOL_DEF]
+STRING = OPCODES[InterpreterBase.STRING_DEF]
+OBJ = OPCODES[InterpreterBase.OBJ_DEF]
+VAR = OPCODES[InterpreterBase.VAR_DEF]
+FCALL = OPCODES[InterpreterBase.FCALL_DEF]
+MCALL = OPCODES[InterpreterBase.MCALL_DEF]
+BINARY = range(OPCODES[brewc.BINARY_OPS[0]], LIST)
+ADD, SUB, MUL, DIV, EQ, NE, LT, LE, GT, GE, AND, OR = (OPCODES[op] for op in brewc.BINARY_OPS)
+
+
+class FlatTree:
+    __slots__ = ('kind', 'first_child', 'next_sibling', 'literal', 'line', 'literals')
+
+    def __init__(self):
+        self.kind = array('i')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.literal = array('i')
+        self.line = array('i')
+        self.literals = []
+
+    def __len__(self):
+        return len(self.kind)
+
+    def children(self, i):
+        child = self.first_child[i]
+        while child >= 0:
+            yield child
+            child = self.next_sibling[child]
+
+
+class Builder:
+    # appends nodes to a FlatTree, sharing equal literals
+    def __init__(self):
+        self.tree = FlatTree()
+        self.literal_index = {}
+
+    def node(self, kind):
+        tree = self.tree
+        i = len(tree.kind)
+        tree.kind.append(kind)
+        tree.first_child.append(-1)
+        tree.next_sibling.append(-1)
+        tree.literal.append(-1)
+        tree.line.append(-1)
+        return i
+
+    def set_literal(self, i, scalars):
+        value = scalars[0] if len(scalars) == 1 else tuple(scalars)
+        key = (type(value), value)
+        index = self.literal_index.get(key)
+        if index is None:
+            index = len(self.tree.literals)
+            self.literal_index[key] = index
+            self.tree.literals.append(value)
+        self.tree.literal[i] = index
+
+    def link(self, parent, prev, child):
+        if prev < 0:
+            self.tree.first_child[parent] = child
+        else:
+            self.tree.next_sibling[prev] = child
+        return child
+
+    def value(self, v):
+        if v is None:
+            return self.node(NONE)
+        if type(v) is list:
+            i = self.node(LIST)
+            prev = -1
+            for item in v:
+                prev = self.link(i, prev, self.value(item))
+            return i
+        kind = OPCODES.get(v.elem_type)
+        if kind is None or v.fields != LAYOUTS[kind][1]:
+            raise ValueError(f"can't lower a {v.elem_type} node")
+        i = self.node(kind)
+        prev = -1
+        scalars = []
+        for key in v.fields:
+            if key in SCALAR_FIELDS:
+                scalars.append(getattr(v, key))
+            else:
+                prev = self.link(i, prev, self.value(getattr(v, key)))
+        if scalars:
+            self.set_literal(i, scalars)
+        return i
+
+
+def lower(ast):
+    builder = Builder()
+    builder.value(ast)
+    return builder.tree
+
+
+class Loader(brewc.Reader):
+    # reads .brewc into a Builder instead of making Elements
+    def __init__(self, data, pos):
+        super().__init__(data, pos)
+        self.builder = Builder()
+
+    def value(self):
+        self.field()
+        return self.builder.tree
+
+    def field(self):
+        # (node index, None) for a node, list or None; (-1, value) for a scalar
+        builder = self.builder
+        code = self.varint()
+        if code >= NODE:
+            kind = code - NODE
+            i = builder.node(kind)
+            prev = -1
+            scalars = []
+            for _ in LAYOUTS[kind][1]:
+                child, value = self.field()
+                if child < 0:
+                    scalars.append(value)
+                else:
+                    prev = builder.link(i, prev, child)
+            if scalars:
+                builder.set_literal(i, scalars)
+            return i, None
+        if code == brewc.STR:
+            return -1, self.strings[self.varint()]
+        if code == brewc.LIST:
+            i = builder.node(LIST)
+            prev = -1
+            for _ in range(self.varint()):
+                prev = builder.link(i, prev, self.field()[0])
+            return i, None
+        if code == brewc.NONE:
+            return builder.node(NONE), None
+        if code == brewc.INT:
+            n = self.varint()
+            return -1, n >> 1 if not n & 1 else -(n >> 1) - 1
+        if code == brewc.TRUE:
+            return -1, True
+        if code == brewc.FALSE:
+            return -1, False
+        if code == brewc.GENERIC:
+            raise ValueError(f"can't lower a {self.strings[self.varint()]} node")
+        raise ValueError(f"bad .brewc value code {code}")
+
+
+def load(data):
+    # the FlatTree of a .brewc file
+    return brewc.read(data, Loader)
+
+
+def to_element(tree, i=0):
+    kind = tree.kind[i]
+    if kind == NONE:
+        return None
+    if kind == LIST:
+        return [to_element(tree, child) for child in tree.children(i)]
+    elem_type, fields = LAYOUTS[kind]
+    scalars = tree.literals[tree.literal[i]] if tree.literal[i] >= 0 else None
+    if type(scalars) is not tuple:
+        scalars = (scalars,)
+    scalars = iter(scalars)
+    children = tree.children(i)
+    values = [next(scalars) if key in SCALAR_FIELDS else to_element(tree, next(children)) for key in fields]
+    return NODE_CLASSES[elem_type](elem_type, *values)
+
+
+class Unsupported(Exception):
+    pass
+
+
+class FlatEvaluator:
+    def __init__(self, interp, tree):
+        self.interp = interp
+        self.kind = tree.kind
+        self.first_child = tree.first_child
+        self.next_sibling = tree.next_sibling
+        self.literal = tree.literal
+        self.literals = tree.literals
+        # the resolver's annotations, as columns: (depth, slot) of a var, =
+        # or fcall, and the slot count of a func, if or while
+        self.depth = array('i', [-1]) * len(tree)
+        self.slot = array('i', [-1]) * len(tree)
+        self.func_table = {}  # name -> arg count -> func node
+        self.memo_tables = {}  # func node -> MemoTable, for the pure funcs
+        self.frame = None
+
+    def name(self, i):
+        return self.literals[self.literal[i]]
+
+    def count(self, i):
+        n = 0
+        child = self.first_child[i]
+        while child >= 0:
+            n += 1
+            child = self.next_sibling[child]
+        return n
+
+    def memoize(self, tables):
+        # tables is the Element tree's func node -> MemoTable
+        for f, table in tables.items():
+            self.memo_tables[self.func_table[f.name][len(f.args)]] = table
+
+    # resolving, as brewresolve does for the tree
+
+    def resolve(self):
+        # False if the program needs something this evaluator doesn't do
+        try:
+            func = self.first_child[self.first_child[0]]
+            while func >= 0:
+                self.func_table.setdefault(self.name(func), {}).setdefault(self.count(self.first_child[func]), func)
+                self.resolve_func(func)
+                func = self.next_sibling[func]
+        except Unsupported:
+            return False
+        return True
+
+    def resolve_func(self, func):
+        ctx = FuncContext(func, None)
+        ctx.enter_block()
+        args = self.first_child[func]
+        arg = self.first_child[args]
+        while arg >= 0:
+            ctx.declare(self.name(arg))
+            arg = self.next_sibling[arg]
+        ctx.declare(InterpreterBase.THIS_DEF)
+        self.resolve_statements(ctx, self.next_sibling[args])
+        self.slot[func] = ctx.sizes[0]
+
+    def resolve_statements(self, ctx, statements):
+        statement = self.first_child[statements]
+        while statement >= 0:
+            self.resolve_statement(ctx, statement)
+            statement = self.next_sibling[statement]
+
+    def set_addr(self, i, addr):
+        if addr is not None:
+            self.depth[i], self.slot[i] = addr
+
+    def resolve_statement(self, ctx, i):
+        kind = self.kind[i]
+        if kind == ASSIGN:
+            self.resolve_expression(ctx, self.first_child[i])
+            name = self.name(i)
+            if '.' in name:
+                raise Unsupported(name)
+            addr = ctx.lookup(name)
+            self.set_addr(i, addr if addr is not None else ctx.declare(name))
+        elif kind == IF:
+            ctx.enter_block()
+            condition = self.first_child[i]
+            self.resolve_expression(ctx, condition)
+            statements = self.next_sibling[condition]
+            self.resolve_statements(ctx, statements)
+            else_statements = self.next_sibling[statements]
+            if self.kind[else_statements] == LIST:
+                ctx.blocks[-1] = {}
+                self.resolve_statements(ctx, else_statements)
+            self.slot[i] = ctx.exit_block()
+        elif kind == WHILE:
+            condition = self.first_child[i]
+            self.resolve_expression(ctx, condition)
+            ctx.enter_block()
+            self.resolve_statements(ctx, self.next_sibling[condition])
+            self.slot[i] = ctx.exit_block()
+        elif kind == RETURN:
+            expression = self.first_child[i]
+            if self.kind[expression] != NONE:
+                self.resolve_expression(ctx, expression)
+        else:
+            self.resolve_expression(ctx, i)
+
+    def resolve_expression(self, ctx, i):
+        kind = self.kind[i]
+        if kind == VAR:
+            name = self.name(i)
+            addr = ctx.lookup(name)
+            if addr is None or '.' in name or name == InterpreterBase.THIS_DEF:
+                # a field, a function used as a value, or an error the tree
+                # engine reports
+                raise Unsupported(name)
+            self.set_addr(i, addr)
+        elif kind == FCALL:
+            self.set_addr(i, ctx.lookup(self.name(i)))
+            arg = self.first_child[self.first_child[i]]
+            while arg >= 0:
+                self.resolve_expression(ctx, arg)
+                arg = self.next_sibling[arg]
+        elif kind in BINARY:
+            op1 = self.first_child[i]
+            self.resolve_expression(ctx, op1)
+            self.resolve_expression(ctx, self.next_sibling[op1])
+        elif kind == NEG or kind == NOT:
+            self.resolve_expression(ctx, self.first_child[i])
+        elif kind == MCALL or kind == LAMBDA or kind == OBJ:
+            raise Unsupported(KIND_NAMES[kind])
+
+    # running
+
+    def run_main(self):
+        main = None
+        func = self.first_child[self.first_child[0]]
+        while func >= 0:
+            if self.name(func) == 'main':
+                main = func
+            func = self.next_sibling[func]
+        if main is None:
+            self.interp.error(ErrorType.NAME_ERROR, "No main() function was found",)
+        self.frame = Frame(self.slot[main])
+        self.run_func(main)
+
+    def lookup(self, i):
+        slot = self.slot[i]
+        if slot < 0:
+            return None
+        frame = self.frame
+        for _ in range(self.depth[i]):
+            frame = frame.parent
+        return frame.slots[slot]
+
+    def run_func(self, func):
+        return self.run_block(self.next_sibling[self.first_child[func]], True)
+
+    def run_block(self, statements, body=False):
+        kind = self.kind
+        next_sibling = self.next_sibling
+        statement = self.first_child[statements]
+        while statement >= 0:
+            ret = self.run_statement(statement)
+            if ret is not None:
+                return ret
+            if body and kind[statement] == RETURN:
+                break  # run_func stops at a top-level return
+            statement = next_sibling[statement]
+        return None
+
+    def run_statement(self, i):
+        kind = self.kind[i]
+        if kind == ASSIGN:
+            value = self.evaluate(self.first_child[i])
+            frame = self.frame
+            for _ in range(self.depth[i]):
+                frame = frame.parent
+            val = frame.slots[self.slot[i]]
+            if val is None:
+                frame.slots[self.slot[i]] = Val(value)
+            else:
+                val.setVal(value)
+        elif kind == FCALL:
+            if self.name(i) == 'print':
+                return self.print_call(i)
+            return self.call(i)
+        elif kind == IF:
+            self.frame = Frame(self.slot[i], self.frame)
+            condition = self.first_child[i]
+            statements = self.next_sibling[condition]
+            ret = None
+            if self.condition(condition, "if statement"):
+                ret = self.run_block(statements)
+            else:
+                else_statements = self.next_sibling[statements]
+                if self.kind[else_statements] == LIST:
+                    ret = self.run_block(else_statements)
+            self.frame = self.frame.parent
+            return ret
+        elif kind == WHILE:
+            condition = self.first_child[i]
+            statements = self.next_sibling[condition]
+            while self.condition(condition, "while loop"):
+                self.frame = Frame(self.slot[i], self.frame)
+                ret = self.run_block(statements)
+                # the condition is checked outside the body's frame
+                self.frame = self.frame.parent
+                if ret is not None:
+                    return ret
+        elif kind == RETURN:
+            expression = self.first_child[i]
+            if self.kind[expression] == NONE:
+                return None
+            r = self.evaluate(expression)
+            if r == InterpreterBase.NIL_DEF:
+                return None
+            return r
+        return None
+
+    def condition(self, i, what):
+        cond = self.evaluate(i)
+        if type(cond) is bool:
+            return cond
+        if type(cond) is not int:
+            self.interp.error(ErrorType.TYPE_ERROR, f"condition of {what} must be type bool or int",)
+        return cond != 0
+
+    def evaluate(self, i):
+        kind = self.kind[i]
+        if kind == VAR:
+            val = self.lookup(i)
+            if val is None:
+                self.interp.error(ErrorType.NAME_ERROR, f"Variable {self.name(i)} has not been defined",)
+            return val.getVal()
+        if kind in BINARY:
+            op1 = self.first_child[i]
+            a = self.evaluate(op1)
+            if kind >= AND and self.interp.short_circuit:
+                result = short_circuit(KIND_NAMES[kind], a)
+                if result is not None:
+                    return result
+            b = self.evaluate(self.next_sibling[op1])
+            if type(a) is int and type(b) is int:
+                if kind == ADD:
+                    return a + b
+                if kind == SUB:
+                    return a - b
+                if kind == LT:
+                    return a < b
+                if kind == MUL:
+                    return a * b
+                if kind == EQ:
+                    return a == b
+                if kind == GT:
+                    return a > b
+                if kind == DIV:
+                    return a // b
+                if kind == NE:
+                    return a != b
+                if kind == LE:
+                    return a <= b
+                if kind == GE:
+                    return a >= b
+            return self.interp.binary_operator(KIND_NAMES[kind], a, b)
+        if kind == INT or kind == STRING or kind == BOOL:
+            return self.literals[self.literal[i]]
+        if kind == FCALL:
+            name = self.name(i)
+            if name == 'inputi' or name == 'inputs':
+                return self.input_call(i, name)
+            if name == 'print':
+                return self.print_call(i)
+            return self.call(i)
+        if kind == NEG or kind == NOT:
+            return self.interp.unary_operator(KIND_NAMES[kind], self.evaluate(self.first_child[i]))
+        return None  # nil
+
+    def print_call(self, i):
+        interp = self.interp
+        outstr = ""
+        arg = self.first_child[self.first_child[i]]
+        while arg >= 0:
+            outstr += interp.print_str(self.evaluate(arg))
+            arg = self.next_sibling[arg]
+        interp.output(outstr)
+        return None
+
+    def input_call(self, i, name):
+        interp = self.interp
+        args = self.first_child[i]
+        num_args = self.count(args)
+        if num_args == 1:
+            interp.output(str(self.evaluate(self.first_child[args])))
+        elif num_args > 1:
+            interp.error(ErrorType.NAME_ERROR, f"{name} function can only have 1 or 0 args",)
+        user_input = interp.get_input()
+        if user_input == None:
+            kind = "an integer" if name == 'inputi' else "a string"
+            interp.error(ErrorType.FAULT_ERROR, f"{name} function takes in {kind}",)
+        return int(user_input) if name == 'inputi' else user_input
+
+    def call(self, i):
+        name = self.name(i)
+        args = self.first_child[i]
+        func = self.func_table.get(name, {}).get(self.count(args))
+        if func is None:
+            # there are no function values here, so a variable by that name
+            # can't be called
+            if self.lookup(i) is not None:
+                self.interp.error(ErrorType.TYPE_ERROR, f"Function {name} isn't a function",)
+            self.interp.error(ErrorType.NAME_ERROR, f"Function {name} wasn't found",)
+        # args are evaluated in the caller's frame, the callee gets a fresh one
+        frame = Frame(self.slot[func])
+        k = 0
+        formal = self.first_child[self.first_child[func]]
+        arg = self.first_child[args]
+        while arg >= 0:
+            if self.kind[formal] == REFARG and self.kind[arg] == VAR:
+                val = self.lookup(arg)
+                if val is None:
+                    self.interp.error(ErrorType.NAME_ERROR, f"Variable {self.name(arg)} has not been defined",)
+                # shares the env dict, so writes go back to the caller's var
+                frame.slots[k] = copy.copy(val)
+            else:
+                frame.slots[k] = Val(self.evaluate(arg))
+            k += 1
+            formal = self.next_sibling[formal]
+            arg = self.next_sibling[arg]
+        table = self.memo_tables.get(func)
+        caller_frame = self.frame
+        self.frame = frame
+        if table is None:
+            ret = self.run_func(func)
+        else:
+            ret = table.call(self.run_func, func, [val.getVal() for val in frame.slots[:k]])
+        self.frame = caller_frame
+        return ret
@@ -0,0 +1,30 @@
+# pausing the cyclic GC while a tree is built, for brewpratt and brewc. it
+# imports nothing of the parser, so loading a .brewc doesn't load PLY
+import contextlib
+import gc
+import threading
+
+# the cyclic GC is off while any thread is building a tree: trees have no
+# cycles, and it would otherwise rescan the growing tree over and over as
+# nodes pile up. the GC is the whole process's, so the first build to start
+# turns it off and the last one to finish puts it back the way it was
+gc_lock = threading.Lock()
+gc_pauses = 0
+gc_was_enabled = False
+
+
+@contextlib.contextmanager
+def gc_paused():
+    global gc_pauses, gc_was_enabled
+    with gc_lock:
+        if gc_pauses == 0:
+            gc_was_enabled = gc.isenabled()
+            gc.disable()
+        gc_pauses += 1
+    try:
+        yield
+    finally:
+        with gc_lock:
+            gc_pauses -= 1
+            if gc_pauses == 0 and gc_was_enabled:
+                gc.enable()
@@ -0,0 +1,75 @@
+# command line entry point
+#   python brewin.py compile prog.brewin -o prog.brewc
+#   python brewin.py run prog.brewin    (or prog.brewc)
+import argparse
+import os
+import sys
+
+import brewc
+from brewoutput import FileSink, HashSink
+
+
+def compile_file(args):
+    from brewparse import parse_program
+
+    with open(args.file, 'rb') as f:
+        ast = parse_program(f.read().decode(), args.parser)
+    output = args.output or os.path.splitext(args.file)[0] + '.brewc'
+    with open(output, 'wb') as f:
+        f.write(brewc.dump(ast))
+
+
+def run_file(args):
+    from interpreterv4 import Interpreter
+
+    with open(args.file, 'rb') as f:
+        program = f.read()
+    if not brewc.is_compiled(program):
+        program = program.decode()
+    sink = None
+    if args.output:
+        sink = FileSink(args.output)
+    elif args.hash:
+        sink = HashSink()
+    interpreter = Interpreter(scoping=args.scoping, engine=args.engine, parser=args.parser, quicken=args.quicken,
+                              short_circuit=args.short_circuit, optimize=not args.no_optimize,
+                              memoize=not args.no_memoize, memo_size=args.memo_size, sink=sink)
+    try:
+        interpreter.run(program)
+    finally:
+        if sink is not None:
+            sink.close()
+    if args.hash and not args.output:
+        print(f"{sink.count} lines, sha256 {sink.hexdigest()}")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='brewin')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    compile_parser = commands.add_parser('compile', help='parse a program and write it as .brewc')
+    compile_parser.add_argument('file')
+    compile_parser.add_argument('-o', '--output', help='defaults to the file with a .brewc suffix')
+    compile_parser.add_argument('--parser', choices=('ply', 'pratt'), default='ply')
+    compile_parser.set_defaults(func=compile_file)
+
+    run_parser = commands.add_parser('run', help='run a program from source or .brewc')
+    run_parser.add_argument('file')
+    run_parser.add_argument('--scoping', choices=('dynamic', 'lexical'), default='dynamic')
+    run_parser.add_argument('--engine', choices=('tree', 'closure', 'vm', 'flat'), default='tree')
+    run_parser.add_argument('--parser', choices=('ply', 'pratt'), default='ply')
+    run_parser.add_argument('--quicken', action='store_true', help='specialize hot nodes of the tree engine')
+    run_parser.add_argument('--short-circuit', action='store_true', help="skip the right operand of && and || when the left one decides")
+    run_parser.add_argument('--no-optimize', action='store_true', help="don't fold constants or drop dead branches before running")
+    run_parser.add_argument('--no-memoize', action='store_true', help="don't keep the results of calls to pure functions")
+    run_parser.add_argument('--output', help='write the output to this file instead of stdout')
+    run_parser.add_argument('--hash', action='store_true', help='print only the line count and sha256 of the output')
+    run_parser.add_argument('--memo-size', type=int, default=1024, help='results kept per pure function')
+    run_parser.set_defaults(func=run_file)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
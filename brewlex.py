@@ -126,5 +126,11 @@ def t_error(t):
     t.lexer.skip(1)
 
 
-# Build the lexer
-lex.lex()
\ No newline at end of file
+# Build the lexer, from the tables brewtables.py generates when they're
+# there. without them it is built from the rules above, which is slower but
+# writes no files either
+try:
+    import brewlextab
+except ImportError:
+    brewlextab = None
+lexer = lex.lex(optimize=brewlextab is not None, lextab=brewlextab)
\ No newline at end of file
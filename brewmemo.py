@@ -0,0 +1,172 @@
+# memoizing pure functions, used by Interpreter(memoize=True)
+#
+# pure_functions finds the top-level funcs whose result depends only on
+# their args: no print, inputi or inputs, no method calls, no writes to
+# object fields, no ref args and no lambdas (so nothing can write to a
+# captured var), and every call is to a func that's pure too. with dynamic
+# scoping a callee sees its callers' vars, so a pure func there may only
+# read and assign its own args
+#
+# a call to a pure func whose args are all ints, bools, strs or nil looks
+# its args up in the func's MemoTable first. a table holds the results of
+# the last size calls that returned one of those types, least recently used
+# first. lambdas and methods are never memoized: their captures and this
+# are state the args don't show
+from collections import OrderedDict
+
+from brewops import BINARY_OPS
+from intbase import InterpreterBase
+
+BUILTINS = ('print', 'inputi', 'inputs')
+MISS = object()  # MemoTable.lookup's answer when the args aren't in it
+
+
+def args_key(values):
+    # the table key for these arg values, or None if some value isn't a
+    # primitive. types are part of it, since 1 == true
+    key = []
+    for v in values:
+        t = type(v)
+        if t is not int and t is not str and t is not bool and v is not None:
+            return None
+        key.append(t)
+        key.append(v)
+    return tuple(key)
+
+
+def is_primitive(v):
+    return v is None or type(v) is int or type(v) is str or type(v) is bool
+
+
+class MemoTable:
+    __slots__ = ('name', 'size', 'results', 'hits', 'misses')
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key):
+        result = self.results.get(key, MISS)
+        if result is MISS:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.results.move_to_end(key)
+        return result
+
+    def store(self, key, result):
+        if not is_primitive(result):
+            return
+        self.results[key] = result
+        if len(self.results) > self.size:
+            self.results.popitem(last=False)
+
+    def call(self, run, func, values):
+        # run(func) for these arg values, unless the table has its result
+        key = args_key(values)
+        if key is None:
+            return run(func)
+        result = self.lookup(key)
+        if result is MISS:
+            result = run(func)
+            self.store(key, result)
+        return result
+
+    def stats(self):
+        calls = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / calls if calls else 0.0, 'entries': len(self.results)}
+
+
+def pure_functions(functions, lexical):
+    # the func nodes that are pure, as described at the top
+    funcs = {}
+    for f in functions:
+        funcs.setdefault((f.name, len(f.args)), f)  # first def wins
+    callees = {}
+    for key, f in funcs.items():
+        calls = PurityCheck(f, lexical, funcs).run()
+        if calls is not None:
+            callees[key] = calls
+    # drop funcs that call one that isn't pure, until none are left to drop
+    changed = True
+    while changed:
+        changed = False
+        for key in list(callees):
+            if not callees[key] <= callees.keys():
+                del callees[key]
+                changed = True
+    return [funcs[key] for key in callees]
+
+
+class Impure(Exception):
+    pass
+
+
+class PurityCheck:
+    def __init__(self, func, lexical, funcs):
+        self.func = func
+        self.lexical = lexical
+        self.funcs = funcs
+        self.args = {arg.name for arg in func.args}
+        self.calls = set()  # (name, arg count) of the funcs it calls
+
+    def run(self):
+        # the funcs it calls, or None if it isn't pure itself
+        if any(arg.elem_type == InterpreterBase.REFARG_DEF for arg in self.func.args):
+            return None
+        try:
+            self.statements(self.func.statements)
+        except Impure:
+            return None
+        return self.calls
+
+    def name(self, name):
+        if '.' in name or not (self.lexical or name in self.args):
+            raise Impure()
+
+    def statements(self, statements):
+        for statement in statements:
+            self.statement(statement)
+
+    def statement(self, node):
+        kind = node.elem_type
+        if kind == '=':
+            self.name(node.name)
+            self.expression(node.expression)
+        elif kind == InterpreterBase.FCALL_DEF or kind == InterpreterBase.MCALL_DEF:
+            self.expression(node)
+        elif kind == InterpreterBase.IF_DEF:
+            self.expression(node.condition)
+            self.statements(node.statements)
+            if node.else_statements is not None:
+                self.statements(node.else_statements)
+        elif kind == InterpreterBase.WHILE_DEF:
+            self.expression(node.condition)
+            self.statements(node.statements)
+        elif kind == InterpreterBase.RETURN_DEF:
+            if node.expression is not None:
+                self.expression(node.expression)
+
+    def expression(self, node):
+        kind = node.elem_type
+        if kind == InterpreterBase.VAR_DEF:
+            self.name(node.name)
+        elif kind == InterpreterBase.FCALL_DEF:
+            key = (node.name, len(node.args))
+            # a func by that name is called before any var is looked at
+            if node.name in BUILTINS or key not in self.funcs:
+                raise Impure()
+            self.calls.add(key)
+            for arg in node.args:
+                self.expression(arg)
+        elif kind == InterpreterBase.MCALL_DEF or kind == InterpreterBase.LAMBDA_DEF:
+            raise Impure()
+        elif kind == InterpreterBase.NEG_DEF or kind == InterpreterBase.NOT_DEF:
+            self.expression(node.op1)
+        elif kind in BINARY_OPS:
+            self.expression(node.op1)
+            self.expression(node.op2)
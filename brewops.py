@@ -0,0 +1,151 @@
+# binary operators as a table: HANDLERS[(op, type(a), type(b))] is the
+# function computing a op b for ints, bools, strs and nil, so the
+# interpreter finds it with dict lookups instead of testing the types and
+# then the operator one branch at a time. an entry that is a str is the
+# message of the TYPE_ERROR the operands give. operands of any other type
+# (objects, functions) use OTHER_HANDLERS[op]. the engines index the same
+# entries as TABLE[op][type(a)][type(b)], which skips building a tuple key
+#
+# the results are the interpreter's, quirks included: int/bool mixes
+# coerce the bool for arithmetic, != between an int and a bool gives the
+# same answer as ==, && of a nonzero int and false (either way round) is
+# nil, and two nils compare false under every operator but ==
+#
+# + on strs makes a Rope (see brewvalues) once the result is long enough.
+# a Rope has the entries of a str, and the str handlers take either
+import operator
+
+from brewvalues import Obj, Rope, concat, is_function
+
+BINARY_OPS = ('+', '-', '*', '/', '==', '!=', '<', '<=', '>', '>=', '&&', '||')
+SCALAR_TYPES = (int, bool, str, Rope, type(None))
+
+MIXED_ERROR = "Incompatible types for binary operation"
+
+INT_HANDLERS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.floordiv,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '&&': lambda a, b: a != 0 and b != 0,
+    '||': lambda a, b: a != 0 or b != 0,
+}
+
+BOOL_HANDLERS = {
+    '+': lambda a, b: int(a) + int(b),
+    '-': lambda a, b: int(a) - int(b),
+    '*': lambda a, b: int(a) * int(b),
+    '/': lambda a, b: int(a) // int(b),
+    '==': operator.eq,
+    '!=': operator.ne,
+    '&&': lambda a, b: a and b,
+    '||': lambda a, b: a or b,
+}
+
+STR_HANDLERS = {
+    '+': concat,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+# an int op a bool, and (flipped) a bool op an int
+INT_BOOL_HANDLERS = {
+    '+': lambda a, b: a + int(b),
+    '-': lambda a, b: a - int(b),
+    '*': lambda a, b: a * int(b),
+    '/': lambda a, b: a // int(b),
+    '&&': lambda a, b: a != 0 if b else (False if a == 0 else None),
+    '||': lambda a, b: b or a != 0,
+    '==': lambda a, b: (a != 0) == b,
+    '!=': lambda a, b: (a != 0) == b,
+}
+BOOL_INT_HANDLERS = {
+    '+': lambda a, b: int(a) + b,
+    '-': lambda a, b: int(a) - b,
+    '*': lambda a, b: int(a) * b,
+    '/': lambda a, b: int(a) // b,
+    '&&': lambda a, b: b != 0 if a else (False if b == 0 else None),
+    '||': lambda a, b: a or b != 0,
+    '==': lambda a, b: (b != 0) == a,
+    '!=': lambda a, b: (b != 0) == a,
+}
+
+
+def same_function(a, b):
+    # == on two functions: funcs and lambdas are equal to their own kind
+    # with the same name, args and body (and captures, for lambdas)
+    if a.elem_type == 'func':
+        return b.elem_type == 'func' and a.name == b.name and a.args == b.args and a.statements == b.statements
+    if a.elem_type == 'lambda':
+        return (b.elem_type == 'lambda' and a.name == b.name and a.args == b.args
+                and a.statements == b.statements and a.closures == b.closures)
+    return False
+
+
+def other_equal(a, b):
+    if is_function(a) and is_function(b):
+        return same_function(a, b)
+    if type(a) is Obj and type(b) is Obj:
+        return a is b
+    return False
+
+
+def other_not_equal(a, b):
+    return not other_equal(a, b)
+
+
+def scalar_handler(op, t1, t2):
+    if t1 is Rope or t2 is Rope:
+        return scalar_handler(op, str if t1 is Rope else t1, str if t2 is Rope else t2)
+    if t1 is int and t2 is int:
+        return INT_HANDLERS[op]
+    if t1 is bool and t2 is bool:
+        return BOOL_HANDLERS.get(op, "Incompatible types for boolean comparison")
+    if t1 is str and t2 is str:
+        return STR_HANDLERS.get(op, "Incompatible types for string operations")
+    if t1 is type(None) and t2 is type(None):
+        return (lambda a, b: True) if op == '==' else (lambda a, b: False)
+    if t1 is int and t2 is bool:
+        return INT_BOOL_HANDLERS.get(op, MIXED_ERROR)
+    if t1 is bool and t2 is int:
+        return BOOL_INT_HANDLERS.get(op, MIXED_ERROR)
+    if op == '==':
+        return lambda a, b: False
+    if op == '!=':
+        return lambda a, b: True
+    return MIXED_ERROR
+
+
+HANDLERS = {
+    (op, t1, t2): scalar_handler(op, t1, t2)
+    for op in BINARY_OPS for t1 in SCALAR_TYPES for t2 in SCALAR_TYPES
+}
+TABLE = {op: {t1: {t2: HANDLERS[op, t1, t2] for t2 in SCALAR_TYPES} for t1 in SCALAR_TYPES}
+         for op in BINARY_OPS}
+OTHER_HANDLERS = {op: MIXED_ERROR for op in BINARY_OPS}
+OTHER_HANDLERS['=='] = other_equal
+OTHER_HANDLERS['!='] = other_not_equal
+
+
+# Interpreter(short_circuit=True) only evaluates the right operand of && and
+# || when the left one doesn't decide the result: false or 0 makes && false,
+# true or a nonzero int makes || true. this gives that result, or None when
+# the right operand is needed and the operator runs as usual (left operands
+# of other types still get their type error that way)
+LOGICAL_OPS = ('&&', '||')
+
+
+def short_circuit(op, a):
+    if type(a) is bool or type(a) is int:
+        if op == '&&':
+            if not a:
+                return False
+        elif a:
+            return True
+    return None
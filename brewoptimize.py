@@ -0,0 +1,186 @@
+# constant folding and dead-branch pruning on the Element tree, run between
+# parsing and running (Interpreter(optimize=False) turns it off)
+#
+# an operator whose operands are all literals is replaced by a literal of
+# its value. binary operators use brewops' handlers and unary ones the
+# checks in Interpreter.unary_operator, so the coercions are the runtime's;
+# an operator that would raise (a type error, dividing by 0) is left alone
+# to raise when it runs
+#
+# an if whose condition folds to a bool or an int loses the branch that
+# can't run. without an else, an if that can't run goes away. an if that
+# keeps only its else keeps it as its one branch under a true condition, so
+# it still runs in a block of its own (a block scope, and the rule that a
+# nil return in a block doesn't leave the function). a while whose
+# condition folds to false goes away
+#
+# with dynamic scoping the args of user calls are never folded: those calls
+# take a non-variable arg's val straight off the node instead of evaluating
+# it, so folding one would turn an error into a value
+from brewops import TABLE, BINARY_OPS, LOGICAL_OPS, short_circuit
+from brewvalues import Rope
+from element import Const, Nil
+from intbase import InterpreterBase
+
+LITERAL_TYPES = {
+    int: InterpreterBase.INT_DEF,
+    bool: InterpreterBase.BOOL_DEF,
+    str: InterpreterBase.STRING_DEF,
+}
+LITERALS = (InterpreterBase.INT_DEF, InterpreterBase.BOOL_DEF, InterpreterBase.STRING_DEF, InterpreterBase.NIL_DEF)
+BUILTINS = ('print', 'inputi', 'inputs')
+
+NO_VALUE = object()  # fold()'s answer for an operator that can't be folded
+
+
+def is_literal(node):
+    return node.elem_type in LITERALS
+
+
+def literal_value(node):
+    if node.elem_type == InterpreterBase.NIL_DEF:
+        return None
+    return node.val
+
+
+def literal(value):
+    if type(value) is Rope:
+        value = str(value)  # a literal is joined once, here
+    if value is None:
+        return Nil(InterpreterBase.NIL_DEF)
+    return Const(LITERAL_TYPES[type(value)], value)
+
+
+def binary_value(op, a, b):
+    handler = TABLE[op][type(a)][type(b)]
+    if type(handler) is str:
+        return NO_VALUE
+    try:
+        return handler(a, b)
+    except ZeroDivisionError:
+        return NO_VALUE
+
+
+def unary_value(op, a):
+    if op == InterpreterBase.NEG_DEF:
+        return -a if isinstance(a, int) else NO_VALUE
+    if type(a) is bool:
+        return not a
+    if type(a) is int:
+        return a == 0
+    return NO_VALUE
+
+
+class Optimizer:
+    def __init__(self, interp):
+        self.fold_call_args = interp.lexical
+        self.short_circuit = interp.short_circuit
+        # folded: operators replaced by a literal. ifs_removed and
+        # whiles_removed: statements that could never run their body.
+        # branches_removed: then or else branches of ifs that were kept
+        self.stats = {'folded': 0, 'ifs_removed': 0, 'branches_removed': 0, 'whiles_removed': 0}
+
+    def optimize(self, ast):
+        for func in ast.functions:
+            func.statements = self.statements(func.statements)
+        return ast
+
+    # statements
+
+    def statements(self, statements):
+        kept = []
+        for statement in statements:
+            statement = self.statement(statement)
+            if statement is not None:
+                kept.append(statement)
+        return kept
+
+    def statement(self, node):
+        # the statement to run instead of node, or None for none at all
+        kind = node.elem_type
+        if kind == '=':
+            if node.expression.elem_type != InterpreterBase.OBJ_DEF:
+                node.expression = self.expression(node.expression)
+        elif kind == InterpreterBase.FCALL_DEF or kind == InterpreterBase.MCALL_DEF:
+            self.call_args(node, True)
+        elif kind == InterpreterBase.RETURN_DEF:
+            if node.expression is not None:
+                node.expression = self.expression(node.expression)
+        elif kind == InterpreterBase.IF_DEF:
+            return self.if_statement(node)
+        elif kind == InterpreterBase.WHILE_DEF:
+            node.condition = self.expression(node.condition)
+            node.statements = self.statements(node.statements)
+            if self.condition(node.condition) is False:
+                self.stats['whiles_removed'] += 1
+                return None
+        return node
+
+    def if_statement(self, node):
+        node.condition = self.expression(node.condition)
+        node.statements = self.statements(node.statements)
+        if node.else_statements is not None:
+            node.else_statements = self.statements(node.else_statements)
+        condition = self.condition(node.condition)
+        if condition is True and node.else_statements is not None:
+            node.else_statements = None
+            self.stats['branches_removed'] += 1
+        elif condition is False:
+            if node.else_statements is None:
+                self.stats['ifs_removed'] += 1
+                return None
+            node.condition = literal(True)
+            node.statements = node.else_statements
+            node.else_statements = None
+            self.stats['branches_removed'] += 1
+        return node
+
+    def condition(self, node):
+        # True or False for a literal condition, None if it's only known
+        # when it runs (or is a type error then)
+        if node.elem_type == InterpreterBase.BOOL_DEF:
+            return node.val
+        if node.elem_type == InterpreterBase.INT_DEF:
+            return node.val != 0
+        return None
+
+    def call_args(self, node, is_statement):
+        if not self.fold_call_args:
+            # print always evaluates its args; inputi and inputs do when
+            # they're called for their value
+            builtin = node.elem_type == InterpreterBase.FCALL_DEF and (
+                node.name == 'print' or (not is_statement and node.name in BUILTINS))
+            if not builtin:
+                return
+        node.args = [self.expression(arg) for arg in node.args]
+
+    # expressions
+
+    def expression(self, node):
+        # the expression to evaluate instead of node
+        kind = node.elem_type
+        if kind in BINARY_OPS:
+            node.op1 = self.expression(node.op1)
+            if self.short_circuit and kind in LOGICAL_OPS and is_literal(node.op1):
+                result = short_circuit(kind, literal_value(node.op1))
+                if result is not None:
+                    self.stats['folded'] += 1
+                    return literal(result)
+            node.op2 = self.expression(node.op2)
+            if is_literal(node.op1) and is_literal(node.op2):
+                return self.fold(node, binary_value(kind, literal_value(node.op1), literal_value(node.op2)))
+        elif kind == InterpreterBase.NEG_DEF or kind == InterpreterBase.NOT_DEF:
+            node.op1 = self.expression(node.op1)
+            if is_literal(node.op1):
+                return self.fold(node, unary_value(kind, literal_value(node.op1)))
+        elif kind == InterpreterBase.FCALL_DEF or kind == InterpreterBase.MCALL_DEF:
+            self.call_args(node, False)
+        elif kind == InterpreterBase.LAMBDA_DEF:
+            node.statements = self.statements(node.statements)
+        return node
+
+    def fold(self, node, value):
+        if value is NO_VALUE:
+            return node
+        self.stats['folded'] += 1
+        return literal(value)
@@ -0,0 +1,150 @@
+# where InterpreterBase.output sends the program's output. a sink has
+# write(line) for each line (without its newline), flush() to push out what
+# it has buffered, close() for when the run's output is done, and lines()
+# for the lines it kept, which is what get_output returns
+#
+# the interpreter's default, without a sink, is a LogSink on output_log,
+# teed with a StdoutSink when console_output is on
+import collections
+import sys
+
+
+class Sink:
+    def write(self, line):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def lines(self):
+        return []
+
+
+class LogSink(Sink):
+    # every line, in a list (unbounded)
+    def __init__(self, log=None):
+        self.log = [] if log is None else log
+        self.write = self.log.append
+
+    def lines(self):
+        return self.log
+
+
+class StdoutSink(Sink):
+    # block buffered: lines are joined and written about size characters at
+    # a time, instead of a write (and with a terminal, a syscall) per line.
+    # stream None is whatever sys.stdout is when the buffer is written
+    def __init__(self, size=1 << 16, stream=None):
+        self.size = size
+        self.stream = stream
+        self.pending = []
+        self.pending_size = 0
+
+    def write(self, line):
+        self.pending.append(line)
+        self.pending_size += len(line) + 1
+        if self.pending_size >= self.size:
+            self.write_pending()
+
+    def write_pending(self):
+        if self.pending:
+            stream = self.stream if self.stream is not None else sys.stdout
+            self.pending.append('')
+            stream.write('\n'.join(self.pending))
+            self.pending = []
+            self.pending_size = 0
+
+    def flush(self):
+        self.write_pending()
+        (self.stream if self.stream is not None else sys.stdout).flush()
+
+
+class FileSink(Sink):
+    # the lines go to the file at path, through a size character buffer
+    def __init__(self, path, size=1 << 16):
+        self.file = open(path, 'w', buffering=size)
+
+    def write(self, line):
+        self.file.write(line + '\n')
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class RingSink(Sink):
+    # only the last size lines
+    def __init__(self, size):
+        self.ring = collections.deque(maxlen=size)
+        self.write = self.ring.append
+
+    def lines(self):
+        return list(self.ring)
+
+
+class HashSink(Sink):
+    # keeps none of the lines, only how many there were and a hash of the
+    # output (each line and a newline, as UTF-8), to compare a run against
+    # golden output: see output_hash
+    def __init__(self, algorithm='sha256', batch=4096):
+        # imported here, like in brewcache, to keep it out of starting up
+        import hashlib
+        self.hash = hashlib.new(algorithm)
+        self.batch = batch
+        self.count = 0
+        self.pending = []
+
+    def write(self, line):
+        self.pending.append(line)
+        if len(self.pending) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.pending.append('')
+            self.hash.update('\n'.join(self.pending).encode())
+            self.count += len(self.pending) - 1
+            self.pending = []
+
+    def hexdigest(self):
+        self.flush()
+        return self.hash.hexdigest()
+
+
+def output_hash(lines, algorithm='sha256'):
+    # what HashSink.hexdigest gives for a run that output lines
+    import hashlib
+    h = hashlib.new(algorithm)
+    for line in lines:
+        h.update((line + '\n').encode())
+    return h.hexdigest()
+
+
+class TeeSink(Sink):
+    # each line to every one of sinks; lines() are those of the first one
+    # that keeps lines
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def write(self, line):
+        for sink in self.sinks:
+            sink.write(line)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def lines(self):
+        for sink in self.sinks:
+            if type(sink).lines is not Sink.lines:
+                return sink.lines()
+        return []
@@ -1,3 +1,7 @@
+import copy
+
+import brewpratt
+import brewtokenize
 from element import Element
 from brewlex import *
 from intbase import InterpreterBase
@@ -233,13 +237,60 @@ def p_error(p):
         print("Syntax error at EOF")
 
 
-# exported function
-def parse_program(program):
-    ast = yacc.parse(program)
-    if ast is None:
-        raise SyntaxError("Syntax error")
-    return ast
-
-
-# generate our parser
-yacc.yacc()
\ No newline at end of file
+class Parser:
+    # an LR parser of its own, so Parsers in different threads can parse at
+    # the same time. the tables are built once and shared; what a parse
+    # changes (the parser's stacks) belongs to the Parser. one Parser parses
+    # one program at a time. tokens come from brewtokenize, which takes a
+    # str, bytes or an mmap; the lexer is only there for PLY to hang on the
+    # tokens it reports errors for
+    def __init__(self):
+        self.lexer = lexer.clone()
+        self.parser = copy.copy(lr_parser)
+
+    def parse(self, program):
+        ast = self.parser.parse(lexer=self.lexer, tokenfunc=brewtokenize.tokenfunc(program))
+        if ast is None:
+            raise SyntaxError("Syntax error")
+        return ast
+
+
+# idle Parsers for parse_program. list append and pop are atomic, so
+# threads share it without a lock
+parser_pool = []
+
+
+# exported function. parser="pratt" parses with brewpratt's hand-written
+# parser; a program it rejects is parsed again by PLY, so syntax errors are
+# reported the same either way
+def parse_program(program, parser="ply"):
+    if parser not in ("ply", "pratt"):
+        raise ValueError(f"unknown parser {parser}")
+    if parser == "pratt" and isinstance(program, str):
+        try:
+            return brewpratt.parse(program)
+        except (brewpratt.ParseError, RecursionError):
+            pass
+    try:
+        parser = parser_pool.pop()
+    except IndexError:
+        parser = Parser()
+    try:
+        return parser.parse(program)
+    finally:
+        parser_pool.append(parser)
+
+
+# generate our parser. optimize loads brewparsetab (see brewtables.py)
+# without checking it against the rules here, so it has to be regenerated
+# whenever they change. without it the tables are built in memory
+try:
+    import brewparsetab
+except ImportError:
+    brewparsetab = None
+lr_parser = yacc.yacc(
+    tabmodule=brewparsetab or "brewparsetab",
+    optimize=brewparsetab is not None,
+    write_tables=False,
+    debug=False,
+)
\ No newline at end of file
@@ -0,0 +1,267 @@
+# hand-written parser for the grammar in brewparse.py: one regex pass to
+# tokenize, then recursive descent for statements and precedence climbing
+# (Pratt) for expressions. it builds the same node trees, field for
+# field, as the PLY parser, without PLY's per-token objects and callbacks
+#
+# it doesn't report syntax errors itself: it raises ParseError, and
+# parse_program hands the program to PLY, which prints the usual messages
+# and does its usual error recovery
+import re
+import string
+
+from element import Arg, Assign, BinOp, Const, FCall, Func, If, Lambda, MCall, NewObj, Nil, Program, Return, UnaryOp, Var, While
+from intbase import InterpreterBase
+from brewlex import reserved_map
+from brewgc import gc_paused
+
+
+class ParseError(Exception):
+    pass
+
+
+# the same tokens PLY's master regex finds with the rules in brewlex. each
+# match is the whitespace and at most one comment before a token, with the
+# token in the group; the group is empty for a comment. anything that
+# isn't a token is left in it as one character, which tokenize() rejects
+TOKEN_RE = re.compile(
+    r"[ \t\n]*(?:/\*[\s\S]*?\*/|("
+    r"\d+"
+    r"|[A-Za-z_][\w_]*"
+    r'|"[^"\n]*"'
+    r"|\|\||&&|==|!=|>=|<="
+    r"|[-(){},.;@=+*/<>!]"
+    r"|[^ \t\n]))"
+)
+OPERATORS = {"||", "&&", "==", "!=", ">=", "<=", "(", ")", "{", "}", ",", ".", ";", "@", "=", "+", "-", "*", "/", "<", ">", "!"}
+NAME_START = set(string.ascii_letters + "_")
+
+# binding power of each binary operator, from brewparse's precedence table.
+# all of them are left associative. the unary ones bind tighter than any
+BINARY = {
+    "||": 1,
+    "&&": 2,
+    "==": 3, "!=": 3, ">=": 3, ">": 3, "<=": 3, "<": 3,
+    "+": 4, "-": 4,
+    "*": 5, "/": 5,
+}
+UNARY = 6
+
+
+def tokenize(program):
+    # parallel lists of token kinds and values, ending with a None kind.
+    # a kind is 'NAME', 'NUMBER', 'STRING', the reserved word or the
+    # operator itself
+    kinds = []
+    values = []
+    for text in TOKEN_RE.findall(program):
+        if not text:
+            continue
+        c = text[0]
+        if c in NAME_START:
+            kinds.append(text if text in reserved_map else "NAME")
+            values.append(text)
+        elif text in OPERATORS:
+            kinds.append(text)
+            values.append(text)
+        elif c.isdecimal():  # what \d matches
+            kinds.append("NUMBER")
+            values.append(int(text))
+        elif c == '"' and len(text) > 1:
+            kinds.append("STRING")
+            values.append(text[1:-1])
+        else:
+            raise ParseError(f"Illegal character {c}")
+    kinds.append(None)
+    values.append(None)
+    return kinds, values
+
+
+class PrattParser:
+    def __init__(self, program):
+        # the None at the end of the tokens is repeated once for each token
+        # the parser looks ahead (statement() looks 3 past a NAME), so no
+        # lookahead reads past the list: at the end of input the parser sees
+        # None and raises ParseError
+        kinds, values = tokenize(program)
+        self.kinds = kinds + [None] * 3
+        self.values = values + [None] * 3
+        self.pos = 0
+
+    def expect(self, kind):
+        pos = self.pos
+        if self.kinds[pos] != kind:
+            raise ParseError(f"expected {kind} at token {pos}")
+        self.pos = pos + 1
+        return self.values[pos]
+
+    def program(self):
+        functions = [self.func()]
+        while self.kinds[self.pos] is not None:
+            functions.append(self.func())
+        return Program(InterpreterBase.PROGRAM_DEF, functions)
+
+    def func(self):
+        self.expect("func")
+        name = self.expect("NAME")
+        args = self.formal_args()
+        statements = self.statements()
+        return Func(InterpreterBase.FUNC_DEF, name, args, statements)
+
+    def lambda_(self):
+        self.expect("lambda")
+        args = self.formal_args()
+        statements = self.statements()
+        return Lambda(InterpreterBase.LAMBDA_DEF, args, statements)
+
+    def formal_args(self):
+        self.expect("(")
+        args = []
+        if self.kinds[self.pos] == ")":
+            self.pos += 1
+            return args
+        while True:
+            if self.kinds[self.pos] == "ref":
+                self.pos += 1
+                args.append(Arg(InterpreterBase.REFARG_DEF, self.expect("NAME")))
+            else:
+                args.append(Arg(InterpreterBase.ARG_DEF, self.expect("NAME")))
+            if self.kinds[self.pos] != ",":
+                break
+            self.pos += 1
+        self.expect(")")
+        return args
+
+    def statements(self):
+        # a brace block; the grammar wants at least one statement in it
+        self.expect("{")
+        statements = [self.statement()]
+        while self.kinds[self.pos] != "}":
+            statements.append(self.statement())
+        self.pos += 1
+        return statements
+
+    def statement(self):
+        kinds = self.kinds
+        pos = self.pos
+        kind = kinds[pos]
+        if kind == "NAME":
+            if kinds[pos + 1] == "=":
+                name = self.values[pos]
+                self.pos = pos + 2
+                return self.assignment(name)
+            if kinds[pos + 1] == "." and kinds[pos + 2] == "NAME" and kinds[pos + 3] == "=":
+                name = self.values[pos] + "." + self.values[pos + 2]
+                self.pos = pos + 4
+                return self.assignment(name)
+        elif kind == "if":
+            self.pos += 1
+            condition = self.condition()
+            statements = self.statements()
+            else_statements = None
+            if self.kinds[self.pos] == "else":
+                self.pos += 1
+                else_statements = self.statements()
+            return If(InterpreterBase.IF_DEF, condition, statements, else_statements)
+        elif kind == "while":
+            self.pos += 1
+            condition = self.condition()
+            statements = self.statements()
+            return While(InterpreterBase.WHILE_DEF, condition, statements)
+        elif kind == "return":
+            self.pos += 1
+            expr = None
+            if self.kinds[self.pos] != ";":
+                expr = self.expression(0)
+            self.expect(";")
+            return Return(InterpreterBase.RETURN_DEF, expr)
+        expr = self.expression(0)
+        self.expect(";")
+        return expr
+
+    def assignment(self, name):
+        expr = self.expression(0)
+        self.expect(";")
+        return Assign("=", name, expr)
+
+    def condition(self):
+        self.expect("(")
+        expr = self.expression(0)
+        self.expect(")")
+        return expr
+
+    def expression(self, min_power):
+        # operators binding tighter than min_power go into this expression
+        left = self.operand()
+        kinds = self.kinds
+        while True:
+            op = kinds[self.pos]
+            power = BINARY.get(op)
+            if power is None or power <= min_power:
+                return left
+            self.pos += 1
+            left = BinOp(op, left, self.expression(power))
+
+    def operand(self):
+        pos = self.pos
+        kind = self.kinds[pos]
+        value = self.values[pos]
+        self.pos = pos + 1
+        if kind == "NAME":
+            return self.name(value)
+        if kind == "NUMBER":
+            return Const(InterpreterBase.INT_DEF, value)
+        if kind == "STRING":
+            return Const(InterpreterBase.STRING_DEF, value)
+        if kind == "(":
+            expr = self.expression(0)
+            self.expect(")")
+            return expr
+        if kind == "!":
+            return UnaryOp(InterpreterBase.NOT_DEF, self.expression(UNARY))
+        if kind == "-":
+            return UnaryOp(InterpreterBase.NEG_DEF, self.expression(UNARY))
+        if kind == "true" or kind == "false":
+            return Const(InterpreterBase.BOOL_DEF, value == InterpreterBase.TRUE_DEF)
+        if kind == "nil":
+            return Nil(InterpreterBase.NIL_DEF)
+        if kind == "@":
+            return NewObj(InterpreterBase.OBJ_DEF)
+        if kind == "lambda":
+            self.pos = pos
+            return self.lambda_()
+        raise ParseError(f"unexpected {kind} at token {pos}")
+
+    def name(self, name):
+        # a var, a.b, a call or a method call, after the first NAME
+        kinds = self.kinds
+        pos = self.pos
+        if kinds[pos] == "(":
+            return FCall(InterpreterBase.FCALL_DEF, name, self.args())
+        if kinds[pos] == ".":
+            field = self.values[pos + 1]
+            if kinds[pos + 1] != "NAME":
+                raise ParseError(f"expected NAME at token {pos + 1}")
+            self.pos = pos + 2
+            if kinds[pos + 2] == "(":
+                return MCall(InterpreterBase.MCALL_DEF, name, field, self.args())
+            return Var(InterpreterBase.VAR_DEF, name + "." + field)
+        return Var(InterpreterBase.VAR_DEF, name)
+
+    def args(self):
+        self.expect("(")
+        args = []
+        if self.kinds[self.pos] == ")":
+            self.pos += 1
+            return args
+        args.append(self.expression(0))
+        while self.kinds[self.pos] == ",":
+            self.pos += 1
+            args.append(self.expression(0))
+        self.expect(")")
+        return args
+
+
+def parse(program):
+    # the program's tree, or ParseError if it isn't one the grammar accepts
+    with gc_paused():
+        return PrattParser(program).program()
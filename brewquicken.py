@@ -0,0 +1,163 @@
+# adaptive specialization ("quickening") for the tree engine, used by
+# Interpreter(quicken=True). binary operators and variable reads start out
+# generic and count down their warmup as they run. when it reaches 0 the
+# node is rewritten in place for the operand types it saw that time: its
+# __class__ becomes one of the specialized subclasses below, which have the
+# same slots, so the node keeps its fields and annotations. a specialized
+# node checks its guard (the operands are still ints, the local is still
+# set, ...) every time, and the first time the guard fails it goes back to
+# the generic class and warms up again
+#
+# counters keeps, for every node that was ever specialized, how many times
+# it was specialized and how many times it was deopted
+import weakref
+
+from element import BinOp, Var, Const, Nil
+from brewops import TABLE, LOGICAL_OPS
+
+WARMUP = 16  # runs of a generic node before it's specialized
+BACKOFF = 256  # runs before trying again when the types can't be specialized
+
+
+class IntBinOp(BinOp):
+    # both operands ints; quick is the handler
+    __slots__ = ()
+
+
+class StrBinOp(BinOp):
+    # both operands strs; quick is the handler
+    __slots__ = ()
+
+
+class LocalVar(Var):
+    # lexical scoping only: a var in the current frame (depth 0) that's set
+    __slots__ = ()
+
+
+class OuterVar(Var):
+    # lexical scoping only: a var that's set, depth frames up
+    __slots__ = ()
+
+
+SPECIALIZED = {(int, int): IntBinOp, (str, str): StrBinOp}
+
+
+class Quickener:
+    def __init__(self, interp):
+        self.interp = interp
+        self.counters = weakref.WeakKeyDictionary()  # node -> [specializations, deopts]
+        self.generic = interp.__class__.evaluate_expression
+        self.short_circuit = interp.short_circuit
+        self.runners = {
+            Const: self.run_const,
+            Nil: self.run_nil,
+            BinOp: self.run_binary_operator,
+            IntBinOp: self.run_int_binary_operator,
+            StrBinOp: self.run_str_binary_operator,
+        }
+        # with dynamic scoping a name can be in any scope on the stack, and
+        # nothing cheaper than the walk itself says which one
+        if interp.lexical:
+            self.runners[Var] = self.run_variable
+            self.runners[LocalVar] = self.run_local_variable
+            self.runners[OuterVar] = self.run_outer_variable
+
+    # Interpreter.evaluate_expression, for quickened interpreters
+    def evaluate(self, node):
+        run = self.runners.get(type(node))
+        if run is None:
+            return self.generic(self.interp, node)
+        return run(node)
+
+    def stats(self):
+        return {node: tuple(counts) for node, counts in self.counters.items()}
+
+    def specialize(self, node, cls):
+        node.__class__ = cls
+        counts = self.counters.get(node)
+        if counts is None:
+            counts = self.counters[node] = [0, 0]
+        counts[0] += 1
+
+    def deopt(self, node, cls):
+        node.__class__ = cls
+        node.warmup = WARMUP
+        self.counters[node][1] += 1
+
+    def run_const(self, node):
+        return node.val
+
+    def run_nil(self, node):
+        return None
+
+    def run_binary_operator(self, node):
+        op = node.elem_type
+        if self.short_circuit and op in LOGICAL_OPS:
+            # never specialized: the specialized forms run both operands
+            return self.interp.evaluate_logical_operator(node)
+        a = self.evaluate(node.op1)
+        b = self.evaluate(node.op2)
+        try:
+            warmup = node.warmup - 1
+        except AttributeError:
+            warmup = WARMUP - 1
+        if warmup > 0:
+            node.warmup = warmup
+        else:
+            cls = SPECIALIZED.get((type(a), type(b)))
+            handler = TABLE[op][type(a)][type(b)] if cls is not None else None
+            if handler is None or type(handler) is str:
+                node.warmup = BACKOFF
+            else:
+                node.quick = handler
+                self.specialize(node, cls)
+                return handler(a, b)
+        return self.interp.binary_operator(op, a, b)
+
+    def run_int_binary_operator(self, node):
+        a = self.evaluate(node.op1)
+        b = self.evaluate(node.op2)
+        if type(a) is int and type(b) is int:
+            return node.quick(a, b)
+        self.deopt(node, BinOp)
+        return self.interp.binary_operator(node.elem_type, a, b)
+
+    def run_str_binary_operator(self, node):
+        a = self.evaluate(node.op1)
+        b = self.evaluate(node.op2)
+        if type(a) is str and type(b) is str:
+            return node.quick(a, b)
+        self.deopt(node, BinOp)
+        return self.interp.binary_operator(node.elem_type, a, b)
+
+    def run_variable(self, node):
+        try:
+            warmup = node.warmup - 1
+        except AttributeError:
+            warmup = WARMUP - 1
+        if warmup > 0:
+            node.warmup = warmup
+        elif node.addr is not None and '.' not in node.name:
+            if self.interp.lexical_lookup(node) is not None:
+                self.specialize(node, LocalVar if node.addr[0] == 0 else OuterVar)
+        else:
+            node.warmup = BACKOFF
+        return self.interp.get_value_of_variable(node)
+
+    def run_local_variable(self, node):
+        val = self.interp.frame.slots[node.addr[1]]
+        if val is not None:
+            return val.getVal()
+        self.deopt(node, Var)
+        return self.interp.get_value_of_variable(node)
+
+    def run_outer_variable(self, node):
+        depth, slot = node.addr
+        frame = self.interp.frame
+        for _ in range(depth):
+            frame = frame.parent
+        val = frame.slots[slot]
+        if val is not None:
+            return val.getVal()
+        self.deopt(node, Var)
+        return self.interp.get_value_of_variable(node)
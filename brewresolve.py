@@ -0,0 +1,295 @@
+# resolver pass for lexical scoping
+# walks the AST once and gives every variable reference a (depth, slot) address:
+#   depth = how many block frames to hop up from the current one
+#   slot  = index into that frame's slots list
+# frames are created per function call and per if/while block that declares
+# a variable. a block that doesn't (nslots 0) runs in its parent's frame and
+# isn't counted in depths; that takes a second pass, once the first has
+# found every block's nslots
+#
+# annotations are stored as plain attributes on the nodes:
+#   func/lambda: nslots, this_slot (lambda also: captures, capture_slots)
+#   if/while:    nslots, scoped (whether it gets a frame)
+#   var, =, fcall, mcall: addr ((depth, slot) or None if not a variable)
+#
+# free_variables() and mark_block_scopes() are the dynamic scoping
+# counterparts, for lambdas and blocks
+from intbase import InterpreterBase
+from element import BinOp, Element, UnaryOp
+
+
+class Frame:
+    __slots__ = ('slots', 'parent')
+
+    def __init__(self, size, parent=None):
+        self.slots = [None] * size  # Val objects, None means not assigned yet
+        self.parent = parent  # enclosing block frame in the same function
+
+
+class FuncContext:
+    def __init__(self, node, parent):
+        self.node = node
+        self.parent = parent  # enclosing context if node is a lambda
+        self.blocks = []  # innermost last, each maps name -> slot
+        self.sizes = []  # slot count of each block
+        self.framed = []  # whether each block has a frame of its own
+        self.captures = []  # (name, outer depth, outer slot, inner slot)
+        self.capture_slots = {}
+
+    def declare(self, name):
+        slot = self.sizes[-1]
+        self.blocks[-1][name] = slot
+        self.sizes[-1] += 1
+        return (0, slot)
+
+    def enter_block(self, framed=True):
+        self.blocks.append({})
+        self.sizes.append(0)
+        self.framed.append(framed)
+
+    def exit_block(self):
+        self.blocks.pop()
+        self.framed.pop()
+        return self.sizes.pop()
+
+    def lookup(self, name):
+        depth = 0
+        for k in range(len(self.blocks) - 1, -1, -1):
+            block = self.blocks[k]
+            if name in block:
+                if name == InterpreterBase.THIS_DEF and k == 0:
+                    # lambdas see the 'this' of the method they were made in
+                    # unless they get called as a method themselves
+                    self.capture(name, block[name])
+                return (depth, block[name])
+            if self.framed[k]:
+                depth += 1
+        if self.parent is None:
+            return None
+        slot = self.sizes[0]
+        if not self.capture(name, slot):
+            return None
+        self.blocks[0][name] = slot
+        self.sizes[0] += 1
+        return (depth - 1, slot)
+
+    def capture(self, name, slot):
+        if self.parent is None or name in self.capture_slots:
+            return name in self.capture_slots
+        outer = self.parent.lookup(name)
+        if outer is None:
+            return False
+        self.captures.append((name, outer[0], outer[1], slot))
+        self.capture_slots[name] = slot
+        return True
+
+
+class Resolver:
+    def __init__(self):
+        self.ctx = None
+        self.skip_empty = False  # second pass: blocks with nslots 0 get no frame
+
+    def resolve_program(self, ast):
+        for func in ast.functions:
+            self.resolve_func(func)
+        self.skip_empty = True
+        for func in ast.functions:
+            self.resolve_func(func)
+        return ast
+
+    def enter_block(self, node):
+        self.ctx.enter_block(not self.skip_empty or node.nslots > 0)
+
+    def exit_block(self, node):
+        node.nslots = self.ctx.exit_block()
+        node.scoped = not self.skip_empty or node.nslots > 0
+
+    def resolve_func(self, func):
+        self.ctx = FuncContext(func, self.ctx)
+        self.ctx.enter_block()
+        for arg in func.args:
+            self.ctx.declare(arg.name)
+        func.this_slot = self.ctx.declare(InterpreterBase.THIS_DEF)[1]
+        self.resolve_statements(func.statements)
+        func.nslots = self.ctx.sizes[0]
+        if func.elem_type == InterpreterBase.LAMBDA_DEF:
+            func.captures = self.ctx.captures
+            func.capture_slots = self.ctx.capture_slots
+        self.ctx = self.ctx.parent
+
+    def resolve_block(self, node, statements):
+        self.enter_block(node)
+        self.resolve_statements(statements)
+        self.exit_block(node)
+
+    def resolve_statements(self, statements):
+        for statement in statements:
+            self.resolve_statement(statement)
+
+    def resolve_statement(self, node):
+        if node.elem_type == '=':
+            self.resolve_expression(node.expression)
+            name = node.name
+            if '.' in name:
+                node.addr = self.ctx.lookup(name.split('.')[0])
+            else:
+                node.addr = self.ctx.lookup(name)
+                if node.addr is None:
+                    node.addr = self.ctx.declare(name)
+        elif node.elem_type == InterpreterBase.IF_DEF:
+            # one frame for the whole if, like the dynamic 'if' scope, but
+            # names made in the then block aren't visible in the else block
+            self.enter_block(node)
+            self.resolve_expression(node.condition)
+            self.resolve_statements(node.statements)
+            if node.else_statements is not None:
+                self.ctx.blocks[-1] = {}
+                self.resolve_statements(node.else_statements)
+            self.exit_block(node)
+        elif node.elem_type == InterpreterBase.WHILE_DEF:
+            self.resolve_expression(node.condition)
+            self.resolve_block(node, node.statements)
+        elif node.elem_type == InterpreterBase.RETURN_DEF:
+            if node.expression is not None:
+                self.resolve_expression(node.expression)
+        else:
+            self.resolve_expression(node)
+
+    def resolve_expression(self, node):
+        if node.elem_type == InterpreterBase.VAR_DEF:
+            node.addr = self.ctx.lookup(node.name.split('.')[0])
+        elif node.elem_type == InterpreterBase.FCALL_DEF:
+            node.addr = self.ctx.lookup(node.name)
+            for arg in node.args:
+                self.resolve_expression(arg)
+        elif node.elem_type == InterpreterBase.MCALL_DEF:
+            node.addr = self.ctx.lookup(node.objref)
+            for arg in node.args:
+                self.resolve_expression(arg)
+        elif node.elem_type == InterpreterBase.LAMBDA_DEF:
+            self.resolve_func(node)
+        elif isinstance(node, BinOp):
+            self.resolve_expression(node.op1)
+            self.resolve_expression(node.op2)
+        elif isinstance(node, UnaryOp):
+            self.resolve_expression(node.op1)
+
+
+def resolve_program(ast):
+    return Resolver().resolve_program(ast)
+
+
+# free variables of a lambda, for dynamic scoping: every name its body (or a
+# lambda nested in it) reads, writes or calls, minus its own args. a name the
+# body assigns is included too, since with dynamic scoping that assignment
+# writes to the captured var if there was one. a body that calls a func or
+# method gets EVERY_VAR instead: the callee runs on top of the captures and
+# may read any of them, so the lambda captures every var in scope. cached on
+# the node as free_vars
+EVERY_VAR = object()
+BUILTINS = ('print', 'inputi', 'inputs')
+
+
+def free_variables(lambda_node):
+    names = getattr(lambda_node, 'free_vars', None)
+    if names is None:
+        found = {}
+        for statement in lambda_node.statements:
+            collect_names(statement, found)
+        if EVERY_VAR in found:
+            names = EVERY_VAR
+        else:
+            for arg in lambda_node.args:
+                found.pop(arg.name, None)
+            names = tuple(found)
+        lambda_node.free_vars = names
+    return names
+
+
+def collect_names(node, found):
+    if node.elem_type == InterpreterBase.LAMBDA_DEF:
+        names = free_variables(node)
+        if names is EVERY_VAR:
+            found[EVERY_VAR] = True
+        else:
+            for name in names:
+                found[name] = True
+        return
+    if node.elem_type in ('=', InterpreterBase.VAR_DEF, InterpreterBase.FCALL_DEF):
+        found[node.name.split('.')[0]] = True
+        if node.elem_type == InterpreterBase.FCALL_DEF and node.name not in BUILTINS:
+            found[EVERY_VAR] = True
+    elif node.elem_type == InterpreterBase.MCALL_DEF:
+        found[node.objref] = True
+        found[EVERY_VAR] = True
+    for key in node.fields:
+        value = getattr(node, key)
+        if isinstance(value, list):
+            for child in value:
+                if isinstance(child, Element):
+                    collect_names(child, found)
+        elif isinstance(value, Element):
+            collect_names(value, found)
+
+
+# dynamic scoping: marks each if and while with whether it needs the scope
+# dict it pushes (scoped). one that doesn't runs in its parent's scope. a
+# block needs it when something run in it can add a name to the innermost
+# scope, or passes a variable to a call, since a call looks its var args up
+# in the scope just below its own. an assignment adds a name unless the name
+# is bound for sure already: an arg, or assigned by an earlier statement of
+# the same or an enclosing statement list. an if's condition runs in its
+# scope, a while's doesn't
+def mark_block_scopes(ast):
+    for func in ast.functions:
+        mark_statements(func.statements, {arg.name for arg in func.args})
+    return ast
+
+
+def mark_statements(statements, bound):
+    # True if the statements need the scope they run in. bound is updated
+    # with the names they assign
+    needs = False
+    for statement in statements:
+        if mark_node(statement, bound):
+            needs = True
+        if statement.elem_type == '=' and binds(statement):
+            bound.add(statement.name)
+    return needs
+
+
+def binds(assignment):
+    # a.x = @ makes a var named a.x, other a.x = ... set a field
+    return '.' not in assignment.name or assignment.expression.elem_type == InterpreterBase.OBJ_DEF
+
+
+def mark_node(node, bound):
+    kind = node.elem_type
+    if kind == InterpreterBase.IF_DEF:
+        needs = mark_node(node.condition, bound)
+        if mark_statements(node.statements, set(bound)):
+            needs = True
+        if node.else_statements is not None and mark_statements(node.else_statements, set(bound)):
+            needs = True
+        node.scoped = needs
+        return False
+    if kind == InterpreterBase.WHILE_DEF:
+        node.scoped = mark_statements(node.statements, set(bound))
+        return mark_node(node.condition, bound)
+    if kind == InterpreterBase.LAMBDA_DEF:
+        mark_statements(node.statements, {arg.name for arg in node.args})
+        return False
+    needs = False
+    if kind == '=':
+        needs = binds(node) and node.name not in bound
+    elif kind == InterpreterBase.MCALL_DEF or (kind == InterpreterBase.FCALL_DEF and node.name not in ('print', 'inputi', 'inputs')):
+        needs = any(arg.elem_type == InterpreterBase.VAR_DEF for arg in node.args)
+    for key in node.fields:
+        value = getattr(node, key)
+        if isinstance(value, list):
+            for child in value:
+                if isinstance(child, Element) and mark_node(child, bound):
+                    needs = True
+        elif isinstance(value, Element) and mark_node(value, bound):
+            needs = True
+    return needs
@@ -0,0 +1,177 @@
+# hidden classes for Brewin objects
+# a Shape is the field layout of an object: which field lives at which index
+# of its values list. objects that got the same fields in the same order
+# share one Shape, reached through the same chain of transitions from EMPTY
+#
+# FieldCache is the inline cache kept on each a.x node: the shapes it has
+# seen there and where the field was found for each of them, so a read or
+# write on a shape it has seen skips the field name lookups. mcall nodes
+# keep one too, for the method
+import itertools
+import threading
+
+POLYMORPHIC_LIMIT = 4  # shapes per site before it stops caching
+MISS = object()  # FieldCache.probe: the entries don't know
+# shapes and the epoch are shared by every interpreter in the process,
+# including ones running in other threads
+SHAPE_LOCK = threading.Lock()  # held while making a shape
+EPOCHS = itertools.count(1)
+
+
+class Shape:
+    __slots__ = ('parent', 'name', 'index', 'transitions', 'table')
+
+    # bumped whenever a proto chain may have changed: a proto assigned on any
+    # object, or a field added to, a copy made of, or a copy made by an object
+    # that is some object's proto. cache entries for fields found on a proto
+    # are only good for one epoch
+    epoch = 0
+
+    def __init__(self, parent=None, name=None):
+        self.parent = parent
+        self.name = name  # the field this shape added to its parent
+        self.index = parent.index + 1 if parent is not None else -1
+        self.transitions = {}  # field name -> child shape
+        # name -> index. the first child of a shape takes over its table and
+        # adds its field to it, so a straight run of transitions has just
+        # the one dict. entries past this shape's own index belong to its
+        # descendants and are skipped by lookup
+        if parent is None:
+            self.table = {}
+        elif not parent.transitions:
+            self.table = parent.table
+        else:
+            self.table = {key: index for key, index in parent.table.items() if index <= parent.index}
+        if name is not None:
+            self.table[name] = self.index
+
+    @staticmethod
+    def new_epoch():
+        # next value of a counter rather than epoch + 1, so two threads
+        # bumping it at once can't both store the same value
+        Shape.epoch = next(EPOCHS)
+
+    def lookup(self, name):
+        index = self.table.get(name)
+        if index is not None and index <= self.index:
+            return index
+        return None
+
+    def add(self, name):
+        child = self.transitions.get(name)
+        if child is None:
+            # two first children made at once would both take over this
+            # shape's table
+            with SHAPE_LOCK:
+                child = self.transitions.get(name)
+                if child is None:
+                    child = Shape(self, name)
+                    self.transitions[name] = child
+        return child
+
+    def __len__(self):
+        return self.index + 1
+
+
+EMPTY = Shape()
+
+
+class FieldCache:
+    # a site only reads (var nodes, find) or only writes ('=' nodes, store)
+    # entries maps each shape seen at the site to what was found for it
+    # reads: the index of the field on the object itself, -1 if objects of
+    # the shape don't have the field and their proto isn't an object (as with
+    # dynamic scoping's protos by name), or (holder, index, proto, epoch) for
+    # a field found on holder up the proto chain. that is only good while
+    # the object's proto and Shape.epoch are still the same
+    # writes: (index, new shape or None if the field is already there)
+    __slots__ = ('base', 'field', 'entries')
+
+    def __init__(self, base, field):
+        self.base = base
+        self.field = field
+        self.entries = {}  # stops growing once the site is megamorphic
+
+    def __repr__(self):
+        return f"{self.base}.{self.field}"
+
+    def find(self, obj):
+        # the field's Val on obj or its (object) protos, or None. gets the
+        # same Val as the get_field/get_proto walk would
+        val = self.probe(obj)
+        if val is MISS:
+            found = self.walk(obj)
+            if found is None:
+                return None
+            val = found[0].get_value(found[1])
+        return val
+
+    def probe(self, obj):
+        # what find would return, if the entries already know it, else MISS
+        entry = self.entries.get(obj.shape)
+        if type(entry) is int:
+            if entry >= 0:
+                return obj.values[entry]
+            if obj.proto is None or type(obj.proto) is str:
+                return None
+        elif entry is not None:
+            holder, index, proto, epoch = entry
+            if proto is obj.proto and epoch == Shape.epoch:
+                return holder.get_value(index)
+        return MISS
+
+    def walk(self, obj):
+        # (holder, index) for where the field is on obj's chain, or
+        # None. notes what it found in the entries
+        holder = obj
+        while True:
+            index = holder.shape.lookup(self.field)
+            if index is not None:
+                if holder is obj:
+                    self.remember(obj.shape, index)
+                else:
+                    self.remember(obj.shape, (holder, index, obj.proto, Shape.epoch))
+                return holder, index
+            proto = holder.get_proto()
+            if proto is None or type(proto) is str:
+                if holder is obj:
+                    self.remember(obj.shape, -1)
+                return None
+            holder = proto
+
+    def store(self, obj, val):
+        # obj.set_field(self.field, val), remembering the shape transition
+        shape = obj.shape
+        entry = self.entries.get(shape)
+        if entry is None:
+            index = shape.lookup(self.field)
+            if index is None:
+                entry = (len(shape), shape.add(self.field))
+            else:
+                entry = (index, None)
+            self.remember(shape, entry)
+        obj.set_value(entry[0], entry[1], val)
+
+    def remember(self, shape, entry):
+        if shape in self.entries or len(self.entries) < POLYMORPHIC_LIMIT:
+            self.entries[shape] = entry
+
+
+def field_cache(node):
+    # the node's FieldCache, made on first use. also keeps the split dotted
+    # name, so it isn't split again every time the node runs
+    cache = getattr(node, 'field_cache', None)
+    if cache is None:
+        base, field = node.name.split('.')
+        cache = FieldCache(base, field)
+        node.field_cache = cache
+    return cache
+
+
+def method_cache(node):
+    # the same for an mcall node, caching where its method was found
+    cache = getattr(node, 'method_cache', None)
+    if cache is None:
+        cache = FieldCache(node.objref, node.name)
+        node.method_cache = cache
+    return cache
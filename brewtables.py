@@ -0,0 +1,32 @@
+# generates the lexer and parser tables brewlex and brewparse load at import,
+# as brewlextab.py and brewparsetab.py next to this file. run it after any
+# change to the tokens or grammar:
+#   python brewtables.py
+import os
+import sys
+
+from ply import lex, yacc
+
+TABLES = ('brewlextab', 'brewparsetab')
+
+
+def main():
+    outputdir = os.path.dirname(os.path.abspath(__file__))
+    # the old tables must be gone before brewlex and brewparse are imported,
+    # or they would be loaded instead of rebuilt
+    for name in TABLES:
+        path = os.path.join(outputdir, name + '.py')
+        if os.path.exists(path):
+            os.remove(path)
+        sys.modules.pop(name, None)
+    import brewlex
+    import brewparse
+
+    lex.lex(module=brewlex, optimize=True, lextab='brewlextab', outputdir=outputdir)
+    yacc.yacc(module=brewparse, tabmodule='brewparsetab', outputdir=outputdir, debug=False)
+    for name in TABLES:
+        print(os.path.join(outputdir, name + '.py'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# streaming tokenizer for Brewin, in place of ply.lex's master loop: one
+# regex with a named group for each kind of token, run with finditer, and
+# no Python function called per token. it finds the same tokens as the
+# rules in brewlex, with PLY's type names
+#
+# tokenize() yields (type, value, lineno, lexpos) tuples. it takes a str, or
+# bytes or an mmap of a UTF-8 file; those are matched as bytes, where \d and
+# \w are ASCII only. tokenfunc() plugs it into LRParser.parse
+import re
+
+from ply import lex
+from brewlex import reserved_map
+
+OPERATOR_TYPES = {
+    "||": "OR",
+    "&&": "AND",
+    "==": "EQ",
+    "!=": "NOT_EQ",
+    ">=": "GREATER_EQ",
+    "<=": "LESS_EQ",
+    "(": "LPAREN",
+    ")": "RPAREN",
+    "{": "LBRACE",
+    "}": "RBRACE",
+    ",": "COMMA",
+    ".": "DOT",
+    ";": "SEMI",
+    "@": "AT",
+    "=": "ASSIGN",
+    "+": "PLUS",
+    "-": "MINUS",
+    "*": "MULTIPLY",
+    "/": "DIVIDE",
+    ">": "GREATER",
+    "<": "LESS",
+    "!": "NOT",
+}
+
+# in the order PLY tries brewlex's rules: the functions first, then the
+# strings longest first
+PATTERN = (
+    r"(?P<NUMBER>\d+)"
+    r"|(?P<NAME>[A-Za-z_][\w_]*)"
+    r"|(?P<newline>\n+)"
+    r"|(?P<comment>/\*(?:.|\n)*?\*/)"
+    r'|(?P<STRING>".*?")'
+    r"|(?P<op>\|\||&&|==|!=|>=|<=|[-(){},.;@=+*/<>!])"
+    r"|(?P<ignore>[ \t]+)"
+    r"|(?P<error>[\s\S])"
+)
+STR_RE = re.compile(PATTERN)
+BYTES_RE = re.compile(PATTERN.encode())
+
+
+def tokenize(source):
+    if isinstance(source, str):
+        matches = STR_RE.finditer(source)
+        decode = False
+    else:
+        matches = BYTES_RE.finditer(source)
+        decode = True
+    lineno = 1
+    for m in matches:
+        kind = m.lastgroup
+        text = m.group()
+        if decode:
+            text = text.decode("utf-8", "replace")
+        if kind == "NAME":
+            yield (reserved_map.get(text, "NAME"), text, lineno, m.start())
+        elif kind == "op":
+            yield (OPERATOR_TYPES[text], text, lineno, m.start())
+        elif kind == "NUMBER":
+            yield ("NUMBER", int(text), lineno, m.start())
+        elif kind == "STRING":
+            yield ("STRING", text[1:-1], lineno, m.start())
+        elif kind == "newline":
+            lineno += len(text)
+        elif kind == "comment":
+            lineno += text.count("\n")
+        elif kind == "error":
+            if text == '"':
+                # an unterminated string: the quote is one of brewlex's
+                # literals, which no grammar rule uses
+                yield ('"', text, lineno, m.start())
+            else:
+                # what brewlex's t_error does
+                print(f"Illegal character {text}")
+
+
+def tokenfunc(source):
+    # a tokenfunc for LRParser.parse, handing out the tokens as the LexToken
+    # objects it expects (it sets attributes on them when reporting errors)
+    tokens = tokenize(source)
+
+    def token():
+        t = next(tokens, None)
+        if t is None:
+            return None
+        tok = lex.LexToken()
+        tok.type, tok.value, tok.lineno, tok.lexpos = t
+        return tok
+
+    return token
@@ -0,0 +1,218 @@
+# runtime value containers shared by the interpreter engines
+from element import Element
+from brewshapes import Shape, EMPTY
+
+
+class Val:
+    # copy.copy of a Val shares env, which is how ref params alias the
+    # caller's variable
+    __slots__ = ('env',)
+
+    def __init__(self, v):
+        self.env = {'val':v}
+
+    def getVal(self):
+        return self.env['val']
+
+    def setVal(self, v):
+        self.env['val'] = v
+
+
+class Obj:
+    # a Brewin object. its fields are laid out by a Shape (see brewshapes),
+    # with the Vals in values in the order the fields were added
+    # a by-value copy keeps the Vals of primitive and func fields, which are
+    # replaced on write, never written through. an object with no nested
+    # objects or lambdas shares its whole values list (copy on write): the
+    # first write through either one gives it a private list. nested objects
+    # and lambdas are copied along with the object, since another handle on
+    # them could write through them
+    # proto holds the proto's var name (dynamic scoping) or the proto object
+    # itself (lexical scoping)
+    __slots__ = ('shape', 'values', 'proto', 'shared', 'mutables', 'is_proto', 'methods')
+
+    def __init__(self):
+        self.shape = EMPTY
+        self.values = []
+        self.proto = None
+        self.shared = False
+        self.mutables = None  # indexes of the fields holding an object or a lambda
+        self.is_proto = False  # some object has this one as its proto
+        self.methods = None  # method name -> where it was found, see mcall
+
+    def copy(self, copies):
+        # copies maps the id of each object and lambda already copied to its
+        # copy, so fields holding the same one still hold one after the copy
+        # (and cycles end), like they did with deepcopy
+        c = Obj()
+        copies[id(self)] = c
+        c.shape = self.shape
+        c.proto = cow_copy(self.proto, copies)
+        c.is_proto = self.is_proto
+        if self.mutables:
+            c.values = list(self.values)
+            for index in self.mutables:
+                c.values[index] = Val(cow_copy(c.values[index].getVal(), copies))
+            c.mutables = set(self.mutables)
+        else:
+            self.shared = True
+            c.values = self.values
+            c.shared = True
+        return c
+
+    def get_value(self, index):
+        return self.values[index]
+
+    def set_value(self, index, new_shape, val):
+        # new_shape is the shape after adding a field, None to replace one
+        if self.shared:
+            # the Vals are never written, only replaced, so they can stay shared
+            self.values = list(self.values)
+            self.shared = False
+        if is_mutable(val.getVal()):
+            if self.mutables is None:
+                self.mutables = set()
+            self.mutables.add(index)
+        elif self.mutables:
+            self.mutables.discard(index)
+        if new_shape is None:
+            self.values[index] = val
+        else:
+            self.shape = new_shape
+            self.values.append(val)
+            if self.is_proto:
+                Shape.new_epoch()
+
+    def get_field(self, name):
+        # the field's Val, or None if this object doesn't have the field
+        index = self.shape.lookup(name)
+        if index is None:
+            return None
+        return self.get_value(index)
+
+    def set_field(self, name, val):
+        index = self.shape.lookup(name)
+        if index is None:
+            self.set_value(len(self.shape), self.shape.add(name), val)
+        else:
+            self.set_value(index, None, val)
+
+    def get_proto(self):
+        return self.proto
+
+    def set_proto(self, proto):
+        self.proto = proto
+        if type(proto) is Obj:
+            proto.is_proto = True
+        Shape.new_epoch()
+
+
+class Rope:
+    # a str made by +, kept as the pieces it was made from until something
+    # needs its characters: print and input prompts (through str()), and
+    # == and != (through __eq__). a Rope is the first count items of
+    # pieces, and every Rope made by appending to it shares that list, so
+    # the one whose count is the whole list can append in place and
+    # s = s + piece costs len(piece) instead of len(s)
+    __slots__ = ('pieces', 'count', 'length', 'flat')
+
+    def __init__(self, pieces, count, length):
+        self.pieces = pieces
+        self.count = count
+        self.length = length
+        self.flat = None  # the joined str, once something asked for it
+
+    def __str__(self):
+        if self.flat is None:
+            self.flat = ''.join(self.pieces[:self.count])
+        return self.flat
+
+    def __eq__(self, other):
+        # without joining when the lengths differ, like for the "nil" check
+        # on every return
+        if type(other) is Rope:
+            return self.length == other.length and str(self) == str(other)
+        if type(other) is str:
+            return self.length == len(other) and str(self) == other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(str(self))
+
+
+ROPE_MIN = 256  # results of + shorter than this stay strs
+
+
+def concat(a, b):
+    # a + b for strs and Ropes
+    if type(b) is Rope:
+        b = str(b)
+    if type(a) is Rope:
+        pieces = a.pieces
+        if a.count != len(pieces):
+            # something was already appended to a: start a list of its own
+            pieces = [str(a)]
+        pieces.append(b)
+        return Rope(pieces, len(pieces), a.length + len(b))
+    if len(a) + len(b) < ROPE_MIN:
+        return a + b
+    return Rope([a, b], 2, len(a) + len(b))
+
+
+class Closure:
+    # the value of a lambda expression: the lambda node plus the vars it
+    # captured when this particular evaluation ran. reads through to the node
+    # otherwise, so it can be called anywhere a func node can
+    __slots__ = ('node', 'closures')
+
+    def __init__(self, node, closures):
+        self.node = node
+        self.closures = closures  # var name -> Val
+
+    def get(self, key):
+        if key == 'closures':
+            return self.closures
+        return self.node.get(key)
+
+    @property
+    def args(self):
+        return self.node.args
+
+    @property
+    def statements(self):
+        return self.node.statements
+
+    def __getattr__(self, name):
+        # elem_type and the resolver annotations (nslots, capture_slots, ...)
+        return getattr(self.node, name)
+
+    def __str__(self):
+        return f"{self.node}, closures: {self.closures}"
+
+
+def is_function(v):
+    return type(v) is Closure or isinstance(v, Element)
+
+
+def is_mutable(v):
+    return type(v) is Obj or type(v) is Closure
+
+
+# what copy.deepcopy used to do for by-value args and returns, copying as
+# little as it can: objects of primitives share storage until written, funcs
+# are never written so they are shared as is, and primitives are immutable
+def cow_copy(v, copies=None):
+    if not is_mutable(v):
+        return v
+    if copies is None:
+        copies = {}
+    elif id(v) in copies:
+        return copies[id(v)]
+    if type(v) is Obj:
+        return v.copy(copies)
+    # lambdas can write to their captured vars, so they get fresh Vals
+    c = Closure(v.node, {})
+    copies[id(v)] = c
+    for key, val in v.closures.items():
+        c.closures[key] = Val(cow_copy(val.getVal(), copies))
+    return c
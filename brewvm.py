@@ -0,0 +1,605 @@
+# bytecode compiler and stack VM, used by Interpreter(engine='vm')
+# each function compiles to a Code object: a flat list of (opcode, arg) pairs
+# plus a constant pool. the VM runs it with its own dispatch loop and frames.
+#
+# the VM works off the (depth, slot) addresses from brewresolve, so it has
+# the semantics of Interpreter(scoping='lexical'). block frames are flattened:
+# every if/while block gets its own range of slots in the function's frame,
+# cleared each time the block is entered
+#
+# brewin calls don't nest python calls: CALL pushes the callee's Frame on the
+# VM's frame stack and RETURN pops it, all in one dispatch loop, so recursion
+# depth is only limited by memory. a top-level `return f(...)` compiles to
+# TAIL_CALL, which replaces the caller's frame instead of pushing another
+#
+# a call to a pure func (see brewmemo) that's in its MemoTable pushes the
+# result instead of a frame; one that isn't gets the table and key in its
+# frame's memo, and stores the result when it returns. a TAIL_CALL hands
+# the caller's memo entries on to the callee, which stores the result under
+# all of them. the RETURN after a TAIL_CALL only runs when the tail call was
+# such a hit
+#
+# with short_circuit on, a && b compiles to a, SKIP_AND, b, AND: when a
+# decides the result, SKIP_AND replaces it with that result and jumps past
+# b and the AND (SKIP_OR the same for ||)
+import copy
+import weakref
+
+from intbase import InterpreterBase, ErrorType
+from brewvalues import Val, Obj, Closure, cow_copy
+from brewshapes import field_cache, method_cache
+from brewmemo import MISS, args_key
+
+(
+    LOAD_CONST, LOAD_NIL, LOAD_SLOT, LOAD_REF, LOAD_GLOBAL, LOAD_FIELD,
+    STORE_SLOT, STORE_FIELD, NEW_OBJ, ENTER_BLOCK,
+    ADD, SUB, MUL, DIV, EQ, NE, LT, GT, LE, GE, AND, OR,
+    NEG, NOT,
+    JUMP, TEST_IF, TEST_WHILE, SKIP_AND, SKIP_OR,
+    LOAD_CALLEE, LOAD_METHOD, CALL, TAIL_CALL, MAKE_LAMBDA,
+    PRINT, INPUTI, INPUTS, ERROR,
+    RETURN, RETURN_IF_VALUE, POP_RETURN_IF_VALUE,  # keep these last
+) = range(41)
+
+# opcode -> name, for disassemble. the opcodes are the only upper case ints
+# bound so far, and they were bound in opcode order
+OPNAMES = [name for name, value in globals().items() if name.isupper() and type(value) is int]
+
+BINARY_OPCODES = {
+    '+': ADD, '-': SUB, '*': MUL, '/': DIV, '==': EQ, '!=': NE,
+    '<': LT, '>': GT, '<=': LE, '>=': GE, '&&': AND, '||': OR,
+}
+BINARY_OPS = {opcode: op for op, opcode in BINARY_OPCODES.items()}
+
+
+class Code:
+    __slots__ = ('name', 'ops', 'consts', 'nslots', 'names')
+
+    def __init__(self, name, ops, consts, nslots, names):
+        self.name = name
+        self.ops = ops  # opcode, arg, opcode, arg, ...
+        self.consts = consts
+        self.nslots = nslots
+        self.names = names  # pc -> var name, for error messages
+
+
+class Frame:
+    # pc is where the frame carries on once the call it made returns. the
+    # operand stack is shared by all the frames, each using the top of it
+    __slots__ = ('code', 'slots', 'pc', 'memo')
+
+    def __init__(self, code, slots):
+        self.code = code
+        self.slots = slots
+        self.pc = 0
+        self.memo = None  # [(MemoTable, key)] to store the result under
+
+
+class Compiler:
+    def __init__(self, short_circuit=False):
+        self.short_circuit = short_circuit
+
+    def compile_func(self, func_node):
+        self.ops = []
+        self.consts = []
+        self.const_index = {}
+        self.names = {}
+        # base slot of each open block with slots, function block first
+        self.bases = [0]
+        self.nesting = 0  # open if/while blocks
+        self.top = func_node.nslots
+        self.nslots = func_node.nslots
+        for statement in func_node.statements:
+            self.compile_statement(statement)
+            if statement.elem_type == InterpreterBase.RETURN_DEF:
+                break  # run_func stops at a top-level return
+        self.emit(LOAD_NIL)
+        self.emit(RETURN)
+        name = func_node.name or InterpreterBase.LAMBDA_DEF
+        return Code(name, self.ops, self.consts, self.nslots, self.names)
+
+    def emit(self, opcode, arg=0):
+        self.ops.append(opcode)
+        self.ops.append(arg)
+        return len(self.ops) - 2
+
+    def patch(self, pc):
+        # point the jump at pc to the next instruction
+        self.ops[pc + 1] = len(self.ops)
+
+    def const(self, value):
+        key = (type(value), value)
+        if key not in self.const_index:
+            self.const_index[key] = len(self.consts)
+            self.consts.append(value)
+        return self.const_index[key]
+
+    def slot(self, addr):
+        if addr is None:
+            return None
+        return self.bases[-1 - addr[0]] + addr[1]
+
+    def enter_block(self, node):
+        self.nesting += 1
+        # blocks without slots aren't counted in depths (see brewresolve)
+        if not node.nslots:
+            return
+        base = self.top
+        self.bases.append(base)
+        self.top += node.nslots
+        self.nslots = max(self.nslots, self.top)
+        self.emit(ENTER_BLOCK, self.const((base, node.nslots)))
+
+    def exit_block(self, node):
+        self.nesting -= 1
+        if not node.nslots:
+            return
+        self.bases.pop()
+        self.top -= node.nslots
+
+    # statements
+
+    def compile_statements(self, statements):
+        for statement in statements:
+            self.compile_statement(statement)
+
+    def compile_statement(self, node):
+        kind = node.elem_type
+        if kind == '=':
+            source = node.expression
+            if source.elem_type == InterpreterBase.OBJ_DEF:
+                self.emit(NEW_OBJ)
+            else:
+                self.compile_expression(source)
+            name = node.name
+            if '.' in name:
+                self.emit(STORE_FIELD, self.const((self.slot(node.addr), field_cache(node))))
+            else:
+                self.emit(STORE_SLOT, self.slot(node.addr))
+        elif kind == InterpreterBase.FCALL_DEF:
+            if node.name == 'print':
+                self.compile_print(node)
+            else:
+                self.compile_call(node)
+                # a call statement that yields a value returns it
+                self.emit(POP_RETURN_IF_VALUE)
+        elif kind == InterpreterBase.MCALL_DEF:
+            self.compile_call(node)
+            self.emit(POP_RETURN_IF_VALUE)
+        elif kind == InterpreterBase.IF_DEF:
+            self.enter_block(node)
+            self.compile_expression(node.condition)
+            to_else = self.emit(TEST_IF)
+            self.compile_statements(node.statements)
+            if node.else_statements is not None:
+                to_end = self.emit(JUMP)
+                self.patch(to_else)
+                self.compile_statements(node.else_statements)
+                self.patch(to_end)
+            else:
+                self.patch(to_else)
+            self.exit_block(node)
+        elif kind == InterpreterBase.WHILE_DEF:
+            start = len(self.ops)
+            self.compile_expression(node.condition)
+            to_end = self.emit(TEST_WHILE)
+            self.enter_block(node)
+            self.compile_statements(node.statements)
+            self.exit_block(node)
+            self.emit(JUMP, start)
+            self.patch(to_end)
+        elif kind == InterpreterBase.RETURN_DEF:
+            nested = self.nesting > 0
+            if node.expression is None:
+                if not nested:
+                    self.emit(LOAD_NIL)
+                    self.emit(RETURN)
+                return
+            expression = node.expression
+            if not nested and (expression.elem_type == InterpreterBase.MCALL_DEF or (
+                    expression.elem_type == InterpreterBase.FCALL_DEF
+                    and expression.name not in ('print', 'inputi', 'inputs'))):
+                # the callee's return already did what RETURN would: copy
+                # the value and turn "nil" into nil
+                self.compile_call(expression, TAIL_CALL)
+                self.emit(RETURN)
+                return
+            self.compile_expression(expression)
+            # inside a block a return that yields nil doesn't leave the function
+            self.emit(RETURN_IF_VALUE if nested else RETURN)
+        # other expression statements are never evaluated
+
+    def compile_print(self, node):
+        for arg in node.args:
+            self.compile_expression(arg)
+        self.emit(PRINT, len(node.args))
+
+    def compile_call(self, node, call=CALL):
+        if node.elem_type == InterpreterBase.MCALL_DEF:
+            info = (self.slot(node.addr), method_cache(node), len(node.args))
+            self.emit(LOAD_METHOD, self.const(info))
+        else:
+            info = (self.slot(node.addr), node.name, len(node.args))
+            self.emit(LOAD_CALLEE, self.const(info))
+        # plain variables are pushed as their Val so ref params can alias them
+        refs = []
+        for arg in node.args:
+            if arg.elem_type == InterpreterBase.VAR_DEF and '.' not in arg.name and arg.addr is not None:
+                self.names[self.emit(LOAD_REF, self.slot(arg.addr))] = arg.name
+                refs.append(True)
+            else:
+                self.compile_expression(arg)
+                refs.append(False)
+        self.emit(call, self.const(tuple(refs)))
+
+    # expressions
+
+    def compile_expression(self, node):
+        kind = node.elem_type
+        if kind in (InterpreterBase.STRING_DEF, InterpreterBase.INT_DEF, InterpreterBase.BOOL_DEF):
+            self.emit(LOAD_CONST, self.const(node.val))
+        elif kind == InterpreterBase.VAR_DEF:
+            name = node.name
+            if '.' in name:
+                self.emit(LOAD_FIELD, self.const((self.slot(node.addr), field_cache(node))))
+            elif node.addr is None:
+                self.emit(LOAD_GLOBAL, self.const(name))
+            else:
+                self.names[self.emit(LOAD_SLOT, self.slot(node.addr))] = name
+        elif kind in BINARY_OPCODES:
+            self.compile_expression(node.op1)
+            if self.short_circuit and kind in ('&&', '||'):
+                to_end = self.emit(SKIP_AND if kind == '&&' else SKIP_OR)
+                self.compile_expression(node.op2)
+                self.emit(BINARY_OPCODES[kind])
+                self.patch(to_end)
+                return
+            self.compile_expression(node.op2)
+            self.emit(BINARY_OPCODES[kind])
+        elif kind == InterpreterBase.NEG_DEF or kind == InterpreterBase.NOT_DEF:
+            self.compile_expression(node.op1)
+            self.emit(NEG if kind == InterpreterBase.NEG_DEF else NOT)
+        elif kind == InterpreterBase.FCALL_DEF:
+            name = node.name
+            if name == 'print':
+                self.compile_print(node)
+                self.emit(LOAD_NIL)
+            elif name in ('inputi', 'inputs'):
+                args = node.args
+                if len(args) > 1:
+                    message = f"{name} function can only have 1 or 0 args"
+                    self.emit(ERROR, self.const((ErrorType.NAME_ERROR, message)))
+                    return
+                for arg in args:
+                    self.compile_expression(arg)
+                self.emit(INPUTI if name == 'inputi' else INPUTS, len(args))
+            else:
+                self.compile_call(node)
+        elif kind == InterpreterBase.MCALL_DEF:
+            self.compile_call(node)
+        elif kind == InterpreterBase.LAMBDA_DEF:
+            captures = tuple((key, self.slot((depth, slot))) for key, depth, slot, _ in node.captures)
+            self.emit(MAKE_LAMBDA, self.const((node, captures)))
+        else:
+            self.emit(LOAD_NIL)  # nil, and @ outside of an assignment
+
+
+def disassemble(code):
+    lines = [f"code {code.name}: {code.nslots} slots"]
+    for pc in range(0, len(code.ops), 2):
+        opcode, arg = code.ops[pc], code.ops[pc + 1]
+        name = OPNAMES[opcode]
+        line = f"{pc:6d} {name:<20} {arg}"
+        if pc in code.names:
+            line += f" ({code.names[pc]})"
+        elif name in ('LOAD_CONST', 'LOAD_GLOBAL', 'LOAD_FIELD', 'STORE_FIELD', 'ENTER_BLOCK',
+                      'LOAD_CALLEE', 'LOAD_METHOD', 'CALL', 'TAIL_CALL', 'ERROR'):
+            line += f" ({code.consts[arg]!r})"
+        elif name == 'MAKE_LAMBDA':
+            line += f" (captures {code.consts[arg][1]!r})"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+class BrewinVM:
+    def __init__(self, interp):
+        self.interp = interp
+        self.codes = weakref.WeakKeyDictionary()
+
+    def code_for(self, func_node):
+        if type(func_node) is Closure:
+            func_node = func_node.node
+        code = self.codes.get(func_node)
+        if code is None:
+            code = Compiler(self.interp.short_circuit).compile_func(func_node)
+            self.codes[func_node] = code
+        return code
+
+    def run_main(self, main_func_node):
+        code = self.code_for(main_func_node)
+        return self.execute(Frame(code, [None] * code.nslots))
+
+    def new_frame(self, func, this, args, refs):
+        code = self.code_for(func)
+        slots = [None] * code.nslots
+        if func.elem_type == InterpreterBase.LAMBDA_DEF:
+            for key, val in func.closures.items():
+                slots[func.capture_slots[key]] = val
+        formal_args = func.args
+        for k in range(len(formal_args)):
+            if refs[k]:
+                if formal_args[k].elem_type == InterpreterBase.REFARG_DEF:
+                    # shares the env dict, so writes go back to the caller's var
+                    slots[k] = copy.copy(args[k])
+                else:
+                    slots[k] = Val(cow_copy(args[k].getVal()))
+            else:
+                slots[k] = Val(cow_copy(args[k]))
+        if this is not None:
+            slots[func.this_slot] = copy.copy(this)
+        return Frame(code, slots)
+
+    def load_missing(self, name):
+        # a bare name that isn't a (bound) variable may still name a function
+        interp = self.interp
+        overloads = interp.func_table.get(name)
+        if overloads is not None:
+            if interp.func_defs[name] == 1:
+                return next(iter(overloads.values()))
+            interp.error(ErrorType.NAME_ERROR, f"Function var name {name} is ambiguous",)
+        interp.error(ErrorType.NAME_ERROR, f"Variable {name} has not been defined",)
+
+    def load_callee(self, slots, slot, name, num_args):
+        interp = self.interp
+        f = interp.func_table.get(name, {}).get(num_args)
+        if f is not None:
+            return f
+        if slot is not None and slots[slot] is not None:
+            formal_func = slots[slot].getVal()
+            if interp.is_callable(formal_func, num_args):
+                return formal_func
+            interp.error(ErrorType.TYPE_ERROR,f"Function {name} isn't a function",)
+        interp.error(ErrorType.NAME_ERROR,f"Function {name} wasn't found",)
+
+    def load_method(self, slots, slot, cache, num_args):
+        interp = self.interp
+        objref = cache.base
+        method_name = cache.field
+        val = slots[slot] if slot is not None else None
+        if val is None:
+            interp.error(ErrorType.NAME_ERROR,f"Method {method_name} wasn't found",)
+        obj = val.getVal()
+        if not interp.is_object(obj):
+            interp.error(ErrorType.TYPE_ERROR,f"Objref {objref} wasn't found",)
+        field = interp.lexical_find_method(obj, cache) if method_name != 'proto' else None
+        if field is not None:
+            formal_method = field.getVal()
+            if interp.is_callable(formal_method, num_args):
+                return formal_method, val
+            interp.error(ErrorType.TYPE_ERROR,f"Method {method_name} isn't a function",)
+        interp.error(ErrorType.NAME_ERROR,f"Method {method_name} wasn't found",)
+
+    def load_field(self, slots, slot, cache):
+        interp = self.interp
+        var_name = cache.base
+        val = slots[slot] if slot is not None else None
+        if val is None:
+            interp.error(ErrorType.NAME_ERROR, f"Variable {var_name} has not been defined",)
+        obj = val.getVal()
+        if not interp.is_object(obj):
+            interp.error(ErrorType.TYPE_ERROR, f"Variable {var_name} is not been an obj",)
+        if cache.field == 'proto':
+            return obj.get_proto()
+        field = cache.find(obj)
+        if field is not None:
+            return field.getVal()
+        interp.error(ErrorType.NAME_ERROR, f"Variable {var_name} has not been defined",)
+
+    def store_field(self, slots, slot, cache, value):
+        interp = self.interp
+        var_name = cache.base
+        val = slots[slot] if slot is not None else None
+        if val is None:
+            interp.error(ErrorType.NAME_ERROR,f"Var {var_name} not found",)
+        obj = val.getVal()
+        if not interp.is_object(obj):
+            interp.error(ErrorType.TYPE_ERROR,f"Dot op used on non object var {var_name}",)
+        if cache.field == 'proto':
+            if value is not None and not interp.is_object(value):
+                interp.error(ErrorType.TYPE_ERROR,f"Non object var {value} assigned to proto",)
+            obj.set_proto(value)
+        else:
+            cache.store(obj, Val(value))
+
+    def make_lambda(self, slots, lambda_exp, captures):
+        closures = {}
+        for key, slot in captures:
+            if slots[slot] is not None:
+                closures[key] = Val(slots[slot].getVal())
+        return Closure(lambda_exp, closures)
+
+    def read_input(self, name, stack, has_prompt):
+        interp = self.interp
+        if has_prompt:
+            interp.output(str(stack.pop()))
+        user_input = interp.get_input()
+        if user_input == None:
+            kind = "an integer" if name == 'inputi' else "a string"
+            interp.error(ErrorType.FAULT_ERROR,f"{name} function takes in {kind}",)
+        return int(user_input) if name == 'inputi' else user_input
+
+    def execute(self, frame):
+        interp = self.interp
+        binary_operator = interp.binary_operator
+        memo_tables = interp.memo_tables
+        frames = [frame]
+        code = frame.code
+        ops = code.ops
+        consts = code.consts
+        slots = frame.slots
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        pc = 0
+        while True:
+            opcode = ops[pc]
+            arg = ops[pc + 1]
+            pc += 2
+            if opcode == LOAD_SLOT:
+                val = slots[arg]
+                push(val.getVal() if val is not None else self.load_missing(code.names[pc - 2]))
+            elif opcode == LOAD_CONST:
+                push(consts[arg])
+            elif opcode == STORE_SLOT:
+                val = slots[arg]
+                if val is None:
+                    slots[arg] = Val(pop())
+                else:
+                    val.setVal(pop())
+            elif ADD <= opcode <= GE:
+                b = pop()
+                a = pop()
+                if type(a) is int and type(b) is int:
+                    if opcode == ADD:
+                        push(a + b)
+                    elif opcode == SUB:
+                        push(a - b)
+                    elif opcode == LT:
+                        push(a < b)
+                    elif opcode == MUL:
+                        push(a * b)
+                    elif opcode == EQ:
+                        push(a == b)
+                    elif opcode == GT:
+                        push(a > b)
+                    elif opcode == DIV:
+                        push(a // b)
+                    elif opcode == NE:
+                        push(a != b)
+                    elif opcode == LE:
+                        push(a <= b)
+                    else:
+                        push(a >= b)
+                else:
+                    push(binary_operator(BINARY_OPS[opcode], a, b))
+            elif opcode == TEST_WHILE or opcode == TEST_IF:
+                c = pop()
+                if type(c) is not bool:
+                    if type(c) is not int:
+                        what = "while loop" if opcode == TEST_WHILE else "if statement"
+                        interp.error(ErrorType.TYPE_ERROR,f"condition of {what} must be type bool or int",)
+                    c = c != 0
+                if not c:
+                    pc = arg
+            elif opcode == JUMP:
+                pc = arg
+            elif opcode == ENTER_BLOCK:
+                start, count = consts[arg]
+                for i in range(start, start + count):
+                    slots[i] = None
+            elif opcode == SKIP_AND or opcode == SKIP_OR:
+                a = stack[-1]
+                if type(a) is bool or type(a) is int:
+                    if opcode == SKIP_AND:
+                        if not a:
+                            stack[-1] = False
+                            pc = arg
+                    elif a:
+                        stack[-1] = True
+                        pc = arg
+            elif opcode == AND or opcode == OR:
+                b = pop()
+                a = pop()
+                push(binary_operator(BINARY_OPS[opcode], a, b))
+            elif opcode == LOAD_REF:
+                val = slots[arg]
+                push(val if val is not None else Val(self.load_missing(code.names[pc - 2])))
+            elif opcode == LOAD_CALLEE:
+                push(self.load_callee(slots, *consts[arg]))
+                push(None)  # no 'this' for plain calls
+            elif opcode == LOAD_METHOD:
+                method, this = self.load_method(slots, *consts[arg])
+                push(method)
+                push(this)
+            elif opcode == CALL or opcode == TAIL_CALL:
+                refs = consts[arg]
+                args = stack[len(stack) - len(refs):]
+                del stack[len(stack) - len(refs):]
+                this = pop()
+                func = pop()
+                callee = self.new_frame(func, this, args, refs)
+                table = memo_tables.get(func) if this is None else None
+                if table is not None:
+                    key = args_key([val.getVal() for val in callee.slots[:len(refs)]])
+                    if key is not None:
+                        r = table.lookup(key)
+                        if r is not MISS:
+                            push(r)
+                            continue
+                        callee.memo = [(table, key)]
+                if opcode == CALL:
+                    frame.pc = pc
+                    frames.append(callee)
+                else:
+                    if frame.memo is not None:
+                        callee.memo = frame.memo if callee.memo is None else frame.memo + callee.memo
+                    frames[-1] = callee
+                frame = callee
+                code = frame.code
+                ops = code.ops
+                consts = code.consts
+                slots = frame.slots
+                pc = 0
+            elif opcode == LOAD_NIL:
+                push(None)
+            elif opcode == LOAD_GLOBAL:
+                push(self.load_missing(consts[arg]))
+            elif opcode == LOAD_FIELD:
+                push(self.load_field(slots, *consts[arg]))
+            elif opcode == STORE_FIELD:
+                self.store_field(slots, *consts[arg], pop())
+            elif opcode == NEW_OBJ:
+                push(Obj())
+            elif opcode == NEG:
+                push(interp.unary_operator(InterpreterBase.NEG_DEF, pop()))
+            elif opcode == NOT:
+                push(interp.unary_operator(InterpreterBase.NOT_DEF, pop()))
+            elif opcode == MAKE_LAMBDA:
+                push(self.make_lambda(slots, *consts[arg]))
+            elif opcode == PRINT:
+                outstr = ""
+                for s in stack[len(stack) - arg:]:
+                    outstr += interp.print_str(s)
+                del stack[len(stack) - arg:]
+                interp.output(outstr)
+            elif opcode == INPUTI:
+                push(self.read_input('inputi', stack, arg))
+            elif opcode == INPUTS:
+                push(self.read_input('inputs', stack, arg))
+            elif opcode == ERROR:
+                interp.error(*consts[arg])
+            elif opcode >= RETURN:
+                r = pop()
+                if opcode == POP_RETURN_IF_VALUE:
+                    if r is None:
+                        continue
+                else:
+                    if r == InterpreterBase.NIL_DEF:
+                        r = None
+                    if r is not None:
+                        r = cow_copy(r)
+                    elif opcode == RETURN_IF_VALUE:
+                        continue
+                if frame.memo is not None:
+                    for table, key in frame.memo:
+                        table.store(key, r)
+                frames.pop()
+                if not frames:
+                    return r
+                frame = frames[-1]
+                code = frame.code
+                ops = code.ops
+                consts = code.consts
+                slots = frame.slots
+                pc = frame.pc
+                push(r)
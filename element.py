@@ -1,14 +1,32 @@
+# AST nodes. Element(elem_type, **fields) makes the typed node class for
+# elem_type (BinOp, Var, FCall, ...), which keeps its fields in __slots__:
+# read them as attributes (node.op1). get() is still there for code that
+# reads them by name, and returns None for a field the node doesn't have
+#
+# the resolver and the engines hang their own annotations on nodes (addr,
+# nslots, caches, ...); each class has slots for the ones it gets. nodes of
+# an elem_type no class knows keep their fields in a dict, as all nodes did
 class Element:
-    def __init__(self, elem_type, **kwargs):
-        self.elem_type = elem_type
-        self.dict = {}
-        for key, value in kwargs.items():
-            self.dict[key] = value
+    __slots__ = ('elem_type', '__weakref__')
+    fields = ()
+
+    def __new__(cls, elem_type=None, *args, **kwargs):
+        if cls is Element:
+            cls = NODE_CLASSES.get(elem_type, GenericElement)
+        return object.__new__(cls)
 
     def get(self, key):
-        if key not in self.dict:
-            return None
-        return self.dict[key]
+        if key in self.fields:
+            return getattr(self, key)
+        return None
+
+    @property
+    def dict(self):
+        return {key: getattr(self, key) for key in self.fields}
+
+    def __reduce__(self):
+        # pickled as the class and its fields, without the annotations
+        return (type(self), (self.elem_type,) + tuple(getattr(self, key) for key in self.fields))
 
     def __str__(self):
         s = f"{self.elem_type}: "
@@ -26,4 +44,213 @@ class Element:
             if len(s) > 0:
                 return "[" + s[0:-2] + "]"
             return "[" + s + "]"
-        return str(v)
\ No newline at end of file
+        return str(v)
+
+
+class GenericElement(Element):
+    __slots__ = ('dict',)
+
+    def __init__(self, elem_type, **kwargs):
+        self.elem_type = elem_type
+        self.dict = kwargs
+
+    @property
+    def fields(self):
+        return tuple(self.dict)
+
+    def get(self, key):
+        return self.dict.get(key)
+
+    def __reduce__(self):
+        return (GenericElement, (self.elem_type,), (None, {'dict': self.dict}))
+
+    def __getattr__(self, name):
+        # only called for names that aren't slots
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return self.dict.get(name)
+
+
+class Program(Element):
+    __slots__ = ('functions',)
+    fields = ('functions',)
+
+    def __init__(self, elem_type, functions=None):
+        self.elem_type = elem_type
+        self.functions = functions
+
+
+class Func(Element):
+    __slots__ = ('name', 'args', 'statements', 'nslots', 'this_slot')
+    fields = ('name', 'args', 'statements')
+
+    def __init__(self, elem_type, name=None, args=None, statements=None):
+        self.elem_type = elem_type
+        self.name = name
+        self.args = args
+        self.statements = statements
+
+
+class Lambda(Element):
+    __slots__ = ('args', 'statements', 'nslots', 'this_slot', 'captures', 'capture_slots', 'free_vars')
+    fields = ('args', 'statements')
+    name = None  # no name field; .name is None like get('name')
+
+    def __init__(self, elem_type, args=None, statements=None):
+        self.elem_type = elem_type
+        self.args = args
+        self.statements = statements
+
+
+class Arg(Element):
+    # 'arg' and 'refarg'
+    __slots__ = ('name',)
+    fields = ('name',)
+
+    def __init__(self, elem_type, name=None):
+        self.elem_type = elem_type
+        self.name = name
+
+
+class Assign(Element):
+    __slots__ = ('name', 'expression', 'addr', 'field_cache')
+    fields = ('name', 'expression')
+
+    def __init__(self, elem_type, name=None, expression=None):
+        self.elem_type = elem_type
+        self.name = name
+        self.expression = expression
+
+
+class If(Element):
+    __slots__ = ('condition', 'statements', 'else_statements', 'nslots', 'scoped')
+    fields = ('condition', 'statements', 'else_statements')
+
+    def __init__(self, elem_type, condition=None, statements=None, else_statements=None):
+        self.elem_type = elem_type
+        self.condition = condition
+        self.statements = statements
+        self.else_statements = else_statements
+
+
+class While(Element):
+    __slots__ = ('condition', 'statements', 'nslots', 'scoped')
+    fields = ('condition', 'statements')
+
+    def __init__(self, elem_type, condition=None, statements=None):
+        self.elem_type = elem_type
+        self.condition = condition
+        self.statements = statements
+
+
+class Return(Element):
+    __slots__ = ('expression',)
+    fields = ('expression',)
+
+    def __init__(self, elem_type, expression=None):
+        self.elem_type = elem_type
+        self.expression = expression
+
+
+class UnaryOp(Element):
+    # '!' and 'neg'
+    __slots__ = ('op1',)
+    fields = ('op1',)
+
+    def __init__(self, elem_type, op1=None):
+        self.elem_type = elem_type
+        self.op1 = op1
+
+
+class BinOp(Element):
+    # the elem_type is the operator
+    __slots__ = ('op1', 'op2', 'warmup', 'quick')
+    fields = ('op1', 'op2')
+
+    def __init__(self, elem_type, op1=None, op2=None):
+        self.elem_type = elem_type
+        self.op1 = op1
+        self.op2 = op2
+
+
+class Const(Element):
+    # 'int', 'bool' and 'string'
+    __slots__ = ('val',)
+    fields = ('val',)
+
+    def __init__(self, elem_type, val=None):
+        self.elem_type = elem_type
+        self.val = val
+
+
+class Nil(Element):
+    __slots__ = ()
+
+    def __init__(self, elem_type):
+        self.elem_type = elem_type
+
+
+class NewObj(Element):
+    # '@'
+    __slots__ = ()
+
+    def __init__(self, elem_type):
+        self.elem_type = elem_type
+
+
+class Var(Element):
+    __slots__ = ('name', 'addr', 'field_cache', 'warmup')
+    fields = ('name',)
+
+    def __init__(self, elem_type, name=None):
+        self.elem_type = elem_type
+        self.name = name
+
+
+class FCall(Element):
+    __slots__ = ('name', 'args', 'addr')
+    fields = ('name', 'args')
+
+    def __init__(self, elem_type, name=None, args=None):
+        self.elem_type = elem_type
+        self.name = name
+        self.args = args
+
+
+class MCall(Element):
+    __slots__ = ('objref', 'name', 'args', 'addr', 'method_cache')
+    fields = ('objref', 'name', 'args')
+
+    def __init__(self, elem_type, objref=None, name=None, args=None):
+        self.elem_type = elem_type
+        self.objref = objref
+        self.name = name
+        self.args = args
+
+
+BINARY_OPS = ('+', '-', '*', '/', '==', '!=', '<', '<=', '>', '>=', '&&', '||')
+
+# elem_type -> node class. the strings are InterpreterBase's *_DEF names,
+# written out so this module doesn't need intbase
+NODE_CLASSES = {
+    'program': Program,
+    'func': Func,
+    'lambda': Lambda,
+    'arg': Arg,
+    'refarg': Arg,
+    '=': Assign,
+    'if': If,
+    'while': While,
+    'return': Return,
+    '!': UnaryOp,
+    'neg': UnaryOp,
+    'int': Const,
+    'bool': Const,
+    'string': Const,
+    'nil': Nil,
+    '@': NewObj,
+    'var': Var,
+    'fcall': FCall,
+    'mcall': MCall,
+}
+NODE_CLASSES.update((op, BinOp) for op in BINARY_OPS)
@@ -1,6 +1,8 @@
 # Base class for our interpreter
 from enum import Enum
 
+from brewoutput import LogSink, StdoutSink, TeeSink
+
 
 class ErrorType(Enum):
     TYPE_ERROR = 1
@@ -34,14 +36,23 @@ class InterpreterBase:
     NOT_DEF = "!"
 
     # methods
-    def __init__(self, console_output=True, inp=None):
+    def __init__(self, console_output=True, inp=None, sink=None):
         self.console_output = console_output
         self.inp = inp  # if not none, then read input from passed-in list
+        # where output goes, see brewoutput. without one, every line is kept
+        # in output_log and written to a buffered stdout if console_output
+        self.custom_sink = sink
         self.reset()
 
     # Call to reset I/O for another run of the program
     def reset(self):
         self.output_log = []
+        if self.custom_sink is not None:
+            self.sink = self.custom_sink
+        elif self.console_output:
+            self.sink = TeeSink(StdoutSink(), LogSink(self.output_log))
+        else:
+            self.sink = LogSink(self.output_log)
         self.input_cursor = 0
         self.error_type = None
         self.error_line = None
@@ -52,6 +63,7 @@ class InterpreterBase:
 
     def get_input(self):
         if not self.inp:
+            self.flush()  # so the prompt shows
             return input()  # Get input from keyboard if not input list provided
 
         if self.input_cursor < len(self.inp):
@@ -75,12 +87,14 @@ class InterpreterBase:
         raise Exception(f"{error_type} on line {line_num}{description}")
 
     def output(self, v):
-        if self.console_output:
-            print(v)
-        self.output_log.append(v)
+        self.sink.write(v)
+
+    # write out what the sink has buffered
+    def flush(self):
+        self.sink.flush()
 
     def get_output(self):
-        return self.output_log
+        return self.sink.lines()
 
     def get_error_type_and_line(self):
         return self.error_type, self.error_line
\ No newline at end of file
@@ -1,24 +1,86 @@
 # exports Interpreter class VERSION 2.0
 from intbase import InterpreterBase, ErrorType
-from brewparse import parse_program
+import brewc
+from brewflat import FlatEvaluator
+import brewflat
+from brewresolve import Frame, resolve_program, free_variables, mark_block_scopes, EVERY_VAR
+from brewclosures import ClosureCompiler
+from brewvm import BrewinVM
 from element import Element
+from brewvalues import Val, Obj, Closure, cow_copy, is_function
+from brewshapes import Shape, MISS, field_cache, method_cache
+from brewops import TABLE, OTHER_HANDLERS, LOGICAL_OPS, short_circuit
+from brewquicken import Quickener
+from brewoptimize import Optimizer
+from brewmemo import MemoTable, pure_functions
 import copy
 
-class Val:
-    def __init__(self, v):
-        self.env = {'val':v}
-        
-    def getVal(self):
-        return self.env['val']
-    
-    def setVal(self, v):
-        self.env['val'] = v
-
 class Interpreter(InterpreterBase):
-    def __init__(self, console_output=True, inp=None, trace_output=False):
-        super().__init__(console_output, inp)
+    def __init__(self, console_output=True, inp=None, trace_output=False, scoping='dynamic', engine='tree', cache_dir=None, parser='ply', quicken=False, short_circuit=False, optimize=True, memoize=True, memo_size=1024, sink=None):
+        super().__init__(console_output, inp, sink)
+        # 'dynamic' walks self.scopes by name (callees see their callers' vars)
+        # 'lexical' uses the (depth, slot) addresses from brewresolve
+        if scoping not in ('dynamic', 'lexical'):
+            raise ValueError(f"unknown scoping mode {scoping}")
+        self.lexical = scoping == 'lexical'
+        # how method lookups were answered: by the mcall node's cache, by the
+        # object's own cache, or by walking the proto chain (object_misses)
+        self.method_stats = {'site_hits': 0, 'site_misses': 0, 'object_hits': 0, 'object_misses': 0}
+        # if/while blocks entered: without a scope of their own (skipped),
+        # with one from the pool (reused) or with a new one (allocated)
+        self.block_stats = {'skipped': 0, 'reused': 0, 'allocated': 0}
+        self.scope_pool = []  # dynamic scoping: scope dicts of blocks that ended
+        self.frame_pool = {}  # lexical scoping: nslots -> Frames of blocks that ended
+        # 'tree' walks the Element nodes, 'closure' runs function bodies
+        # compiled by brewclosures, 'vm' runs brewvm bytecode, 'flat' runs
+        # brewflat's arrays (or the tree, for programs it can't run)
+        if engine not in ('tree', 'closure', 'vm', 'flat'):
+            raise ValueError(f"unknown engine {engine}")
+        if engine in ('vm', 'flat') and not self.lexical:
+            raise ValueError(f"the {engine} engine needs scoping='lexical'")
+        self.engine = engine
+        # with short_circuit, && and || skip their right operand when the
+        # left one decides the result (see brewops.short_circuit) in every
+        # engine. off by default: the right operand's side effects and type
+        # errors happen either way without it
+        self.short_circuit = short_circuit
+        # optimize folds constant expressions and drops branches that can't
+        # run before the program starts, see brewoptimize
+        self.optimizer = Optimizer(self) if optimize else None
+        # memoize keeps the results of calls to pure funcs, up to memo_size
+        # of them per func, see brewmemo. memo_tables is func node -> its
+        # MemoTable, for the funcs of the program running now
+        self.memoize = memoize
+        self.memo_size = memo_size
+        self.memo_tables = {}
+        # quicken rewrites hot nodes of the tree into type-specialized ones,
+        # see brewquicken
+        self.quickener = None
+        if quicken:
+            if engine != 'tree':
+                raise ValueError("quicken needs engine='tree'")
+            self.quickener = Quickener(self)
+            self.evaluate_expression = self.quickener.evaluate
+        # 'ply' or 'pratt', see brewparse.parse_program
+        if parser not in ('ply', 'pratt'):
+            raise ValueError(f"unknown parser {parser}")
+        self.parser = parser
+        # parsed programs are kept in cache_dir (see brewcache) when it's set
+        self.ast_cache = None
+        if cache_dir is not None:
+            # imported here: it pulls in hashlib, pickle and tempfile, which
+            # would slow down starting up without a cache
+            from brewcache import ASTCache
+            self.ast_cache = ASTCache(cache_dir)
 
     def run(self, program):
+        try:
+            self.run_program(program)
+        finally:
+            # what the sink buffered shows up even if the program failed
+            self.flush()
+
+    def run_program(self, program):
         # program is a list of strs that represent a syntactically valid Brewin prog
         # ex ['func main() { ', 'first = inputi("Enter a first #: ");', …, '}']
         # each item in list is a different line
@@ -27,10 +89,30 @@ class Interpreter(InterpreterBase):
         # will always start with main function
         # main fucntion will have 1+ statements inside
         # assignment and printing are statements that are OK
-        ast = parse_program(program)
+        # program can also be the bytes of a .brewc file (see brewc), which
+        # is loaded without importing the parser at all
+        if self.engine == 'flat':
+            ast = self.run_flat(program)
+            if ast is None:
+                return
+        elif brewc.is_compiled(program):
+            ast = self.optimize(brewc.load(program))
+        else:
+            ast = self.optimize(self.parse(program))
+        self.find_pure_functions(ast)
+        self.compiler = ClosureCompiler(self) if self.engine == 'closure' else None
         #self.variable_name_to_value = {} # need self???
         # save for func defs
-        self.functions = ast.get('functions')
+        self.functions = ast.functions
+        # index funcs by name then arity so calls don't scan self.functions
+        # first def wins, same as the old linear scan. func_defs counts every
+        # def of a name, since a func used as a value is ambiguous unless
+        # there's exactly one
+        self.func_table = {}
+        self.func_defs = {}
+        for f in self.functions:
+            self.func_table.setdefault(f.name, {}).setdefault(len(f.args), f)
+            self.func_defs[f.name] = self.func_defs.get(f.name, 0) + 1
         
         
         # main func node = get main func node (ast)
@@ -40,13 +122,23 @@ class Interpreter(InterpreterBase):
         # get main function from functions list in AST
         main_func_node = None
         for f in self.functions:
-            if f.get('name') == 'main':
+            if f.name == 'main':
                 main_func_node = f
                 
         if main_func_node is None:
             super().error(ErrorType.NAME_ERROR,"No main() function was found",)
 
 
+        if self.lexical:
+            resolve_program(ast)
+            if self.engine == 'vm':
+                BrewinVM(self).run_main(main_func_node)
+                return
+            self.frame = Frame(main_func_node.nslots)
+            self.run_func(main_func_node)
+            return
+
+        mark_block_scopes(ast)
         #run_func(main_func_node)
         self.scopes = [{'name': 'main', 'vars_to_val': {}}] # main function uses global dict
         # process nodes of the AST to run the program
@@ -54,10 +146,57 @@ class Interpreter(InterpreterBase):
 
         self.scopes.pop()  #remove last item (just clean up. not necessary.)
     
+    def parse(self, program):
+        if self.ast_cache is not None:
+            return self.ast_cache.parse(program, self.parser)
+        from brewparse import parse_program
+        return parse_program(program, self.parser)
+
+    def optimize(self, ast):
+        if self.optimizer is not None:
+            self.optimizer.optimize(ast)
+        return ast
+
+    def optimize_stats(self):
+        # what the optimizer changed, see brewoptimize.Optimizer
+        return dict(self.optimizer.stats) if self.optimizer is not None else {}
+
+    def find_pure_functions(self, ast):
+        self.memo_tables = {}
+        if self.memoize:
+            for f in pure_functions(ast.functions, self.lexical):
+                self.memo_tables[f] = MemoTable(f"{f.name}/{len(f.args)}", self.memo_size)
+
+    def memo_stats(self):
+        # hits, misses, hit rate and entries for each pure func, by name/arg count
+        return {table.name: table.stats() for table in self.memo_tables.values()}
+
+    def run_flat(self, program):
+        # runs the program with brewflat's evaluator. a .brewc file goes
+        # straight into the arrays, without building the Element tree. the
+        # tree is returned instead for programs the evaluator can't run
+        if brewc.is_compiled(program):
+            ast = None
+            tree = brewflat.load(program)
+        else:
+            ast = self.optimize(self.parse(program))
+            tree = brewflat.lower(ast)
+        evaluator = FlatEvaluator(self, tree)
+        if not evaluator.resolve():
+            return ast if ast is not None else self.optimize(brewflat.to_element(tree))
+        if ast is not None:
+            # a .brewc has no tree to look for pure funcs in
+            self.find_pure_functions(ast)
+            evaluator.memoize(self.memo_tables)
+        evaluator.run_main()
+        return None
+
     def run_func(self, func_node):
+        if self.compiler is not None:
+            return self.compiler.compile_func(func_node)()
         # run statements in order that they appear in the program
         # aka order of execution
-        for statement_node in func_node.get('statements'):
+        for statement_node in func_node.statements:
             ret = self.run_statement(statement_node)
             if ret is not None:
                 return ret
@@ -73,7 +212,7 @@ class Interpreter(InterpreterBase):
             return self.do_assignment(statement_node)
         elif statement_node.elem_type == InterpreterBase.FCALL_DEF:
             # function call
-            if statement_node.get('name') == 'print':
+            if statement_node.name == 'print':
                 return self.do_print_fcall(statement_node)
             else:
                 return self.fcall(statement_node)
@@ -91,12 +230,14 @@ class Interpreter(InterpreterBase):
             return self.mcall(statement_node)
 
     def do_assignment(self, statement_node):
+        if self.lexical:
+            return self.lexical_assignment(statement_node)
         #print("statement node: ", statement_node)
-        target_var_name = statement_node.get('name')
+        target_var_name = statement_node.name
         # in x = 2 + 10 this is x
-        source_node = statement_node.get('expression')
+        source_node = statement_node.expression
         #print("target ", target_var_name, "expression ", source_node)
-        #print("source node name: ", source_node.get('name'))
+        #print("source node name: ", source_node.name)
         # either expression like 2+10, value like 2, or var like x=y
         
         # what about a.x = @
@@ -107,27 +248,35 @@ class Interpreter(InterpreterBase):
             while i >= 0:
                 if target_var_name in self.scopes[i]['vars_to_val'].keys():
                     flag = True
-                    self.scopes[i]['vars_to_val'][target_var_name].setVal({'fields':{'proto': None}})
+                    self.scopes[i]['vars_to_val'][target_var_name].setVal(Obj())
                     break
                 i -= 1
             
             # else create it in this function
             if not flag:
                 l = len(self.scopes) - 1
-                self.scopes[l]['vars_to_val'][target_var_name] = Val({'fields':{'proto': None}})
+                self.scopes[l]['vars_to_val'][target_var_name] = Val(Obj())
             return None
         
         resulting_value = self.evaluate_expression(source_node)
         #print("result ", resulting_value)
+        return self.assign(statement_node, resulting_value)
+
+    # store an already evaluated value into the target of an assignment
+    def assign(self, statement_node, resulting_value):
+        if self.lexical:
+            return self.lexical_assign(statement_node, resulting_value)
+        target_var_name = statement_node.name
+        source_node = statement_node.expression
         
         # if var name is in this function, set it
         # if var name is in scope of other functions, set it
         
         if '.' in target_var_name:
             # setting a field
-            names = target_var_name.split('.')
-            target_var_name = names[0]
-            field_name = names[1]
+            cache = field_cache(statement_node)
+            target_var_name = cache.base
+            field_name = cache.field
             #print("target var name: ", target_var_name, "field name: ", field_name)
             #print(resulting_value)
             
@@ -138,18 +287,18 @@ class Interpreter(InterpreterBase):
                 if target_var_name in self.scopes[i]['vars_to_val'].keys():
                     # check that target var is an obj
                     is_var_but_not_object = True
-                    if type(self.scopes[i]['vars_to_val'][target_var_name].getVal()) is dict and 'fields' in self.scopes[i]['vars_to_val'][target_var_name].getVal().keys():
+                    if type(self.scopes[i]['vars_to_val'][target_var_name].getVal()) is Obj:
                         # must check if field name is proto
                         if field_name == 'proto':
                             #print("res val: ", resulting_value)
-                            if resulting_value is None or (type(resulting_value) == dict and 'fields' in resulting_value.keys()):
+                            if resulting_value is None or type(resulting_value) is Obj:
                                 # is copying proto by val tho...
-                                self.scopes[i]['vars_to_val'][target_var_name].getVal()['fields'][field_name] = source_node.get('name')
+                                self.scopes[i]['vars_to_val'][target_var_name].getVal().set_proto(source_node.get('name'))
                             else:
                                 # tryna set proto to something that's not an object
                                 super().error(ErrorType.TYPE_ERROR,f"Non object var {resulting_value} assigned to proto",)
                         else:
-                            self.scopes[i]['vars_to_val'][target_var_name].getVal()['fields'][field_name] = Val(resulting_value)
+                            cache.store(self.scopes[i]['vars_to_val'][target_var_name].getVal(), Val(resulting_value))
                         is_var_but_not_object = False
                         worked = True
                         break
@@ -182,8 +331,10 @@ class Interpreter(InterpreterBase):
 
     def mcall(self, mcall):
         #print("mcall: ", mcall)
-        objref = mcall.get('objref')
-        method_name = mcall.get('name')
+        if self.lexical:
+            return self.lexical_mcall(mcall)
+        objref = mcall.objref
+        method_name = mcall.name
         
         # check for func in var
         i = len(self.scopes) - 1
@@ -193,78 +344,70 @@ class Interpreter(InterpreterBase):
             # check if objref exists
             if objref in self.scopes[i]['vars_to_val'].keys():
                 is_a_var = True
-                if isinstance(self.scopes[i]['vars_to_val'][objref].getVal(), dict) and 'fields' in self.scopes[i]['vars_to_val'][objref].getVal().keys():
+                if type(self.scopes[i]['vars_to_val'][objref].getVal()) is Obj:
                     is_an_object = True
                     # check if method call anme is a member of obj ref
-                    curr_obj = objref
-                    while curr_obj is not None:
-                        #print(curr_obj)
-                        if method_name in self.scopes[i]['vars_to_val'][curr_obj].getVal()['fields'].keys():
-                            formal_method = self.scopes[i]['vars_to_val'][curr_obj].getVal()['fields'][method_name] # value of variable passed in as method call
-                            
-                            formal_method = formal_method.getVal()
-                            if type(formal_method) is Element and formal_method.elem_type == 'func' and len(formal_method.get('args')) == len(mcall.get('args')):
-                                # objref.method_name has been assigned to a regular function. so run it.
-                                self.scopes.append({'name': method_name, 'vars_to_val': {}})
-                                l = len(self.scopes) - 1
-                                for k in range(len(formal_method.get('args'))):
-                                    if formal_method.get('args')[k].elem_type == 'refarg':
-                                        self.scopes[l]['vars_to_val'][formal_method.get('args')[k].get('name')] = copy.copy(self.scopes[l-1]['vars_to_val'][mcall.get('args')[k].get('name')])
-                                    else:
-                                        if mcall.get('args')[k].elem_type == 'var':
-                                            if mcall.get('args')[k].get('name') in self.scopes[l-1]['vars_to_val']:
-                                                self.scopes[l]['vars_to_val'][formal_method.get('args')[k].get('name')] = copy.deepcopy(self.scopes[l-1]['vars_to_val'][mcall.get('args')[k].get('name')])
-                                            else:
-                                                super().error(ErrorType.NAME_ERROR,f"Arg {mcall.get('name')} isn't a function",)
+                    formal_method = self.find_method(i, objref, method_name, mcall) # value of variable passed in as method call
+                    if formal_method is not None:
+                        if isinstance(formal_method, Element) and formal_method.elem_type == 'func' and len(formal_method.args) == len(mcall.args):
+                            # objref.method_name has been assigned to a regular function. so run it.
+                            self.scopes.append({'name': method_name, 'vars_to_val': {}})
+                            l = len(self.scopes) - 1
+                            for k in range(len(formal_method.args)):
+                                if formal_method.args[k].elem_type == 'refarg':
+                                    self.scopes[l]['vars_to_val'][formal_method.args[k].name] = copy.copy(self.scopes[l-1]['vars_to_val'][mcall.args[k].get('name')])
+                                else:
+                                    if mcall.args[k].elem_type == 'var':
+                                        if mcall.args[k].name in self.scopes[l-1]['vars_to_val']:
+                                            self.scopes[l]['vars_to_val'][formal_method.args[k].name] = Val(cow_copy(self.scopes[l-1]['vars_to_val'][mcall.args[k].name].getVal()))
                                         else:
-                                            self.scopes[l]['vars_to_val'][formal_method.get('args')[k].get('name')] = Val(mcall.get('args')[k].get('val'))
-                                # append the 'this' var
-                                self.scopes[l]['vars_to_val']['this'] = copy.copy(self.scopes[i]['vars_to_val'][objref])
-                                
-                                # run func
-                                fu = self.run_func(formal_method)
-                                
-                                # want to remove scope
-                                self.scopes.pop()
-                                return fu
-                            
-                            if type(formal_method) is Element and formal_method.elem_type == 'lambda' and len(formal_method.get('args')) == len(mcall.get('args')):
-                                # objref.method_name has been assigned to a lambda. run the lambda.
-                                self.scopes.append({'name': method_name, 'vars_to_val': {}})
-                                
-                                l = len(self.scopes) - 1
-                                for key,val in formal_method.get('closures').items(): # key is var name and val is Val obj
-                                    self.scopes[l]['vars_to_val'][key] = val
-                                
-                                # check args and do the same as above
-                                for k in range(len(formal_method.get('args'))):
-                                    #"formal arg: ", formal_func.get('args')[k])
-                                    #print("input: ", fcall.get('args')[k].elem_type)
-                                    if formal_method.get('args')[k].elem_type == 'refarg':
-                                        self.scopes[l]['vars_to_val'][formal_method.get('args')[k].get('name')] = copy.copy(self.scopes[l-1]['vars_to_val'][mcall.get('args')[k].get('name')])
+                                            super().error(ErrorType.NAME_ERROR,f"Arg {mcall.name} isn't a function",)
                                     else:
-                                        if mcall.get('args')[k].elem_type == 'var':
-                                            if mcall.get('args')[k].get('name') in self.scopes[l-1]['vars_to_val']:
-                                                self.scopes[l]['vars_to_val'][formal_method.get('args')[k].get('name')] = copy.deepcopy(self.scopes[l-1]['vars_to_val'][mcall.get('args')[k].get('name')])
-                                            else:
-                                                super().error(ErrorType.NAME_ERROR,f"Arg {mcall.get('name')} isn't a function",)
+                                        self.scopes[l]['vars_to_val'][formal_method.args[k].name] = Val(mcall.args[k].get('val'))
+                            # append the 'this' var
+                            self.scopes[l]['vars_to_val']['this'] = copy.copy(self.scopes[i]['vars_to_val'][objref])
+                        
+                            # run func
+                            fu = self.run_func(formal_method)
+                        
+                            # want to remove scope
+                            self.scopes.pop()
+                            return fu
+                    
+                        if type(formal_method) is Closure and len(formal_method.args) == len(mcall.args):
+                            # objref.method_name has been assigned to a lambda. run the lambda.
+                            self.scopes.append({'name': method_name, 'vars_to_val': {}})
+                        
+                            l = len(self.scopes) - 1
+                            for key,val in formal_method.closures.items(): # key is var name and val is Val obj
+                                self.scopes[l]['vars_to_val'][key] = val
+                        
+                            # check args and do the same as above
+                            for k in range(len(formal_method.args)):
+                                #"formal arg: ", formal_func.args[k])
+                                #print("input: ", fcall.args[k].elem_type)
+                                if formal_method.args[k].elem_type == 'refarg':
+                                    self.scopes[l]['vars_to_val'][formal_method.args[k].name] = copy.copy(self.scopes[l-1]['vars_to_val'][mcall.args[k].get('name')])
+                                else:
+                                    if mcall.args[k].elem_type == 'var':
+                                        if mcall.args[k].name in self.scopes[l-1]['vars_to_val']:
+                                            self.scopes[l]['vars_to_val'][formal_method.args[k].name] = Val(cow_copy(self.scopes[l-1]['vars_to_val'][mcall.args[k].name].getVal()))
                                         else:
-                                            # input is a primitive
-                                            self.scopes[l]['vars_to_val'][formal_method.get('args')[k].get('name')] = Val(mcall.get('args')[k].get('val'))
-                                # append the 'this' var
-                                self.scopes[l]['vars_to_val']['this'] = copy.copy(self.scopes[i]['vars_to_val'][objref])
-                                
-                                # run the func
-                                fu = self.run_func(formal_method)
-                                
-                                # remove scope
-                                self.scopes.pop()
-                                return fu
-                            else:
-                                super().error(ErrorType.TYPE_ERROR,f"Method {method_name} isn't a function",) #errrs here
+                                            super().error(ErrorType.NAME_ERROR,f"Arg {mcall.name} isn't a function",)
+                                    else:
+                                        # input is a primitive
+                                        self.scopes[l]['vars_to_val'][formal_method.args[k].name] = Val(mcall.args[k].get('val'))
+                            # append the 'this' var
+                            self.scopes[l]['vars_to_val']['this'] = copy.copy(self.scopes[i]['vars_to_val'][objref])
+                        
+                            # run the func
+                            fu = self.run_func(formal_method)
+                        
+                            # remove scope
+                            self.scopes.pop()
+                            return fu
                         else:
-                            #update
-                            curr_obj = self.scopes[i]['vars_to_val'][curr_obj].getVal()['fields']['proto']
+                            super().error(ErrorType.TYPE_ERROR,f"Method {method_name} isn't a function",) #errrs here
             i -=1;
         
         if is_an_object or not is_a_var:
@@ -277,91 +420,96 @@ class Interpreter(InterpreterBase):
         # throw err
 
     def fcall(self, fcall):
+        if self.lexical:
+            return self.lexical_fcall(fcall)
         
-        # locate function in the function list
-        for f in self.functions:
-            # run func and maybe later check args
-            if f.get('name') == fcall.get('name') and len(f.get('args')) == len(fcall.get('args')):
-                self.scopes.append({'name': f.get('name'), 'vars_to_val': {}})
-                # add args to the vars and values list
-                # im thinking of creating a local vars list and adding them to thatprint("isabell")
-                l = len(self.scopes) - 1
-                for i in range(len(f.get('args'))):
-                    if f.get('args')[i].elem_type == 'refarg':
-                        self.scopes[l]['vars_to_val'][f.get('args')[i].get('name')] = copy.copy(self.scopes[l-1]['vars_to_val'][fcall.get('args')[i].get('name')])
-                    else:
-                        if fcall.get('args')[i].elem_type == 'var':
-                            if fcall.get('args')[i].get('name') in self.scopes[l-1]['vars_to_val']:
-                                self.scopes[l]['vars_to_val'][f.get('args')[i].get('name')] = copy.deepcopy(self.scopes[l-1]['vars_to_val'][fcall.get('args')[i].get('name')])
-                            else:
-                                super().error(ErrorType.NAME_ERROR,f"Arg {fcall.get('name')} isn't a function",)
+        # locate function in the function table
+        f = self.func_table.get(fcall.name, {}).get(len(fcall.args))
+        if f is not None:
+            self.scopes.append({'name': f.name, 'vars_to_val': {}})
+            # add args to the vars and values list
+            # im thinking of creating a local vars list and adding them to thatprint("isabell")
+            l = len(self.scopes) - 1
+            for i in range(len(f.args)):
+                if f.args[i].elem_type == 'refarg':
+                    self.scopes[l]['vars_to_val'][f.args[i].name] = copy.copy(self.scopes[l-1]['vars_to_val'][fcall.args[i].get('name')])
+                else:
+                    if fcall.args[i].elem_type == 'var':
+                        if fcall.args[i].name in self.scopes[l-1]['vars_to_val']:
+                            self.scopes[l]['vars_to_val'][f.args[i].name] = Val(cow_copy(self.scopes[l-1]['vars_to_val'][fcall.args[i].name].getVal()))
                         else:
-                            self.scopes[l]['vars_to_val'][f.get('args')[i].get('name')] = Val(fcall.get('args')[i].get('val'))
-                            
-                # run func
+                            super().error(ErrorType.NAME_ERROR,f"Arg {fcall.name} isn't a function",)
+                    else:
+                        self.scopes[l]['vars_to_val'][f.args[i].name] = Val(fcall.args[i].get('val'))
+                        
+            # run func
+            table = self.memo_tables.get(f)
+            if table is None:
                 fu = self.run_func(f)
-                
-                # want to remove scope
-                self.scopes.pop()
-                return fu
+            else:
+                fu = table.call(self.run_func, f, [val.getVal() for val in self.scopes[l]['vars_to_val'].values()])
+            
+            # want to remove scope
+            self.scopes.pop()
+            return fu
         
         # check for func in var
         i = len(self.scopes) - 1
         while i>=0:
-            if fcall.get('name') in self.scopes[i]['vars_to_val'].keys():
-                formal_func = self.scopes[i]['vars_to_val'][fcall.get('name')].getVal() # value of variable passed in as function
+            if fcall.name in self.scopes[i]['vars_to_val'].keys():
+                formal_func = self.scopes[i]['vars_to_val'][fcall.name].getVal() # value of variable passed in as function
                 
-                if type(formal_func) is Element and formal_func.elem_type == 'func' and len(formal_func.get('args')) == len(fcall.get('args')):
+                if isinstance(formal_func, Element) and formal_func.elem_type == 'func' and len(formal_func.args) == len(fcall.args):
                     # run the function
-                    self.scopes.append({'name': fcall.get('name'), 'vars_to_val': {}})
+                    self.scopes.append({'name': fcall.name, 'vars_to_val': {}})
 
                     l = len(self.scopes) - 1
-                    for k in range(len(formal_func.get('args'))):
-                        if formal_func.get('args')[k].elem_type == 'refarg':
-                            self.scopes[l]['vars_to_val'][formal_func.get('args')[k].get('name')] = copy.copy(self.scopes[l-1]['vars_to_val'][fcall.get('args')[k].get('name')])
+                    for k in range(len(formal_func.args)):
+                        if formal_func.args[k].elem_type == 'refarg':
+                            self.scopes[l]['vars_to_val'][formal_func.args[k].name] = copy.copy(self.scopes[l-1]['vars_to_val'][fcall.args[k].get('name')])
                         else:
-                            if fcall.get('args')[k].elem_type == 'var':
-                                if fcall.get('args')[k].get('name') in self.scopes[l-1]['vars_to_val']:
-                                    self.scopes[l]['vars_to_val'][formal_func.get('args')[k].get('name')] = copy.deepcopy(self.scopes[l-1]['vars_to_val'][fcall.get('args')[k].get('name')])
+                            if fcall.args[k].elem_type == 'var':
+                                if fcall.args[k].name in self.scopes[l-1]['vars_to_val']:
+                                    self.scopes[l]['vars_to_val'][formal_func.args[k].name] = Val(cow_copy(self.scopes[l-1]['vars_to_val'][fcall.args[k].name].getVal()))
                                 else:
-                                    super().error(ErrorType.NAME_ERROR,f"Arg {fcall.get('name')} isn't a function",)
+                                    super().error(ErrorType.NAME_ERROR,f"Arg {fcall.name} isn't a function",)
                             else:
-                                self.scopes[l]['vars_to_val'][formal_func.get('args')[k].get('name')] = Val(fcall.get('args')[k].get('val'))
+                                self.scopes[l]['vars_to_val'][formal_func.args[k].name] = Val(fcall.args[k].get('val'))
                     # run func
                     fu = self.run_func(formal_func)
                     
                     # want to remove scope
                     self.scopes.pop()
                     return fu
-                if type(formal_func) is Element and formal_func.elem_type == 'lambda' and len(formal_func.get('args')) == len(fcall.get('args')):
+                if type(formal_func) is Closure and len(formal_func.args) == len(fcall.args):
                     
                     # lambda: args: [arg: name: a], statements: [fcall: name: print, args: [*: op1: [var: name: a], op2: [var: name: b]]], closures: {'b': <__main__.Val object at 0x1006947d0>}
             
                     # fcall: name: x, args: [int: val: 20]
-                    self.scopes.append({'name': fcall.get('name'), 'vars_to_val': {}})
+                    self.scopes.append({'name': fcall.name, 'vars_to_val': {}})
                     
                     # check closures. add these vars to the scoped environment
                     # ISSUE HERE ############
                     l = len(self.scopes) - 1
-                    for key,val in formal_func.get('closures').items(): # key is var name and val is Val obj
+                    for key,val in formal_func.closures.items(): # key is var name and val is Val obj
                         self.scopes[l]['vars_to_val'][key] = val
                     #########################
                     
                     # check args and do the same as above
-                    for k in range(len(formal_func.get('args'))):
-                        #"formal arg: ", formal_func.get('args')[k])
-                        #print("input: ", fcall.get('args')[k].elem_type)
-                        if formal_func.get('args')[k].elem_type == 'refarg':
-                            self.scopes[l]['vars_to_val'][formal_func.get('args')[k].get('name')] = copy.copy(self.scopes[l-1]['vars_to_val'][fcall.get('args')[k].get('name')])
+                    for k in range(len(formal_func.args)):
+                        #"formal arg: ", formal_func.args[k])
+                        #print("input: ", fcall.args[k].elem_type)
+                        if formal_func.args[k].elem_type == 'refarg':
+                            self.scopes[l]['vars_to_val'][formal_func.args[k].name] = copy.copy(self.scopes[l-1]['vars_to_val'][fcall.args[k].get('name')])
                         else:
-                            if fcall.get('args')[k].elem_type == 'var':
-                                if fcall.get('args')[k].get('name') in self.scopes[l-1]['vars_to_val']:
-                                    self.scopes[l]['vars_to_val'][formal_func.get('args')[k].get('name')] = copy.deepcopy(self.scopes[l-1]['vars_to_val'][fcall.get('args')[k].get('name')])
+                            if fcall.args[k].elem_type == 'var':
+                                if fcall.args[k].name in self.scopes[l-1]['vars_to_val']:
+                                    self.scopes[l]['vars_to_val'][formal_func.args[k].name] = Val(cow_copy(self.scopes[l-1]['vars_to_val'][fcall.args[k].name].getVal()))
                                 else:
-                                    super().error(ErrorType.NAME_ERROR,f"Arg {fcall.get('name')} isn't a function",)
+                                    super().error(ErrorType.NAME_ERROR,f"Arg {fcall.name} isn't a function",)
                             else:
                                 # input is a primitive
-                                self.scopes[l]['vars_to_val'][formal_func.get('args')[k].get('name')] = Val(fcall.get('args')[k].get('val'))
+                                self.scopes[l]['vars_to_val'][formal_func.args[k].name] = Val(fcall.args[k].get('val'))
                     # run the func
                     fu = self.run_func(formal_func)
                     
@@ -369,39 +517,78 @@ class Interpreter(InterpreterBase):
                     self.scopes.pop()
                     return fu
                 else:
-                    super().error(ErrorType.TYPE_ERROR,f"Function {fcall.get('name')} isn't a function",)
+                    super().error(ErrorType.TYPE_ERROR,f"Function {fcall.name} isn't a function",)
             i -=1;
         
-        super().error(ErrorType.NAME_ERROR,f"Function {fcall.get('name')} wasn't found",)
+        super().error(ErrorType.NAME_ERROR,f"Function {fcall.name} wasn't found",)
         # throw err
 
     def do_print_fcall(self, statement_node):
         # in v1 must be a print call
-        if statement_node.get('name') == 'print':
+        if statement_node.name == 'print':
             outstr = ""
-            for arg in statement_node.get('args'):
-                s = self.evaluate_expression(arg)
-                if s is None:
-                    outstr += "nil"
-                else:
-                    s = str(s)
-                    if s == "True":
-                        outstr += "true"
-                    elif s == "False":
-                        outstr += "false"
-                    else:
-                        outstr += s
-                    
-                
+            for arg in statement_node.args:
+                outstr += self.print_str(self.evaluate_expression(arg))
             super().output(outstr)
         else:
             super().error(ErrorType.NAME_ERROR,"print function only allowed",)
         # throw err if not
         # also its 0+ nodes
     
+    # a block that can't add a name runs in its parent's scope (see
+    # brewresolve); the others take their scope from a pool of ended blocks'
+    def push_block(self, name, statement_node):
+        stats = self.block_stats
+        if not statement_node.scoped:
+            stats['skipped'] += 1
+        elif self.lexical:
+            pool = self.frame_pool.get(statement_node.nslots)
+            if pool:
+                stats['reused'] += 1
+                frame = pool.pop()
+                frame.slots = [None] * statement_node.nslots
+                frame.parent = self.frame
+                self.frame = frame
+            else:
+                stats['allocated'] += 1
+                self.frame = Frame(statement_node.nslots, self.frame)
+        elif self.scope_pool:
+            stats['reused'] += 1
+            scope = self.scope_pool.pop()
+            scope['name'] = name
+            self.scopes.append(scope)
+        else:
+            stats['allocated'] += 1
+            self.scopes.append({'name': name, 'vars_to_val': {}})
+
+    def pop_block(self, statement_node):
+        if not statement_node.scoped:
+            return
+        if self.lexical:
+            frame = self.frame
+            self.frame = frame.parent
+            self.frame_pool.setdefault(statement_node.nslots, []).append(frame)
+        else:
+            scope = self.scopes.pop()
+            scope['vars_to_val'].clear()
+            self.scope_pool.append(scope)
+
+    def block_scope_stats(self):
+        return dict(self.block_stats)
+
+    def print_str(self, s):
+        if s is None:
+            return "nil"
+        s = str(s)
+        if s == "True":
+            return "true"
+        elif s == "False":
+            return "false"
+        return s
+
     def do_if_statement(self, statement_node):
-        self.scopes.append({'name': 'if', 'vars_to_val': {}})
-        cond = self.evaluate_expression(statement_node.get('condition'))
+        self.push_block('if', statement_node)
+        cond = self.evaluate_expression(statement_node.condition)
         if type(cond) is not bool and type(cond) is not int:
             super().error(ErrorType.TYPE_ERROR,"condition of if statement must be type bool or int",)
             
@@ -412,27 +599,27 @@ class Interpreter(InterpreterBase):
                 cond = True
             
         if cond:
-            for s in statement_node.get('statements'):
+            for s in statement_node.statements:
                 ret = self.run_statement(s)
                 if ret is not None:
-                    self.scopes.pop()
+                    self.pop_block(statement_node)
                     return ret
-            self.scopes.pop()
+            self.pop_block(statement_node)
             return None
-        elif statement_node.get('else_statements') is not None:
+        elif statement_node.else_statements is not None:
             #print(self.scopes[len(self.scopes)-3])
-            for s in statement_node.get('else_statements'):
+            for s in statement_node.else_statements:
                 ret = self.run_statement(s)
                 if ret is not None:
-                    self.scopes.pop()
+                    self.pop_block(statement_node)
                     return ret
-            self.scopes.pop()
+            self.pop_block(statement_node)
             return None
-        self.scopes.pop()
+        self.pop_block(statement_node)
         return None
     
     def do_while_loop(self, statement_node):
-        cond = self.evaluate_expression(statement_node.get('condition'))
+        cond = self.evaluate_expression(statement_node.condition)
         if type(cond) is not bool and type(cond) is not int:
             super().error(ErrorType.TYPE_ERROR,"condition of while loop must be type bool or int",)
             
@@ -443,14 +630,15 @@ class Interpreter(InterpreterBase):
                 cond = True
 
         while cond:
-            self.scopes.append({'name': 'while', 'vars_to_val': {}})
-            for s in statement_node.get('statements'):
+            self.push_block('while', statement_node)
+            for s in statement_node.statements:
                 ret = self.run_statement(s)
                 if ret is not None:
-                    self.scopes.pop()
+                    self.pop_block(statement_node)
                     return ret
-            cond = self.evaluate_expression(statement_node.get('condition'))
-            self.scopes.pop()
+            # condition is checked outside the body's scope, same as the first check
+            self.pop_block(statement_node)
+            cond = self.evaluate_expression(statement_node.condition)
             if type(cond) is not bool and type(cond) is not int:
                 super().error(ErrorType.TYPE_ERROR,"condition of while loop must be type bool or int",)
             
@@ -465,12 +653,12 @@ class Interpreter(InterpreterBase):
         
     
     def do_ret_statement(self, statement_node):
-        if statement_node.get('expression') is not None:
-            r = self.evaluate_expression(statement_node.get('expression'))
+        if statement_node.expression is not None:
+            r = self.evaluate_expression(statement_node.expression)
             if r == InterpreterBase.NIL_DEF:
                 return None
             else:
-                return copy.deepcopy(r)
+                return cow_copy(r)
         return None
     
     def evaluate_expression(self, node):
@@ -481,17 +669,19 @@ class Interpreter(InterpreterBase):
         elif node.elem_type == InterpreterBase.VAR_DEF:
             # variable node
             return self.get_value_of_variable(node)
+        elif self.short_circuit and node.elem_type in LOGICAL_OPS:
+            return self.evaluate_logical_operator(node)
         elif node.elem_type in {'+','-','*','/','<','>','<=','>=','!=', '==', '||', '&&'}:
             # expression node representing binary operation
             return self.evaluate_binary_operator(node)
         elif node.elem_type == "fcall":
             # eval it
             # SIWTCH TO HANDLE MORE THAN JUST INPUT I
-            if node.get('name') == 'inputi':
+            if node.name == 'inputi':
                 return self.do_inputi_fcall(node)
-            elif node.get('name') == 'inputs':
+            elif node.name == 'inputs':
                 return self.do_inputs_fcall(node)
-            elif node.get('name') == 'print':
+            elif node.name == 'print':
                 return self.do_print_fcall(node)
             else:
                 return self.fcall(node)
@@ -504,26 +694,38 @@ class Interpreter(InterpreterBase):
             return self.mcall(node)
          
     def create_lambda(self, lambda_exp):
+        if self.lexical:
+            return self.lexical_create_lambda(lambda_exp)
         
         # need to create a closure of these vars
-        # create a new key called closures with a dict of all vars and their vals
-        i = 0
-        lambda_exp.dict['closures'] = {}
-        while i < len(self.scopes):
-            for key,val in self.scopes[i]['vars_to_val'].items():
-                # making a copy
-                lambda_exp.dict['closures'][key] = Val(val.getVal())
-            i += 1
+        # only the names the body uses, each copied from the innermost scope
+        # that has it, or every var in scope if the body calls something (see
+        # free_variables). a new Closure per evaluation, the node isn't touched
+        closures = {}
+        names = free_variables(lambda_exp)
+        if names is EVERY_VAR:
+            for scope in self.scopes:
+                for key, val in scope['vars_to_val'].items():
+                    closures[key] = Val(val.getVal())
+            return Closure(lambda_exp, closures)
+        for key in names:
+            i = len(self.scopes) - 1
+            while i >= 0:
+                if key in self.scopes[i]['vars_to_val']:
+                    # making a copy
+                    closures[key] = Val(self.scopes[i]['vars_to_val'][key].getVal())
+                    break
+                i -= 1
         
-        return lambda_exp
+        return Closure(lambda_exp, closures)
             
     def do_inputi_fcall(self, statement_node):
         # in v1 must be a print call
-        if statement_node.get('name') == 'inputi':
+        if statement_node.name == 'inputi':
             # output the single param which is the prompt (if any)
-            if len(statement_node.get('args')) == 1:
-                super().output(str(self.evaluate_expression(statement_node.get('args')[0])))
-            elif len(statement_node.get('args')) > 1:
+            if len(statement_node.args) == 1:
+                super().output(str(self.evaluate_expression(statement_node.args[0])))
+            elif len(statement_node.args) > 1:
                 super().error(ErrorType.NAME_ERROR,"inputi function can only have 1 or 0 args",)
             
             # guarantee that the input is a valid integer in String form
@@ -538,9 +740,9 @@ class Interpreter(InterpreterBase):
         
     def do_inputs_fcall(self, statement_node):
         # output the single param which is the prompt (if any)
-        if len(statement_node.get('args')) == 1:
-            super().output(str(self.evaluate_expression(statement_node.get('args')[0])))
-        elif len(statement_node.get('args')) > 1:
+        if len(statement_node.args) == 1:
+            super().output(str(self.evaluate_expression(statement_node.args[0])))
+        elif len(statement_node.args) > 1:
             super().error(ErrorType.NAME_ERROR,"inputs function can only have 1 or 0 args",)
             
         # guarantee that the input is a valid integer in String form
@@ -556,33 +758,109 @@ class Interpreter(InterpreterBase):
         if val_node.elem_type == InterpreterBase.NIL_DEF:
             return None
         
-        return val_node.get('val')
+        return val_node.val
     
+    # protos are kept by var name with dynamic scoping. the name is looked up
+    # from the scope the object was found in outwards, since a lambda method
+    # only captures the names its body uses
+    def find_var_scope(self, i, name):
+        while i >= 0 and name not in self.scopes[i]['vars_to_val']:
+            i -= 1
+        return i
+
+    def method_cache_stats(self):
+        return dict(self.method_stats)
+
+    # node -> (times specialized, times deopted) for the nodes quicken has
+    # specialized
+    def quicken_stats(self):
+        if self.quickener is None:
+            return {}
+        return self.quickener.stats()
+
+    # the method's value on the object in objref, scopes[i], or None if
+    # neither it nor its protos have it. the mcall node's cache knows the
+    # shapes that have the method as their own field; for a method up the
+    # chain the object keeps (receiver shape, hops, index) in obj.methods,
+    # where hops is (proto name, object, shape) for each object after it up
+    # to the one holding the method. protos are names here, so a hit still
+    # looks each name up again, but not the method
+    def find_method(self, i, objref, method_name, mcall):
+        stats = self.method_stats
+        site = method_cache(mcall)
+        obj = self.scopes[i]['vars_to_val'][objref].getVal()
+        val = site.probe(obj)
+        if val is not None and val is not MISS:
+            stats['site_hits'] += 1
+            return val.getVal()
+        stats['site_misses'] += 1
+
+        entry = obj.methods.get(method_name) if obj.methods is not None else None
+        if entry is not None and entry[0] is obj.shape:
+            curr, j = obj, i
+            for name, o, shape in entry[1]:
+                if curr.proto != name:
+                    break
+                j = self.find_var_scope(j, name)
+                if j < 0 or self.scopes[j]['vars_to_val'][name].getVal() is not o or o.shape is not shape:
+                    break
+                curr = o
+            else:
+                stats['object_hits'] += 1
+                return curr.get_value(entry[2]).getVal()
+        stats['object_misses'] += 1
+
+        found = site.walk(obj)
+        if found is not None:
+            return found[0].get_value(found[1]).getVal()
+        hops = []
+        curr, j = obj, i
+        while True:
+            name = curr.get_proto()
+            if name is None:
+                return None
+            j = self.find_var_scope(j, name)
+            if j < 0:
+                super().error(ErrorType.NAME_ERROR,f"Variable {name} has not been defined",)
+            curr = self.scopes[j]['vars_to_val'][name].getVal()
+            hops.append((name, curr, curr.shape))
+            index = curr.shape.lookup(method_name)
+            if index is not None:
+                if obj.methods is None:
+                    obj.methods = {}
+                obj.methods[method_name] = (obj.shape, tuple(hops), index)
+                return curr.get_value(index).getVal()
+
     # value of var node
     def get_value_of_variable(self, var_node):
+        if self.lexical:
+            return self.lexical_get_value_of_variable(var_node)
 
-        var_name = var_node.get('name')
+        var_name = var_node.name
         #print(var_node)
         
         if '.' in var_name:
             # setting a field
-            names = var_name.split('.')
-            var_name = names[0]
-            field_name = names[1]
+            cache = field_cache(var_node)
+            var_name = cache.base
             
             is_a_var_but_not_object = False
             i = len(self.scopes) - 1
             while i >= 0:
                 curr_obj = var_name
+                j = i
                 
                 while curr_obj is not None:
-                    if curr_obj in self.scopes[i]['vars_to_val'].keys():
-                        if isinstance(self.scopes[i]['vars_to_val'][curr_obj].getVal(), dict) and 'fields' in self.scopes[i]['vars_to_val'][curr_obj].getVal().keys():
+                    if curr_obj in self.scopes[j]['vars_to_val'].keys():
+                        if type(self.scopes[j]['vars_to_val'][curr_obj].getVal()) is Obj:
                                 is_a_var_but_not_object = False
-                                if field_name in self.scopes[i]['vars_to_val'][curr_obj].getVal()['fields'].keys():
-                                    return self.scopes[i]['vars_to_val'][curr_obj].getVal()['fields'][field_name].getVal()
+                                field = cache.find(self.scopes[j]['vars_to_val'][curr_obj].getVal())
+                                if field is not None:
+                                    return field.getVal()
                                 else:
-                                    curr_obj = self.scopes[i]['vars_to_val'][curr_obj].getVal()['fields']['proto']
+                                    curr_obj = self.scopes[j]['vars_to_val'][curr_obj].getVal().get_proto()
+                                    if curr_obj is not None:
+                                        j = max(self.find_var_scope(j, curr_obj), 0)
                         else:
                             is_a_var_but_not_object = True
                             break
@@ -603,16 +881,10 @@ class Interpreter(InterpreterBase):
                 return self.scopes[i]['vars_to_val'][var_name].getVal()
             i -= 1
         
-        count = 0
-        func = None
-        for f in self.functions:
-            if f.get('name') == var_name:
-                count += 1
-                func = f
-        
-        if func is not None:
-            if count == 1:
-                return func
+        overloads = self.func_table.get(var_name)
+        if overloads is not None:
+            if self.func_defs[var_name] == 1:
+                return next(iter(overloads.values()))
             else:
                 super().error(ErrorType.NAME_ERROR, f"Function var name {var_name} is ambiguous",)
             
@@ -622,8 +894,8 @@ class Interpreter(InterpreterBase):
     # binary ops, bool and arith
     def evaluate_binary_operator(self, expression_node):
         # dict holds op1 and op2
-        op1 = expression_node.get('op1')
-        op2 = expression_node.get('op2')
+        op1 = expression_node.op1
+        op2 = expression_node.op2
         
         #print("op1 expression node", op1)
         #print("op2 expression node", op2)
@@ -634,342 +906,42 @@ class Interpreter(InterpreterBase):
         #print("op1 evaled", op1)
         #print(expression_node.elem_type)
         #print("op2 evaled", op2)
-        
-        
-        if type(op1) is int and type(op2) is int:
-            if expression_node.elem_type == '+':
-                # here
-                return op1 + op2
-            elif expression_node.elem_type == '-':
-                # here
-                return op1 - op2
-            elif expression_node.elem_type == '*':
-                # here
-                return op1 * op2
-            elif expression_node.elem_type == '/':
-                # here
-                return op1 // op2
-            elif expression_node.elem_type == '==':
-                return op1 == op2
-            elif expression_node.elem_type == '<':
-                return op1 < op2
-            elif expression_node.elem_type == '>':
-                return op1 > op2
-            elif expression_node.elem_type == '<=':
-                return op1 <= op2
-            elif expression_node.elem_type == '>=':
-                return op1 >= op2
-            elif expression_node.elem_type == '!=':
-                return op1 != op2
-            elif expression_node.elem_type == '&&':
-                if op1 != 0 and op2 != 0:
-                    return True
-                else:
-                    return False
-            elif expression_node.elem_type == '||':
-                if op1 != 0 or op2 != 0:
-                    return True
-                else:
-                    return False
-            else:
-                super().error(ErrorType.TYPE_ERROR,"Incompatible types for integer operation",
-                          )
-        elif type(op1) is bool and type(op2) is bool:
-            if expression_node.elem_type == '==':
-                return op1 == op2
-            elif expression_node.elem_type == '||':
-                return op1 or op2
-            elif expression_node.elem_type == '&&':
-                return op1 and op2
-            elif expression_node.elem_type == '!=':
-                return op1 != op2
-            elif expression_node.elem_type == '+':
-                if op1:
-                    op1 = 1
-                else:
-                    op1 = 0
-                if op2:
-                    op2 = 1
-                else:
-                    op2 = 0
-                return op1 + op2
-            elif expression_node.elem_type == '-':
-                if op1:
-                    op1 = 1
-                else:
-                    op1 = 0
-                if op2:
-                    op2 = 1
-                else:
-                    op2 = 0
-                return op1 - op2
-            elif expression_node.elem_type == '*':
-                if op1:
-                    op1 = 1
-                else:
-                    op1 = 0
-                if op2:
-                    op2 = 1
-                else:
-                    op2 = 0
-                return op1 * op2
-            elif expression_node.elem_type == '/':
-                if op1:
-                    op1 = 1
-                else:
-                    op1 = 0
-                if op2:
-                    op2 = 1
-                else:
-                    op2 = 0
-                return op1 // op2
-            else:
-                super().error(ErrorType.TYPE_ERROR,"Incompatible types for boolean comparison",
-                          )
-        elif type(op1) is str and type(op2) is str:
-            if expression_node.elem_type == '==':
-                return op1 == op2
-            elif expression_node.elem_type == '!=':
-                return op1 != op2
-            elif expression_node.elem_type == '+':
-                return op1 + op2
-            else:
-                super().error(ErrorType.TYPE_ERROR,"Incompatible types for string operations",
-                          )
-        elif op1 is None and op2 is None:
-            if expression_node.elem_type == '==':
-                return True
-            else:
-                return False
-        elif expression_node.elem_type == '+':
-            if type (op1) is int and type (op2) is bool:
-                if op2:
-                    op2 = 1
-                else:
-                    op2 = 0
-                return op1 + op2
-            elif type(op1) is bool and type (op2) is int:
-                if op1:
-                    op1 = 1
-                else:
-                    op1 = 0
-                return op1 + op2
-            else:
-                super().error(ErrorType.TYPE_ERROR,"Incompatible types for binary operation",
-                          )
-        elif expression_node.elem_type == '-':
-            if type (op1) is int and type (op2) is bool:
-                if op2:
-                    op2 = 1
-                else:
-                    op2 = 0
-                return op1 - op2
-            elif type(op1) is bool and type (op2) is int:
-                if op1:
-                    op1 = 1
-                else:
-                    op1 = 0
-                return op1 - op2
-            else:
-                super().error(ErrorType.TYPE_ERROR,"Incompatible types for binary operation",)
-        elif expression_node.elem_type == '*':
-            if type (op1) is int and type (op2) is bool:
-                if op2:
-                    op2 = 1
-                else:
-                    op2 = 0
-                return op1 * op2
-            elif type(op1) is bool and type (op2) is int:
-                if op1:
-                    op1 = 1
-                else:
-                    op1 = 0
-                return op1 * op2
-            else:
-                super().error(ErrorType.TYPE_ERROR,"Incompatible types for binary operation",)
-        elif expression_node.elem_type == '/':
-            if type (op1) is int and type (op2) is bool:
-                if op2:
-                    op2 = 1
-                else:
-                    op2 = 0
-                return op1 // op2
-            elif type(op1) is bool and type (op2) is int:
-                if op1:
-                    op1 = 1
-                else:
-                    op1 = 0
-                return op1 // op2
-            else:
-                super().error(ErrorType.TYPE_ERROR,"Incompatible types for binary operation",)
-        elif expression_node.elem_type == '&&':
-            if type (op1) is int and type (op2) is bool:
-                # compare int and bool
-                if op2 and op1 != 0:
-                    # op2 is True and op1 is non Zero
-                    return True
-                elif op2 and op1 == 0:
-                    # op2 is True and op1 is Zero
-                    return False
-                elif op1 == 0:
-                    #op2 false
-                    return False
-            elif type(op1) is bool and type (op2) is int:
-                # compare int and bool
-                if op1 and op2 != 0:
-                    # op2 is True and op1 is non Zero
-                    return True
-                elif op1 and op2 == 0:
-                    # op2 is True and op1 is Zero
-                    return False
-                elif op2 == 0:
-                    #op2 false
-                    return False 
-            else:
-                super().error(ErrorType.TYPE_ERROR,"Incompatible types for binary operation",)
-        elif expression_node.elem_type == '||':
-            if type (op1) is int and type (op2) is bool:
-                # compare int and bool
-                if op2 and op1 != 0:
-                    # op2 is True and op1 is non Zero
-                    return True
-                elif op2 and op1 == 0:
-                    # op2 is True and op1 is Zero
-                    return True
-                elif op1 == 0:
-                    #op2 false and op1 zero
-                    return False
-                else:
-                    # op2 false and op1 non zero
-                    return True
-            elif type(op1) is bool and type (op2) is int:
-                # compare int and bool
-                if op1 and op2 != 0:
-                    # op2 is True and op1 is non Zero
-                    return True
-                elif op1 and op2 == 0:
-                    # op2 is True and op1 is Zero
-                    return True
-                elif op2 == 0:
-                    #op2 false and op1 zero
-                    return False
-                else:
-                    # op2 false and op1 non zero
-                    return True   
-            else:
-               super().error(ErrorType.TYPE_ERROR,"Incompatible types for binary operation",)
-        elif expression_node.elem_type == '==':
-            # comparison vals of diff types
-            if type (op1) is int and type (op2) is bool:
-                # compare int and bool
-                if op2 and op1 != 0:
-                    # op2 is True and op1 is non Zero
-                    return True
-                elif op2 and op1 == 0:
-                    # op2 is True and op1 is Zero
-                    return False
-                elif op1 == 0:
-                    #op2 false and op1 zero
-                    return True
-                else:
-                    # op2 false and op1 non zero
-                    return False
-            elif type(op1) is bool and type (op2) is int:
-                # compare int and bool
-                if op1 and op2 != 0:
-                    # op2 is True and op1 is non Zero
-                    return True
-                elif op1 and op2 == 0:
-                    # op2 is True and op1 is Zero
-                    return False
-                elif op2 == 0:
-                    #op2 false and op1 zero
-                    return True
-                else:
-                    # op2 false and op1 non zero
-                    return False   
-            elif type(op1) is Element and type(op2) is Element:
-                # need function comparison
-                if op1.elem_type == 'func':
-                    if op2.elem_type == 'func':
-                        if op1.get('name') == op2.get('name') and op1.get('args') == op2.get('args') and op1.get('statements') == op2.get('statements'):
-                            return True
-                    else:
-                        return False
-                elif op1.elem_type == 'lambda':
-                    if op2.elem_type == 'lambda':
-                        if op1.get('name') == op2.get('name') and op1.get('args') == op2.get('args') and op1.get('statements') == op2.get('statements') and op1.get('closures') == op2.get('closures'):
-                            return True
-                    else:
-                        return False
-                return False
-            elif type(op1) is dict and type(op2) is dict:
-                if 'fields' in op1.keys() and 'fields' in op2.keys():
-                    #print("haiii")
-                    if op1 is op2:
-                        return True
-                return False
-            else:
-                return False
-        elif expression_node.elem_type == '!=':
-            # comparison vals of diff types
-            if type (op1) is int and type (op2) is bool:
-                # compare int and bool
-                if op2 and op1 != 0:
-                    # op2 is True and op1 is non Zero
-                    return True
-                elif op2 and op1 == 0:
-                    # op2 is True and op1 is Zero
-                    return False
-                elif op1 == 0:
-                    #op2 false and op1 zero
-                    return True
-                else:
-                    # op2 false and op1 non zero
-                    return False
-            elif type(op1) is bool and type(op2) is int:
-                # compare int and bool
-                if op1 and op2 != 0:
-                    # op2 is True and op1 is non Zero
-                    return True
-                elif op1 and op2 == 0:
-                    # op2 is True and op1 is Zero
-                    return False
-                elif op2 == 0:
-                    #op2 false and op1 zero
-                    return True
-                else:
-                    # op2 false and op1 non zero
-                    return False 
-            elif type(op1) is Element and type(op2) is Element:
-                # need function comparison
-                if op1.elem_type == 'func':
-                    if op2.elem_type == 'func':
-                        if op1.get('name') == op2.get('name') and op1.get('args') == op2.get('args') and op1.get('statements') == op2.get('statements'):
-                            return False
-                elif op1.elem_type == 'lambda':
-                    if op2.elem_type == 'lambda':
-                        if op1.get('name') == op2.get('name') and op1.get('args') == op2.get('args') and op1.get('statements') == op2.get('statements') and op1.get('closures') == op2.get('closures'):
-                            return False
-                return True
-            elif type(op1) is dict and type(op2) is dict:
-                if 'fields' in op1.keys() and 'fields' in op2.keys():
-                    #print("haiii")
-                    if op1 is op2:
-                        return False
-                return True
-            else:
-                return True
-        else:
-            super().error(ErrorType.TYPE_ERROR,"Incompatible types for binary operation",
-                          )
+        try:
+            handler = TABLE[expression_node.elem_type][type(op1)][type(op2)]
+        except KeyError:
+            handler = None
+        if handler is None or type(handler) is str:
+            return self.binary_operator(expression_node.elem_type, op1, op2)
+        return handler(op1, op2)
+
+    # && or || in short_circuit mode: op2 only runs if op1 doesn't decide it
+    def evaluate_logical_operator(self, expression_node):
+        op = expression_node.elem_type
+        op1 = self.evaluate_expression(expression_node.op1)
+        result = short_circuit(op, op1)
+        if result is not None:
+            return result
+        return self.binary_operator(op, op1, self.evaluate_expression(expression_node.op2))
+
+    # apply binary operator op to two evaluated operands, with the handler
+    # brewops has for their types
+    def binary_operator(self, op, op1, op2):
+        try:
+            handler = TABLE[op][type(op1)][type(op2)]
+        except KeyError:
+            handler = OTHER_HANDLERS[op]
+        if type(handler) is str:
+            super().error(ErrorType.TYPE_ERROR, handler,)
+        return handler(op1, op2)
         
     # unary op neg or ! eval
     def evaluate_unary_operator(self, expression_node):
         # dict holds op1
-        op1 = self.evaluate_expression(expression_node.get('op1'))
-        
-        if expression_node.elem_type == InterpreterBase.NEG_DEF:
+        op1 = self.evaluate_expression(expression_node.op1)
+        return self.unary_operator(expression_node.elem_type, op1)
+
+    def unary_operator(self, op, op1):
+        if op == InterpreterBase.NEG_DEF:
             if not isinstance(op1,int):
                 super().error(ErrorType.TYPE_ERROR,"Incompatible types for arithmetic negation",
                             )
@@ -987,6 +959,195 @@ class Interpreter(InterpreterBase):
                             )
 
 
+    # lexical scoping mode
+    # variables live in Frame slots at the (depth, slot) addresses that
+    # brewresolve put on the nodes, so no scope walking or name lookups
+    # objects keep their proto as the object itself instead of a var name
+
+    def lexical_lookup(self, node):
+        # the Val at a resolved address, or None if it isn't a variable (yet)
+        if node.addr is None:
+            return None
+        frame = self.frame
+        for _ in range(node.addr[0]):
+            frame = frame.parent
+        return frame.slots[node.addr[1]]
+
+    def is_object(self, v):
+        return type(v) is Obj
+
+    def lexical_get_value_of_variable(self, var_node):
+        var_name = var_node.name
+        val = self.lexical_lookup(var_node)
+
+        if '.' in var_name:
+            cache = field_cache(var_node)
+            var_name = cache.base
+            if val is None:
+                super().error(ErrorType.NAME_ERROR, f"Variable {var_name} has not been defined",)
+            obj = val.getVal()
+            if not self.is_object(obj):
+                super().error(ErrorType.TYPE_ERROR, f"Variable {var_name} is not been an obj",)
+            if cache.field == 'proto':
+                return obj.get_proto()
+            field = cache.find(obj)
+            if field is not None:
+                return field.getVal()
+            super().error(ErrorType.NAME_ERROR, f"Variable {var_name} has not been defined",)
+
+        if val is not None:
+            return val.getVal()
+
+        overloads = self.func_table.get(var_name)
+        if overloads is not None:
+            if self.func_defs[var_name] == 1:
+                return next(iter(overloads.values()))
+            else:
+                super().error(ErrorType.NAME_ERROR, f"Function var name {var_name} is ambiguous",)
+
+        super().error(ErrorType.NAME_ERROR, f"Variable {var_name} has not been defined",)
+
+    def lexical_assignment(self, statement_node):
+        source_node = statement_node.expression
+        if source_node.elem_type == InterpreterBase.OBJ_DEF:
+            resulting_value = Obj()
+        else:
+            resulting_value = self.evaluate_expression(source_node)
+        return self.lexical_assign(statement_node, resulting_value)
+
+    def lexical_assign(self, statement_node, resulting_value):
+        target_var_name = statement_node.name
+        if '.' in target_var_name:
+            cache = field_cache(statement_node)
+            target_var_name = cache.base
+            val = self.lexical_lookup(statement_node)
+            if val is None:
+                super().error(ErrorType.NAME_ERROR,f"Var {target_var_name} not found",)
+            obj = val.getVal()
+            if not self.is_object(obj):
+                super().error(ErrorType.TYPE_ERROR,f"Dot op used on non object var {target_var_name}",)
+            if cache.field == 'proto':
+                if resulting_value is not None and not self.is_object(resulting_value):
+                    super().error(ErrorType.TYPE_ERROR,f"Non object var {resulting_value} assigned to proto",)
+                obj.set_proto(resulting_value)
+            else:
+                cache.store(obj, Val(resulting_value))
+            return None
+
+        frame = self.frame
+        for _ in range(statement_node.addr[0]):
+            frame = frame.parent
+        val = frame.slots[statement_node.addr[1]]
+        if val is None:
+            frame.slots[statement_node.addr[1]] = Val(resulting_value)
+        else:
+            val.setVal(resulting_value)
+        return None
+
+    def lexical_call(self, func, call_args, this=None):
+        # args are evaluated in the caller's frame, then the callee gets a
+        # fresh frame with no parent: it can only see its own slots
+        frame = Frame(func.nslots)
+        if func.elem_type == InterpreterBase.LAMBDA_DEF:
+            for key, val in func.closures.items():
+                frame.slots[func.capture_slots[key]] = val
+        formal_args = func.args
+        for k in range(len(formal_args)):
+            arg = call_args[k]
+            if formal_args[k].elem_type == InterpreterBase.REFARG_DEF and arg.elem_type == InterpreterBase.VAR_DEF and '.' not in arg.name:
+                val = self.lexical_lookup(arg)
+                if val is None:
+                    super().error(ErrorType.NAME_ERROR, f"Variable {arg.name} has not been defined",)
+                # shares the env dict, so writes go back to the caller's var
+                frame.slots[k] = copy.copy(val)
+            else:
+                frame.slots[k] = Val(cow_copy(self.evaluate_expression(arg)))
+        if this is not None:
+            frame.slots[func.this_slot] = copy.copy(this)
+
+        table = self.memo_tables.get(func) if this is None else None
+        caller_frame = self.frame
+        self.frame = frame
+        if table is None:
+            fu = self.run_func(func)
+        else:
+            fu = table.call(self.run_func, func, [val.getVal() for val in frame.slots[:len(formal_args)]])
+        self.frame = caller_frame
+        return fu
+
+    def is_callable(self, v, num_args):
+        return is_function(v) and len(v.args) == num_args
+
+    def lexical_fcall(self, fcall):
+        f = self.func_table.get(fcall.name, {}).get(len(fcall.args))
+        if f is not None:
+            return self.lexical_call(f, fcall.args)
+
+        val = self.lexical_lookup(fcall)
+        if val is not None:
+            formal_func = val.getVal()
+            if self.is_callable(formal_func, len(fcall.args)):
+                return self.lexical_call(formal_func, fcall.args)
+            super().error(ErrorType.TYPE_ERROR,f"Function {fcall.name} isn't a function",)
+
+        super().error(ErrorType.NAME_ERROR,f"Function {fcall.name} wasn't found",)
+
+    def lexical_mcall(self, mcall):
+        objref = mcall.objref
+        method_name = mcall.name
+        val = self.lexical_lookup(mcall)
+        if val is None:
+            super().error(ErrorType.NAME_ERROR,f"Method {method_name} wasn't found",)
+        obj = val.getVal()
+        if not self.is_object(obj):
+            super().error(ErrorType.TYPE_ERROR,f"Objref {objref} wasn't found",)
+
+        field = self.lexical_find_method(obj, method_cache(mcall)) if method_name != 'proto' else None
+        if field is not None:
+            formal_method = field.getVal()
+            if self.is_callable(formal_method, len(mcall.args)):
+                return self.lexical_call(formal_method, mcall.args, val)
+            super().error(ErrorType.TYPE_ERROR,f"Method {method_name} isn't a function",)
+
+        super().error(ErrorType.NAME_ERROR,f"Method {method_name} wasn't found",)
+
+    # the method's Val on obj or its protos, or None. the mcall node's cache
+    # is tried first, then obj.methods, which maps a method name to (holder,
+    # index, shape, proto, epoch) for obj. either is only good while obj
+    # keeps its shape and proto and no object that is a proto has changed
+    def lexical_find_method(self, obj, site):
+        stats = self.method_stats
+        val = site.probe(obj)
+        if val is not MISS:
+            stats['site_hits'] += 1
+            return val
+        stats['site_misses'] += 1
+        entry = obj.methods.get(site.field) if obj.methods is not None else None
+        if (entry is not None and entry[2] is obj.shape and entry[3] is obj.proto
+                and entry[4] == Shape.epoch):
+            stats['object_hits'] += 1
+            return entry[0].get_value(entry[1])
+        stats['object_misses'] += 1
+        found = site.walk(obj)
+        if found is None:
+            return None
+        holder, index = found
+        if obj.methods is None:
+            obj.methods = {}
+        obj.methods[site.field] = (holder, index, obj.shape, obj.proto, Shape.epoch)
+        return holder.get_value(index)
+
+    def lexical_create_lambda(self, lambda_exp):
+        # copy just the vars the lambda body uses, as found by the resolver
+        closures = {}
+        for key, depth, slot, _ in lambda_exp.captures:
+            frame = self.frame
+            for _ in range(depth):
+                frame = frame.parent
+            if frame.slots[slot] is not None:
+                closures[key] = Val(frame.slots[slot].getVal())
+        return Closure(lambda_exp, closures)
+
 ## DELETEEE AT END
 ## open source testing ##
 
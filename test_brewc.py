@@ -0,0 +1,22 @@
+import subprocess
+import sys
+
+import brewc
+import brewpratt
+
+PROGRAM = 'func main() { print(1 + 2); }'
+
+LOAD = """
+import sys
+from interpreterv4 import Interpreter
+interp = Interpreter(console_output=False)
+interp.run(open(sys.argv[1], 'rb').read())
+print(interp.get_output(), 'ply.lex' in sys.modules, 'brewlex' in sys.modules)
+"""
+
+
+def test_loading_a_brewc_skips_the_parser(tmp_path):
+    path = tmp_path / 'program.brewc'
+    path.write_bytes(brewc.dump(brewpratt.parse(PROGRAM)))
+    result = subprocess.run([sys.executable, '-c', LOAD, str(path)], capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["['3']", 'False', 'False']
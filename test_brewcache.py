@@ -0,0 +1,29 @@
+import mmap
+
+from interpreterv4 import Interpreter
+
+PROGRAM = 'func main() { print("café ", 1 + 2); }'
+
+
+def run(program, cache_dir):
+    interp = Interpreter(console_output=False, cache_dir=str(cache_dir))
+    interp.run(program)
+    return interp
+
+
+def test_str_bytes_and_mmap_share_an_entry(tmp_path):
+    first = run(PROGRAM, tmp_path)
+    assert first.get_output() == ['café 3']
+    assert first.ast_cache.misses == 1
+
+    again = run(PROGRAM.encode(), tmp_path)
+    assert again.get_output() == ['café 3']
+    assert again.ast_cache.hits == 1
+
+    path = tmp_path / 'program.br'
+    path.write_bytes(PROGRAM.encode())
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+        mapped = run(source, tmp_path)
+    assert mapped.get_output() == ['café 3']
+    assert mapped.ast_cache.hits == 1
+
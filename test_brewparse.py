@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from ply import yacc
+
+import brewparse
+import brewparsetab
+from brewparse import parse_program
+
+CORPUS = [
+    'func main() { x = 1 + 2 * 3; print(x); }',
+    'func f(a, ref b) { b = a; }\nfunc main() { f(1, x); if (x > 0) { print(x); } else { return; } }',
+    'func main() { i = 0; while (i < 3) { i = i + 1; } }',
+    'func main() { o = @; o.x = 1; o.f = lambda(a) { return a + this.x; }; print(o.f(2)); }',
+    'func main() { x = ; }',
+    'func main() { if (x) { } }',
+]
+
+
+# brewparse loads brewparsetab without checking it against the grammar, so
+# the tables have to be regenerated (python brewtables.py) whenever the
+# rules, or the lines they are on, change
+def test_parser_tables_match_the_grammar():
+    grammar = yacc.ParserReflect(vars(brewparse))
+    grammar.get_all()
+    assert brewparsetab._lr_signature == grammar.signature()
+    rules = []
+    for line, _, name, doc in grammar.pfuncs:
+        for _, rule_line, rule, symbols in yacc.parse_grammar(doc, None, line):
+            if '%prec' in symbols:
+                symbols = symbols[:symbols.index('%prec')]
+            rules.append((' '.join([rule, '->'] + symbols), name, rule_line))
+    tables = [(rule, name, line) for rule, _, _, name, _, line in brewparsetab._lr_productions[1:]]
+    assert sorted(tables) == sorted(rules)
+
+
+def parse(program, parser):
+    try:
+        return str(parse_program(program, parser))
+    except SyntaxError:
+        return None
+
+
+# every tree parsed on many threads at once must match the one parsed on its
+# own, and a syntax error in one program must not leak into the others
+@pytest.mark.parametrize('parser', ['ply', 'pratt'])
+def test_concurrent_parses_match(parser):
+    expected = [parse(program, parser) for program in CORPUS]
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(parse, CORPUS * 50, [parser] * len(CORPUS) * 50))
+    assert results == expected * 50
@@ -0,0 +1,80 @@
+import gc
+import threading
+
+import pytest
+
+import brewc
+import brewgc
+import brewpratt
+from brewparse import parse_program
+
+PROGRAM = 'func main() { print(1 + 2); }'
+
+CORPUS = [
+    PROGRAM,
+    'func main() { x = 1 - 2 - 3 * 4 / 5 + -6; print(x >= 1 || x < 2 && !(x == 3)); }',
+    'func main() { x = 1 != 2 == 3 > 4 <= 5; y = true; y = false; y = nil; print("s", x, y); }',
+    'func f(a, ref b) { b = a; return; }\nfunc f() { return 1; }\nfunc main() { f(1, x); x = f(); }',
+    'func main() { if (x) { print(1); } if (x) { y = 2; } else { y = 3; return y; } }',
+    'func main() { i = 0; while (i < 3) { i = i + 1; } x = inputi("n"); s = inputs(); }',
+    'func main() { o = @; o.x = 1; o.f = lambda(a) { return a + this.x; }; o.proto = @; print(o.f(2), o.g()); }',
+    'func main() { g = lambda() { return lambda(ref a, b) { a = b; }; }; h = g(); h(x, -(1 + 2)); }',
+]
+
+BAD_CORPUS = [
+    '', 'func', 'main() { }', 'func main() {', 'func main() { x = 1 }', 'func main() { x = ; }',
+    'func main() { x = 1 +', 'func main() { x = 1 + ; }', 'func main() { x = -; }', 'func main() { x = 1 2; }',
+    'func main() { if (x) { } }', 'func main() { a.b.c = 1; }', 'func main() { x = (1; }',
+    'func main() { return }', 'func main() { x = f(1,; }', 'func main() { x = o.; }', 'func f(ref) { }',
+    'func main() { x = lambda( { }; }', 'func main() { x = 1; } }', 'func main() { print("a) }',
+    'func main() { while (1) }', 'func main() { if (1) { x = 1; } else }',
+]
+
+
+def test_parse_leaves_a_disabled_gc_disabled():
+    gc.disable()
+    try:
+        brewpratt.parse(PROGRAM)
+        brewc.load(brewc.dump(brewpratt.parse(PROGRAM)))
+        assert not gc.isenabled()
+    finally:
+        gc.enable()
+
+
+def test_gc_stays_off_until_the_last_parse_finishes():
+    assert gc.isenabled()
+    with brewgc.gc_paused():
+        thread = threading.Thread(target=brewpratt.parse, args=(PROGRAM,))
+        thread.start()
+        thread.join()
+        with brewgc.gc_paused():
+            pass
+        assert not gc.isenabled()
+    assert gc.isenabled()
+
+
+@pytest.mark.parametrize('program', CORPUS)
+def test_pratt_builds_the_ply_tree(program):
+    assert str(brewpratt.parse(program)) == str(parse_program(program))
+
+
+# a program brewpratt rejects is parsed again by PLY, which reports the error
+@pytest.mark.parametrize('program', BAD_CORPUS)
+def test_pratt_rejects_what_ply_rejects(program):
+    with pytest.raises(brewpratt.ParseError):
+        brewpratt.parse(program)
+    with pytest.raises(SyntaxError):
+        parse_program(program)
+    with pytest.raises(SyntaxError):
+        parse_program(program, "pratt")
+
+
+# a program cut off anywhere parses or is a ParseError, never a read past
+# the tokens
+@pytest.mark.parametrize('program', CORPUS)
+def test_truncated_program_is_a_parse_error(program):
+    for end in range(len(program)):
+        try:
+            brewpratt.parse(program[:end])
+        except brewpratt.ParseError:
+            pass
@@ -0,0 +1,216 @@
+import pytest
+
+from interpreterv4 import Interpreter
+
+DYNAMIC = [{}, {'engine': 'closure'}]
+LEXICAL = [{'scoping': 'lexical'}, {'scoping': 'lexical', 'engine': 'closure'}, {'scoping': 'lexical', 'engine': 'vm'}]
+ALL = DYNAMIC + LEXICAL
+
+
+def run(program, **options):
+    interp = Interpreter(console_output=False, inp=["7"], **options)
+    interp.run(program)
+    return interp.get_output()
+
+
+# with dynamic scoping, an arg that isn't a var reaches the callee as nil
+@pytest.mark.parametrize('options', DYNAMIC)
+@pytest.mark.parametrize('arg', ['nil', '1 + 2', 'g()', '-x', '!b', 'inputi()'])
+def test_dynamic_call_args(options, arg):
+    program = f"""
+func g() {{ return 4; }}
+func f(a) {{ print(a); return a; }}
+func main() {{
+  x = 3;
+  b = false;
+  o = @;
+  o.m = lambda(a) {{ print(a); }};
+  h = f;
+  r = f({arg});
+  print(r);
+  r = h({arg});
+  o.m({arg});
+}}
+"""
+    assert run(program, **options) == ['nil'] * 4
+
+
+@pytest.mark.parametrize('options', DYNAMIC)
+def test_dynamic_proto_nil(options):
+    program = """
+func main() {
+  p = @;
+  p.x = 2;
+  q = @;
+  q.proto = p;
+  print(q.x);
+  q.proto = nil;
+  q.y = 1;
+  print(q.y);
+}
+"""
+    assert run(program, **options) == ['2', '1']
+
+
+# objects are passed and returned by value: the caller's object keeps its
+# own nested objects and protos, and the copy doesn't see later writes
+@pytest.mark.parametrize('options', ALL)
+def test_by_value_keeps_caller_aliases(options):
+    program = """
+func f(o) { n = o.inner; n.v = 9; return 0; }
+func main() {
+  a = @;
+  i = @;
+  i.v = 1;
+  a.inner = i;
+  z = f(a);
+  t = a.inner;
+  t.v = 2;
+  print(i.v);
+  print(t == a.inner);
+}
+"""
+    assert run(program, **options) == ['2', 'true']
+
+
+@pytest.mark.parametrize('options', LEXICAL)
+def test_by_value_keeps_caller_proto(options):
+    program = """
+func f(o) { return 0; }
+func main() {
+  p = @;
+  p.x = 1;
+  c = @;
+  c.proto = p;
+  z = f(c);
+  p.x = 5;
+  print(c.x);
+  p.hello = lambda() { print("hi"); };
+  c.hello();
+}
+"""
+    assert run(program, **options) == ['5', 'hi']
+
+
+@pytest.mark.parametrize('options', ALL)
+def test_by_value_copy_is_a_snapshot(options):
+    program = """
+func f(o) { return o; }
+func main() {
+  a = @;
+  i = @;
+  i.v = 1;
+  a.x = i;
+  a.y = i;
+  a.me = a;
+  b = f(a);
+  i.v = 8;
+  j = b.x;
+  print(j.v, " ", b.x == b.y, " ", b.me == b);
+  a.n = 3;
+  b.n = 4;
+  print(a.n);
+}
+"""
+    assert run(program, **options) == ['1 true true', '3']
+
+
+@pytest.mark.parametrize('options', ALL)
+def test_func_value_with_two_defs_of_one_arity_is_ambiguous(options):
+    program = """
+func f(a) { print(1); }
+func f(b) { print(2); }
+func main() {
+  f(0);
+  g = f;
+}
+"""
+    with pytest.raises(Exception, match='NAME_ERROR: Function var name f is ambiguous'):
+        run(program, **options)
+
+
+@pytest.mark.parametrize('options', ALL)
+def test_func_value_with_one_def(options):
+    program = """
+func f(a) { print(a); }
+func main() {
+  g = f;
+  g(5);
+}
+"""
+    assert run(program, **options) == ['5']
+
+
+# with dynamic scoping a func called from a lambda sees the lambda's captures
+@pytest.mark.parametrize('options', DYNAMIC)
+def test_lambda_callee_sees_captures(options):
+    program = """
+func g() { return y; }
+func mk() {
+  y = 5;
+  return lambda() { return g(); };
+}
+func main() {
+  f = mk();
+  print(f());
+}
+"""
+    assert run(program, **options) == ['5']
+
+
+OPTIMIZER_CORPUS = [
+    """
+func main() {
+  i = 0;
+  s = "";
+  while (i < 1 + 2) {
+    if (false) { print("never"); }
+    if (1 > 2 || false) { print("never"); } else { s = s + "day" + "s"; }
+    while (0) { print("never"); }
+    i = i + 60 * 0 + 1;
+  }
+  print(s, " ", 10 / 5 * 3, " ", -(2 - 5), " ", !(1 == 2), " ", "a" == "a", " ", nil == nil);
+}
+""",
+    'func main() { print(1); x = 10 / 0; print(x); }',
+    'func main() { print(1); print("a" + 1); }',
+    'func main() { print(!(3 - 4)); print(-"a"); }',
+    'func main() { if (false) { x = 1 / 0; } while (0) { print("a" + 1); } if (0) { y = 1; } else { print(2 * 2); } }',
+    'func main() { if (1 - 1) { print(1); } else { x = 5; print(x); } print(x); }',
+    'func f() { if (true) { return 1; } return 2; }\nfunc main() { z = f(); print(z); }',
+    'func f(a) { print(a); }\nfunc main() { z = f(1 + 2); z = f(8 / 0); }',
+    'func main() { while (1 < 0) { print("never"); } if ("s") { print(1); } }',
+]
+
+
+def outcome(program, **options):
+    interp = Interpreter(console_output=False, **options)
+    try:
+        interp.run(program)
+    except Exception as e:
+        return interp.get_output(), str(e)
+    return interp.get_output(), None
+
+
+# folding and pruning must not change what a program prints or how it fails
+@pytest.mark.parametrize('options', ALL)
+@pytest.mark.parametrize('program', OPTIMIZER_CORPUS)
+def test_optimizer_keeps_behavior(options, program):
+    assert outcome(program, optimize=True, **options) == outcome(program, optimize=False, **options)
+
+
+# a tail call keeps the caller's memo entry: f's and h's results are stored
+# when the g or h they tail call returns
+def test_tail_call_stores_the_callers_memo():
+    program = """
+func g(n) { if (n < 2) { return n; } return g(n - 1) + g(n - 2); }
+func f(n) { return g(n); }
+func h(n) { if (n == 0) { return f(10); } return h(n - 1); }
+func main() { print(f(10)); print(f(10)); print(h(3)); print(h(3)); print(h(2)); }
+"""
+    interp = Interpreter(console_output=False, scoping='lexical', engine='vm')
+    interp.run(program)
+    assert interp.get_output() == ['55'] * 5
+    stats = interp.memo_stats()
+    assert (stats['f/1']['hits'], stats['f/1']['entries']) == (2, 1)
+    assert (stats['h/1']['hits'], stats['h/1']['entries']) == (2, 4)